@@ -1,3 +1,7 @@
-__all__ = []
+import time
+
+# Référence pour le rapport de démarrage (temps d'import de l'application)
+IMPORT_STARTED_AT = time.perf_counter()
 
+__all__ = []
 
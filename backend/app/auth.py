@@ -1,34 +1,31 @@
+import hashlib
+import time
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import jwt, JWTError
-from passlib.context import CryptContext
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, status, Depends, WebSocket
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, load_only, make_transient_to_detached
 
+from .cache import TTLCache
+from .passwords import hash_password, verify_password, verify_and_update_password  # noqa: F401
 from .config import settings
-from .db import get_db
+from .db import get_db, get_async_db, open_async_read_session
 from . import models
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
-
-def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
-
-
-def hash_password(password: str) -> str:
-    # bcrypt a une limite de 72 bytes pour les mots de passe
-    # On encode en UTF-8 et on tronque si nécessaire
-    password_bytes = password.encode('utf-8')
-    if len(password_bytes) > 72:
-        password_bytes = password_bytes[:72]
-        # Décoder pour obtenir une chaîne valide (peut tronquer au milieu d'un caractère UTF-8)
-        # Mais bcrypt accepte les bytes, donc on peut les passer directement
-        password = password_bytes.decode('utf-8', errors='ignore')
-    return pwd_context.hash(password)
+# Caches par processus: user_id -> colonnes de l'utilisateur, empreinte du JWT -> user_id
+_principal_cache = TTLCache(settings.auth_cache_max_entries, settings.auth_cache_ttl_seconds)
+_token_cache = TTLCache(settings.auth_cache_max_entries, settings.auth_token_cache_ttl_seconds)
+# Hash du mot de passe et code de vérification: lus seulement par /auth/token et la vérification
+# email (requêtes par email), jamais chargés ni gardés en cache pour une requête authentifiée
+_CREDENTIAL_COLUMNS = ("hashed_password", "verification_code", "verification_code_expires")
+_USER_COLUMNS = [attr.key for attr in inspect(models.User).column_attrs if attr.key not in _CREDENTIAL_COLUMNS]
+_PRINCIPAL_LOAD = load_only(*(getattr(models.User, key) for key in _USER_COLUMNS))
 
 
 def create_access_token(user_id: int, expires_delta: Optional[timedelta] = None) -> str:
@@ -37,24 +34,129 @@ def create_access_token(user_id: int, expires_delta: Optional[timedelta] = None)
     return jwt.encode(to_encode, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
 
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> models.User:
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def decode_user_id(token: str) -> int:
+    """Vérifie le JWT et retourne l'identifiant utilisateur (401 sinon)."""
+    token_key = hashlib.sha256(token.encode("utf-8")).digest()
+    user_id = _token_cache.get(token_key)
+    if user_id is not None:
+        return user_id
     try:
         payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
         sub = payload.get("sub")
         if sub is None:
-            raise credentials_exception
+            raise _credentials_exception()
         user_id = int(sub)
     except (JWTError, ValueError):
-        raise credentials_exception
+        raise _credentials_exception()
+    # Ne jamais garder un token en cache au-delà de son expiration
+    ttl = settings.auth_token_cache_ttl_seconds
+    if payload.get("exp") is not None:
+        ttl = min(ttl, float(payload["exp"]) - time.time())
+    if ttl > 0:
+        _token_cache.set(token_key, user_id, ttl)
+    return user_id
+
+
+def _cache_principal(user: models.User):
+    _principal_cache.set(user.id, {key: getattr(user, key) for key in _USER_COLUMNS})
+
+
+def _cached_principal(user_id: int) -> models.User | None:
+    """Reconstruit un utilisateur détaché depuis le cache (à rattacher avec merge(load=False))."""
+    snapshot = _principal_cache.get(user_id)
+    if snapshot is None:
+        return None
+    user = models.User(**snapshot)
+    make_transient_to_detached(user)
+    return user
+
+
+def invalidate_principal(user_id: int):
+    """À appeler après toute modification de la ligne users (profil, vérification email...)."""
+    _principal_cache.pop(user_id)
 
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
-        raise credentials_exception
+
+def auth_cache_stats() -> dict:
+    return {"principals": _principal_cache.stats(), "tokens": _token_cache.stats()}
+
+
+def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> models.User:
+    user_id = decode_user_id(token)
+    cached = _cached_principal(user_id)
+    if cached is not None:
+        # merge(load=False) attache l'instance à la session sans requête SQL
+        user = db.merge(cached, load=False)
+    else:
+        user = db.query(models.User).options(_PRINCIPAL_LOAD).filter(models.User.id == user_id).first()
+        if not user:
+            raise _credentials_exception()
+        _cache_principal(user)
+    # Utilisé pour la fenêtre read-your-writes après un commit (voir db.note_user_write)
+    db.info["user_id"] = user.id
+    return user
+
+
+async def get_current_user_async(
+    db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_scheme)
+) -> models.User:
+    """Équivalent asynchrone de get_current_user pour les routes async."""
+    user_id = decode_user_id(token)
+    cached = _cached_principal(user_id)
+    if cached is not None:
+        user = await db.merge(cached, load=False)
+    else:
+        result = await db.execute(select(models.User).options(_PRINCIPAL_LOAD).where(models.User.id == user_id))
+        user = result.scalar_one_or_none()
+        if not user:
+            raise _credentials_exception()
+        _cache_principal(user)
+    db.info["user_id"] = user.id
     return user
 
 
+async def authenticate_websocket(websocket: WebSocket) -> models.User | None:
+    """
+    Utilisateur d'une connexion WebSocket (avant accept): JWT dans le paramètre
+    `token` (un navigateur ne peut pas envoyer d'en-tête) ou dans l'en-tête
+    Authorization. None si le token est absent ou invalide.
+    """
+    token = websocket.query_params.get("token")
+    if not token:
+        scheme, _, value = websocket.headers.get("authorization", "").partition(" ")
+        token = value if scheme.lower() == "bearer" else None
+    if not token:
+        return None
+    try:
+        user_id = decode_user_id(token)
+    except HTTPException:
+        return None
+    cached = _cached_principal(user_id)
+    if cached is not None:
+        return cached
+    db = await open_async_read_session(user_id)
+    try:
+        user = (
+            await db.execute(select(models.User).options(_PRINCIPAL_LOAD).where(models.User.id == user_id))
+        ).scalar_one_or_none()
+    finally:
+        await db.close()
+    if user is not None:
+        _cache_principal(user)
+    return user
+
+
+async def get_async_read_db(user: models.User = Depends(get_current_user_async)):
+    """Session de lecture (réplica si disponible) pour les routes GET en lecture seule."""
+    db = await open_async_read_session(user.id)
+    try:
+        yield db
+    finally:
+        await db.close()
@@ -0,0 +1,365 @@
+"""
+Calcul en lot des suggestions de match des utilisateurs actifs.
+
+run_batch():
+  1. lit la dernière humeur des utilisateurs actifs depuis
+     MATCH_BATCH_ACTIVE_HOURS (user_latest_mood), puis les candidats des
+     cellules geohash_4 qui recoupent leur rayon;
+  2. regroupe les utilisateurs actifs par cellule geohash_4 (partitions, par
+     tranches d'au plus PARTITION_MAX_USERS);
+  3. classe chaque partition dans un processus du pool (MatchScorer: mêmes
+     candidats que /match/suggestions: actifs depuis GEO_INDEX_ACTIVE_HOURS,
+     dans le rayon, les MATCH_MAX_CANDIDATES plus récents);
+  4. écrit les résultats dans precomputed_matches.
+
+/match/suggestions sert ces résultats tant qu'ils sont frais: même humeur de
+l'appelant, même rayon, calcul de moins de MATCH_PRECOMPUTED_MAX_AGE_SECONDS,
+et aucune humeur plus récente que le calcul dans les cellules du rayon (ni
+de la part d'un utilisateur affiché, qui a pu quitter la zone).
+
+Lancement: toutes les MATCH_BATCH_INTERVAL_MINUTES dans l'API (un seul worker
+à la fois grâce à un verrou consultatif PostgreSQL), ou par cron avec
+python database/precompute_matches.py.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import delete, or_, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, schemas
+from .config import settings
+from .db import SessionLocal, get_engine
+from .geo import CELL_PRECISIONS, cell_filter, cells_for_radius, covering_cells, haversine_m_array
+from .geo_index import active_cutoff
+from .match_scoring import get_match_scorer
+
+
+PARTITION_PRECISION = 4
+PARTITION_MAX_USERS = 2000
+# En dessous, le démarrage des processus coûte plus que le calcul: tout dans le thread appelant
+PARALLEL_MIN_USERS = 5000
+_CELL_CHUNK = 500
+_WRITE_CHUNK = 1000
+# Clé du verrou consultatif (pg_try_advisory_lock): un seul calcul à la fois
+_ADVISORY_LOCK_KEY = 0x4D415443  # "MATC"
+
+_stats_lock = threading.Lock()
+_stats = {"runs": 0, "failures": 0, "skipped_locked": 0, "served": 0, "stale": 0}
+_last_run: dict = {}
+
+
+def public_name(user_id: int, display_name: Optional[str], anonymous: bool) -> str:
+    if anonymous or not display_name:
+        # simple deterministic pseudonym
+        return f"Anonyme #{user_id % 10000:04d}"
+    return display_name
+
+
+# Exécutée dans les processus du pool (doit rester au niveau module)
+def _match_partition(task: dict) -> list:
+    scorer = get_match_scorer()
+    radius, k = task["radius_m"], task["k"]
+    max_age, max_candidates = task["max_age_seconds"], task["max_candidates"]
+    user_ids, lats, lngs = task["user_ids"], task["lats"], task["lngs"]
+    labels, scores, ages = task["labels"], task["mood_scores"], task["ages"]
+    # Index des candidats par cellule, pour chaque précision
+    by_cell = {p: {} for p in CELL_PRECISIONS}
+    for i, cells in enumerate(task["cells"]):
+        for p, cell in zip(CELL_PRECISIONS, cells):
+            by_cell[p].setdefault(cell, []).append(i)
+    everyone = np.arange(len(user_ids))
+
+    results = []
+    for q in task["queries"]:
+        covering = covering_cells(lats[q], lngs[q], radius)
+        if covering is None:
+            idx = everyone
+        else:
+            precision, cells = covering
+            idx = np.fromiter(
+                (i for cell in cells for i in by_cell[precision].get(cell, ())), dtype=np.int64
+            )
+        idx = idx[(idx != q) & (ages[idx] <= max_age)]
+        # Comme candidate_query: dans le rayon, puis les max_candidates plus récents
+        idx = idx[haversine_m_array(lats[q], lngs[q], lats[idx], lngs[idx]) <= radius]
+        if len(idx) > max_candidates:
+            idx = idx[np.argpartition(ages[idx], max_candidates - 1)[:max_candidates]]
+        chosen, dist, _ = scorer.rank(
+            lats[q], lngs[q], labels[q], scores[q],
+            lats[idx], lngs[idx], [labels[i] for i in idx], scores[idx], ages[idx], radius, k,
+        )
+        suggestions = [
+            {
+                "user_id": int(user_ids[i]),
+                "distance_m": round(float(d), 1),
+                "mood_label": labels[i],
+                "display_name": task["names"][i],
+                "lat": float(lats[i]),
+                "lng": float(lngs[i]),
+            }
+            for i, d in zip(idx[chosen], dist)
+        ]
+        results.append((int(user_ids[q]), int(task["mood_event_ids"][q]), suggestions))
+    return results
+
+
+def _select_latest():
+    latest = models.UserLatestMood
+    return (
+        select(
+            latest.user_id,
+            latest.mood_event_id,
+            latest.mood_label,
+            latest.mood_score,
+            latest.lat,
+            latest.lng,
+            latest.created_at,
+            latest.geohash_4,
+            latest.geohash_5,
+            latest.geohash_6,
+            models.User.display_name,
+        )
+        .join(models.User, models.User.id == latest.user_id)
+        .where(latest.lat.isnot(None), latest.lng.isnot(None), latest.geohash_4.isnot(None))
+    )
+
+
+def _load(db, active_since: datetime, radius: float):
+    latest = models.UserLatestMood
+    active = db.execute(_select_latest().where(latest.created_at >= active_since)).all()
+    # Candidats actifs (active_cutoff), plus les utilisateurs du lot eux-mêmes
+    since = min(active_since, active_cutoff())
+    needed = set()
+    for row in active:
+        needed.update(cells_for_radius(row.lat, row.lng, radius, PARTITION_PRECISION))
+    candidates = {}
+    needed = sorted(needed)
+    for start in range(0, len(needed), _CELL_CHUNK):
+        chunk = needed[start:start + _CELL_CHUNK]
+        for row in db.execute(_select_latest().where(latest.geohash_4.in_(chunk), latest.created_at >= since)):
+            candidates[row.user_id] = row
+    return active, list(candidates.values())
+
+
+def _build_tasks(active, candidates, radius: float, k: int) -> list:
+    now_utc = datetime.now(timezone.utc)
+    now_naive = now_utc.replace(tzinfo=None)
+    cand_by_cell = {}
+    for row in candidates:
+        cand_by_cell.setdefault(row.geohash_4, []).append(row)
+    partitions = {}
+    for row in active:
+        partitions.setdefault(row.geohash_4, []).append(row)
+
+    tasks = []
+    for cell, users in partitions.items():
+        # Candidats: cellules geohash_4 recoupant le rayon d'au moins un utilisateur de la partition
+        cells = set()
+        for row in users:
+            cells.update(cells_for_radius(row.lat, row.lng, radius, PARTITION_PRECISION))
+        rows = [r for c in sorted(cells) for r in cand_by_cell.get(c, ())]
+        position = {r.user_id: i for i, r in enumerate(rows)}
+        base = {
+            "radius_m": radius,
+            "k": k,
+            "max_age_seconds": settings.geo_index_active_hours * 3600,
+            "max_candidates": settings.match_max_candidates,
+            "user_ids": np.array([r.user_id for r in rows], dtype=np.int64),
+            "mood_event_ids": np.array([r.mood_event_id for r in rows], dtype=np.int64),
+            "lats": np.array([r.lat for r in rows], dtype=np.float64),
+            "lngs": np.array([r.lng for r in rows], dtype=np.float64),
+            "labels": [r.mood_label for r in rows],
+            "mood_scores": np.array([r.mood_score for r in rows], dtype=np.float64),
+            "ages": np.array(
+                [((now_utc if r.created_at.tzinfo else now_naive) - r.created_at).total_seconds() for r in rows],
+                dtype=np.float64,
+            ),
+            "names": [r.display_name for r in rows],
+            "cells": [(r.geohash_4, r.geohash_5, r.geohash_6) for r in rows],
+        }
+        queries = [position[r.user_id] for r in users]
+        for start in range(0, len(queries), PARTITION_MAX_USERS):
+            tasks.append(dict(base, queries=queries[start:start + PARTITION_MAX_USERS]))
+    return tasks
+
+
+def _write(db, results: list, radius: int, computed_at: datetime) -> int:
+    table = models.PrecomputedMatch.__table__
+    written = 0
+    for start in range(0, len(results), _WRITE_CHUNK):
+        chunk = results[start:start + _WRITE_CHUNK]
+        stmt = insert(table).values(
+            [
+                {
+                    "user_id": user_id,
+                    "mood_event_id": mood_event_id,
+                    "radius_m": radius,
+                    "suggestions": json.dumps(suggestions, separators=(",", ":")),
+                    "computed_at": computed_at,
+                }
+                for user_id, mood_event_id, suggestions in chunk
+            ]
+        )
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[table.c.user_id],
+                set_={key: stmt.excluded[key] for key in ("mood_event_id", "radius_m", "suggestions", "computed_at")},
+            )
+        )
+        written += len(chunk)
+    # Utilisateurs qui ne sont plus actifs: leurs anciens résultats ne seraient plus servis
+    db.execute(delete(models.PrecomputedMatch).where(models.PrecomputedMatch.computed_at < computed_at))
+    db.commit()
+    return written
+
+
+def batch_workers() -> int:
+    return settings.match_batch_workers if settings.match_batch_workers >= 0 else (os.cpu_count() or 1)
+
+
+def run_batch(active_hours: Optional[float] = None, workers: Optional[int] = None) -> dict:
+    """Calcule et enregistre les suggestions des utilisateurs actifs; retourne le rapport d'exécution."""
+    get_engine()
+    active_hours = settings.match_batch_active_hours if active_hours is None else active_hours
+    workers = batch_workers() if workers is None else workers
+    radius = min(settings.default_matching_radius_m, settings.match_max_radius_m)
+    k = settings.match_max_results
+    started = time.perf_counter()
+    computed_at = datetime.utcnow()
+
+    with SessionLocal() as db:
+        active, candidates = _load(db, computed_at - timedelta(hours=active_hours), radius)
+        loaded = time.perf_counter()
+        tasks = _build_tasks(active, candidates, radius, k)
+        results: List[tuple] = []
+        if workers > 0 and len(tasks) > 1 and len(active) >= PARALLEL_MIN_USERS:
+            # spawn: pas de fork d'un processus multi-thread (uvicorn)
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(tasks)), mp_context=multiprocessing.get_context("spawn")
+            ) as pool:
+                for part in pool.map(_match_partition, tasks):
+                    results.extend(part)
+        else:
+            workers = 1
+            for task in tasks:
+                results.extend(_match_partition(task))
+        computed = time.perf_counter()
+        written = _write(db, results, radius, computed_at)
+    finished = time.perf_counter()
+
+    compute_seconds = computed - loaded
+    report = {
+        "started_at": computed_at.isoformat(timespec="seconds"),
+        "active_users": len(active),
+        "candidates": len(candidates),
+        "partitions": len(tasks),
+        "written": written,
+        "workers": workers,
+        "radius_m": radius,
+        "load_seconds": round(loaded - started, 3),
+        "compute_seconds": round(compute_seconds, 3),
+        "write_seconds": round(finished - computed, 3),
+        "duration_seconds": round(finished - started, 3),
+        "users_per_second": round(len(active) / compute_seconds, 1) if compute_seconds > 0 else 0.0,
+        "users_per_second_per_worker": round(len(active) / compute_seconds / workers, 1) if compute_seconds > 0 else 0.0,
+    }
+    with _stats_lock:
+        _stats["runs"] += 1
+        _last_run.clear()
+        _last_run.update(report)
+    return report
+
+
+def run_batch_locked(active_hours: Optional[float] = None, workers: Optional[int] = None) -> Optional[dict]:
+    """run_batch() si aucun autre processus ne l'exécute (verrou consultatif PostgreSQL), sinon None."""
+    engine = get_engine()
+    with engine.connect() as conn:
+        if not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": _ADVISORY_LOCK_KEY}).scalar():
+            with _stats_lock:
+                _stats["skipped_locked"] += 1
+            return None
+        try:
+            return run_batch(active_hours, workers)
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _ADVISORY_LOCK_KEY})
+            conn.commit()
+
+
+async def batch_matching_loop():
+    """Tâche de fond de l'API: un calcul toutes les MATCH_BATCH_INTERVAL_MINUTES."""
+    interval = settings.match_batch_interval_minutes * 60
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            report = await asyncio.to_thread(run_batch_locked)
+            if report is not None:
+                print(
+                    f"✅ Suggestions précalculées: {report['written']} utilisateurs en {report['duration_seconds']}s "
+                    f"({report['users_per_second_per_worker']} utilisateurs/s par processus)"
+                )
+        except Exception as e:
+            with _stats_lock:
+                _stats["failures"] += 1
+            print(f"❌ Calcul des suggestions en lot échoué: {e}")
+            traceback.print_exc()
+
+
+async def precomputed_suggestions(
+    db: AsyncSession, last_mood: models.UserLatestMood, radius: int, anonymous: bool
+) -> Optional[List[schemas.MatchSuggestion]]:
+    """Suggestions précalculées si elles sont encore valables pour cette requête, sinon None."""
+    row = await db.get(models.PrecomputedMatch, last_mood.user_id)
+    if row is None:
+        return None
+    computed_at = row.computed_at.replace(tzinfo=None)
+    fresh = (
+        row.mood_event_id == last_mood.mood_event_id
+        and row.radius_m == radius
+        and (datetime.utcnow() - computed_at).total_seconds() <= settings.match_precomputed_max_age_seconds
+    )
+    suggestions = json.loads(row.suggestions) if fresh else []
+    if fresh:
+        # Humeur publiée depuis le calcul dans les cellules du rayon (mêmes cellules que
+        # suggestion_cache), ou par un utilisateur affiché: le résultat ne vaut plus
+        latest = models.UserLatestMood
+        newer = await db.execute(
+            select(latest.user_id)
+            .where(latest.created_at > computed_at)
+            .where(
+                or_(
+                    cell_filter(latest, last_mood.lat, last_mood.lng, radius),
+                    latest.user_id.in_([s["user_id"] for s in suggestions]),
+                )
+            )
+            .limit(1)
+        )
+        fresh = newer.first() is None
+    with _stats_lock:
+        _stats["served" if fresh else "stale"] += 1
+    if not fresh:
+        return None
+    return [
+        schemas.MatchSuggestion(**dict(s, display_name=public_name(s["user_id"], s["display_name"], anonymous)))
+        for s in suggestions
+    ]
+
+
+def batch_stats() -> dict:
+    with _stats_lock:
+        return dict(
+            _stats,
+            interval_minutes=settings.match_batch_interval_minutes,
+            workers=batch_workers(),
+            last_run=dict(_last_run) or None,
+        )
@@ -0,0 +1,132 @@
+"""
+Messages de chat remis en direct (WebSocket /chat/ws).
+
+POST /chat/send enregistre le message puis le publie sur le canal
+chat:user:<destinataire> du broker temps réel (app/realtime.py). Un processus
+ne s'abonne au canal d'un utilisateur que tant qu'il a au moins une connexion
+ouverte pour lui: avec le broker Redis, le message atteint les connexions du
+destinataire quel que soit le worker ou le nœud qui les porte.
+
+Comme /match/ws, chaque connexion a une file sortante bornée: une connexion
+lente perd des messages (comptés), que le client relit par
+GET /chat/messages/{id}?after_id=<dernier reçu>. La latence de remise (publication -> écriture sur la
+socket) est mesurée par processus.
+"""
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Set
+
+from . import models, schemas
+from .config import settings
+from .realtime import Broker, get_broker
+
+
+_LATENCY_WINDOW = 1000
+
+
+def user_channel(user_id: int) -> str:
+    return f"chat:user:{user_id}"
+
+
+class ChatConnection:
+    """Une connexion WebSocket: file sortante de l'utilisateur connecté."""
+
+    def __init__(self, conn_id: int, user_id: int, queue_max: int):
+        self.id = conn_id
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_max)
+
+
+class ChatHub:
+    def __init__(self, queue_max: int, broker: Optional[Broker] = None):
+        self.queue_max = queue_max
+        # Par défaut le broker du processus (settings.realtime_broker)
+        self._broker = broker
+        self._ids = itertools.count(1)
+        self._by_user: Dict[int, Set[ChatConnection]] = {}
+        # Appelé depuis la boucle asyncio; le verrou protège stats() (thread de /health/stats)
+        self._lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=_LATENCY_WINDOW)
+        self._stats = {"published": 0, "delivered": 0, "dropped": 0, "latency_max_ms": 0.0}
+
+    @property
+    def broker(self) -> Broker:
+        return self._broker or get_broker()
+
+    async def connect(self, user_id: int) -> ChatConnection:
+        conn = ChatConnection(next(self._ids), user_id, self.queue_max)
+        with self._lock:
+            first = user_id not in self._by_user
+            self._by_user.setdefault(user_id, set()).add(conn)
+        if first:
+            await self.broker.subscribe(user_channel(user_id), self._deliver)
+        return conn
+
+    async def disconnect(self, conn: ChatConnection):
+        with self._lock:
+            conns = self._by_user.get(conn.user_id)
+            if conns is None or conn not in conns:
+                return
+            conns.discard(conn)
+            last = not conns
+            if last:
+                del self._by_user[conn.user_id]
+        if last:
+            await self.broker.unsubscribe(user_channel(conn.user_id), self._deliver)
+
+    def send(self, conn: ChatConnection, message: dict) -> bool:
+        try:
+            conn.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            with self._lock:
+                self._stats["dropped"] += 1
+            return False
+
+    async def publish_message(self, msg: models.Message):
+        """Message enregistré: remis aux connexions du destinataire (tous workers confondus)."""
+        payload = {
+            "type": "message",
+            "message": schemas.MessagePublic.model_validate(msg).model_dump(mode="json"),
+            "sent_at": time.time(),
+        }
+        with self._lock:
+            self._stats["published"] += 1
+        await self.broker.publish(user_channel(msg.recipient_id), payload)
+
+    def _deliver(self, channel: str, message: dict):
+        user_id = int(channel.rsplit(":", 1)[1])
+        with self._lock:
+            conns = list(self._by_user.get(user_id, ()))
+        for conn in conns:
+            self.send(conn, message)
+
+    def record_sent(self, message: dict):
+        """Appelé après l'écriture sur la socket: latence depuis la publication."""
+        sent_at = message.get("sent_at")
+        if sent_at is None:
+            return
+        latency_ms = max(0.0, 1000 * (time.time() - sent_at))
+        with self._lock:
+            self._stats["delivered"] += 1
+            self._latencies.append(latency_ms)
+            self._stats["latency_max_ms"] = max(self._stats["latency_max_ms"], latency_ms)
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return dict(
+                self._stats,
+                latency_max_ms=round(self._stats["latency_max_ms"], 2),
+                latency_avg_ms=round(sum(latencies) / len(latencies), 2) if latencies else None,
+                latency_p95_ms=round(latencies[int(0.95 * (len(latencies) - 1))], 2) if latencies else None,
+                connections=sum(len(c) for c in self._by_user.values()),
+                users=len(self._by_user),
+                queue_max=self.queue_max,
+            )
+
+
+chat_hub = ChatHub(settings.chat_push_queue_max)
@@ -0,0 +1,91 @@
+"""Disjoncteur pour les appels à un service externe (ex: OpenAI)."""
+import threading
+import time
+
+
+class CircuitBreaker:
+    """
+    closed: les appels passent; après `failure_threshold` échecs consécutifs
+    (erreur ou appel plus lent que `slow_call_seconds`), passe à open.
+    open: les appels sont refusés pendant `reset_seconds`, puis half_open.
+    half_open: un seul appel de test à la fois; succès -> closed, échec -> open.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float, slow_call_seconds: float):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._stats = {"opened": 0, "rejected": 0, "successes": 0, "failures": 0, "slow_calls": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self._state = "half_open"
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self) -> str | None:
+        """
+        "call" si l'appel peut être tenté, "probe" s'il est l'appel de test du
+        half_open (un seul à la fois), None s'il est refusé. Passer `probe` à
+        cancel() / record(): seul l'appel de test libère sa place.
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == "closed":
+                return "call"
+            if state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return "probe"
+            self._stats["rejected"] += 1
+            return None
+
+    def cancel(self, probe: bool):
+        """Appel autorisé par allow() puis abandonné avant d'être tenté: libère l'appel de test s'il l'était."""
+        if probe:
+            with self._lock:
+                self._probe_in_flight = False
+
+    def record(self, duration: float, error: bool, probe: bool = False):
+        slow = duration > self.slow_call_seconds
+        with self._lock:
+            if slow:
+                self._stats["slow_calls"] += 1
+            if error or slow:
+                self._stats["failures"] += 1
+                self._failures += 1
+                if self._state == "half_open" or self._failures >= self.failure_threshold:
+                    if self._state != "open":
+                        self._stats["opened"] += 1
+                        print(f"⚠️ Disjoncteur {self.name} ouvert ({self._failures} échecs consécutifs)")
+                    self._state = "open"
+                    self._opened_at = time.monotonic()
+            else:
+                self._stats["successes"] += 1
+                if self._state != "closed":
+                    print(f"✅ Disjoncteur {self.name} refermé")
+                self._state = "closed"
+                self._failures = 0
+            if probe:
+                self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self._stats,
+                state=self._current_state(),
+                consecutive_failures=self._failures,
+                failure_threshold=self.failure_threshold,
+                reset_seconds=self.reset_seconds,
+                slow_call_seconds=self.slow_call_seconds,
+            )
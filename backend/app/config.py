@@ -34,6 +34,25 @@ class Settings(BaseSettings):
                 f"URL actuelle: {self.database_url[:50]}..."
             )
 
+    # Pool de connexions SQLAlchemy
+    # auto: pgbouncer si l'URL contient pgbouncer=true, sinon queue
+    db_pool_mode: str = Field(default="auto", description="auto | queue | pgbouncer | null")
+    db_pool_size: int = Field(default=5)
+    db_max_overflow: int = Field(default=10)
+    db_pool_timeout: float = Field(default=30.0, description="Attente max (s) pour obtenir une connexion du pool")
+    db_pool_recycle: int = Field(default=1800, description="Durée de vie max (s) d'une connexion")
+    db_pool_pre_ping: bool = Field(default=True)
+    db_connect_timeout: int = Field(default=15)
+    # Crée les tables (create_all) au démarrage si schema_version est absente (base vide)
+    db_auto_create_schema: bool = Field(default=False)
+
+    # Réplica en lecture (optionnel): les GET listés dans les routers y sont routés
+    database_replica_url: str | None = Field(default=None)
+    # Fenêtre read-your-writes: après une écriture, les lectures restent sur le primaire
+    replica_sticky_seconds: float = Field(default=5.0)
+    # Après un échec du réplica, lire sur le primaire pendant cette durée
+    replica_retry_seconds: float = Field(default=30.0)
+
     # Supabase (optional, used when deploying with Supabase Postgres)
     supabase_url: str | None = Field(default=None)
     supabase_anon_key: str | None = Field(default=None)
@@ -43,13 +62,83 @@ class Settings(BaseSettings):
     jwt_secret_key: str = Field(default="dev-secret-change")
     jwt_algorithm: str = Field(default="HS256")
     access_token_expire_minutes: int = Field(default=60 * 24)
+    # Cache des utilisateurs authentifiés (par processus), évite un SELECT users par requête
+    auth_cache_ttl_seconds: float = Field(default=30.0)
+    auth_cache_max_entries: int = Field(default=10_000)
+    # Cache des JWT déjà vérifiés (clé: empreinte SHA-256 du token), borné par l'expiration du token
+    auth_token_cache_ttl_seconds: float = Field(default=300.0)
+    # Hachage bcrypt: coût et pool de processus dédié (0 worker = dans le thread de la requête)
+    bcrypt_rounds: int = Field(default=12)
+    password_hash_workers: int = Field(default=2)
+    # Au plus la moitié du threadpool d'AnyIO (40 threads): chaque demande en attente en bloque un
+    password_hash_max_pending: int = Field(default=20, description="Au-delà: 429 Too Many Requests")
+    password_hash_retry_after_seconds: int = Field(default=2)
 
     # Matching radius in meters
     default_matching_radius_m: int = Field(default=1500)
+    # Bornes du travail par requête /match/suggestions: rayon max, dernières humeurs lues au plus
+    match_max_radius_m: int = Field(default=50_000)
+    match_max_candidates: int = Field(default=500)
+    match_max_results: int = Field(default=50)
+    # Score de classement: proximité, humeur compatible, score d'humeur proche, humeur récente (demi-vie)
+    match_weight_distance: float = Field(default=0.5)
+    match_weight_compatible: float = Field(default=0.25)
+    match_weight_mood_score: float = Field(default=0.1)
+    match_weight_recency: float = Field(default=0.15)
+    match_recency_half_life_hours: float = Field(default=6.0)
+    # Cache des suggestions par processus (invalidé par les humeurs des cellules voisines); 0 = désactivé
+    match_cache_ttl_seconds: float = Field(default=15.0)
+    match_cache_max_entries: int = Field(default=10_000)
+    # Suggestions précalculées en lot (app/batch_matching.py); intervalle 0 = pas de calcul dans l'API (cron)
+    match_batch_interval_minutes: float = Field(default=0.0)
+    match_batch_active_hours: float = Field(default=24.0)
+    match_batch_workers: int = Field(default=-1, description="Processus du pool (-1: nombre de CPU, 0: dans le thread)")
+    match_precomputed_max_age_seconds: float = Field(default=900.0, description="0 = ne jamais servir les résultats précalculés")
+    # Suggestions poussées par WebSocket (/match/ws): messages en attente par connexion, au-delà perdus
+    match_push_queue_max: int = Field(default=100)
+    # Diffusion temps réel entre workers (app/realtime.py): "memory" (un seul processus) ou "redis"
+    realtime_broker: str = Field(default="memory")
+    realtime_redis_url: str = Field(default="redis://localhost:6379/0")
+    realtime_channel_prefix: str = Field(default="humanlink:", description="Préfixe des canaux (plusieurs applications sur un même serveur)")
+    realtime_publish_queue_max: int = Field(default=10_000, description="Messages en attente d'envoi au serveur, au-delà perdus")
+    # Chat en direct (/chat/ws): messages en attente par connexion, au-delà perdus (relus par GET /chat/messages)
+    chat_push_queue_max: int = Field(default=100)
+    # Index géographique des utilisateurs actifs en mémoire partagée (app/geo_index.py), un segment par nœud
+    geo_index_enabled: bool = Field(default=True)
+    geo_index_name: str = Field(default="humanlink_geo", description="Nom du segment (distinct par application sur une même machine)")
+    geo_index_capacity: int = Field(default=200_000)
+    geo_index_cell_deg: float = Field(default=0.01)
+    # Humeurs plus anciennes ignorées par /match/suggestions et /mood/nearby (index ou base)
+    geo_index_active_hours: float = Field(default=24.0)
+    geo_index_sync_seconds: float = Field(default=5.0)
+    geo_index_rebuild_minutes: float = Field(default=60.0)
 
     # OpenAI (optional)
     openai_api_key: str | None = Field(default=None)
     openai_emotion_model: str = Field(default="gpt-4o-mini")
+    openai_base_url: str | None = Field(default=None, description="API compatible OpenAI (ex: serveur local de test)")
+    # Délai max par appel (attente d'un créneau comprise), nouveaux essais du client, appels simultanés
+    openai_timeout_seconds: float = Field(default=8.0)
+    openai_max_retries: int = Field(default=0)
+    openai_max_in_flight: int = Field(default=4)
+    openai_slot_wait_seconds: float = Field(default=1.0, description="Attente max d'un créneau libre avant repli sur les règles")
+    # Disjoncteur: ouvert après N échecs consécutifs (erreur ou appel plus lent que le seuil), nouvel essai après reset
+    openai_breaker_failures: int = Field(default=5)
+    openai_breaker_slow_seconds: float = Field(default=5.0)
+    openai_breaker_reset_seconds: float = Field(default=30.0)
+    # Classifieur local (database/train_mood_model.py): utilisé si sa confiance dépasse le seuil, sinon LLM
+    mood_model_enabled: bool = Field(default=True)
+    mood_model_path: str | None = Field(default=None, description="Sans extension (défaut: app/data/mood_model)")
+    mood_model_min_confidence: float = Field(default=0.85)
+    # Cache des classifications (texte normalisé): mémoire LRU par processus + table mood_classifications
+    mood_cache_max_entries: int = Field(default=10_000)
+    mood_cache_ttl_seconds: float = Field(default=24 * 3600.0)
+    mood_cache_db: bool = Field(default=True, description="Partager le cache entre workers via la base")
+    # File d'affinage des étiquettes d'humeur par le LLM (après l'enregistrement).
+    # Les humeurs arrivées pendant la fenêtre (ms) sont classées en un seul appel, au plus batch_size par appel.
+    mood_refine_queue_max: int = Field(default=1000)
+    mood_refine_batch_size: int = Field(default=16)
+    mood_refine_batch_wait_ms: float = Field(default=20.0)
 
     # Email configuration
     email_user: str | None = Field(default=None)
@@ -57,6 +146,16 @@ class Settings(BaseSettings):
     email_host: str = Field(default="smtp.gmail.com")
     email_port: int = Field(default=587)
     verification_code_expire_minutes: int = Field(default=15)
+    email_from: str | None = Field(default=None, description="Expéditeur (par défaut EMAIL_USER)")
+    email_starttls: bool = Field(default=True)
+    email_smtp_timeout: float = Field(default=15.0)
+    # Fermer la connexion SMTP persistante après cette durée d'inactivité
+    email_smtp_idle_seconds: float = Field(default=60.0)
+    # File d'envoi: taille max, taille des lots, nombre d'essais et délai initial (doublé à chaque essai)
+    email_queue_max: int = Field(default=1000)
+    email_batch_size: int = Field(default=20)
+    email_max_attempts: int = Field(default=5)
+    email_retry_base_seconds: float = Field(default=5.0)
 
     # API Keys
     serpapi_api_key: str | None = Field(default=None)
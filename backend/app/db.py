@@ -1,10 +1,17 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy import create_engine, event, text
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 from .config import settings
 import urllib.parse
 import sys
 import socket
 import io
+import functools
+import threading
+import time
+import uuid
 
 # Configurer l'encodage UTF-8 pour Windows
 if sys.platform == 'win32':
@@ -18,11 +25,97 @@ class Base(DeclarativeBase):
     pass
 
 
-# Gérer l'encodage de l'URL de la base de données
-def get_engine():
-    """Crée l'engine SQLAlchemy avec gestion d'encodage."""
-    database_url = settings.database_url
-    
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool qui mesure le temps d'attente pour obtenir une connexion."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except sa_exc.TimeoutError:
+            with self._stats_lock:
+                self._timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+
+    def recreate(self):
+        # Conserver les compteurs quand SQLAlchemy recrée le pool (ex: dispose())
+        pool = super().recreate()
+        pool._checkouts, pool._timeouts = self._checkouts, self._timeouts
+        pool._wait_total, pool._wait_max = self._wait_total, self._wait_max
+        return pool
+
+    def wait_stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "wait_ms_total": round(self._wait_total * 1000, 3),
+                "wait_ms_max": round(self._wait_max * 1000, 3),
+                "wait_ms_avg": round(self._wait_total * 1000 / self._checkouts, 3) if self._checkouts else 0.0,
+            }
+
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool):
+    """Variante asyncio (équivalent de AsyncAdaptedQueuePool)."""
+
+    _is_asyncio = True
+    _queue_class = AsyncAdaptedQueuePool._queue_class
+    _dialect = AsyncAdaptedQueuePool._dialect
+
+
+def resolve_pool_mode(pgbouncer: bool) -> str:
+    """Détermine le mode de pool effectif à partir des paramètres."""
+    mode = (settings.db_pool_mode or "auto").lower()
+    if mode == "auto":
+        return "pgbouncer" if pgbouncer else "queue"
+    if mode not in ("queue", "pgbouncer", "null"):
+        raise ValueError(f"DB_POOL_MODE invalide: {settings.db_pool_mode} (attendu: auto, queue, pgbouncer, null)")
+    return mode
+
+
+def _pool_kwargs(mode: str) -> dict:
+    """Arguments create_engine() associés au mode de pool."""
+    if mode == "null":
+        # Ancien comportement: une connexion par session
+        return {"poolclass": NullPool, "pool_pre_ping": False}
+    kwargs = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+    if mode == "pgbouncer":
+        # pgbouncer (mode transaction) multiplexe les connexions serveur:
+        # on garde un petit pool client, on réutilise en priorité les connexions
+        # récentes (LIFO) pour laisser pgbouncer fermer les inactives, et on
+        # annule toute transaction au retour dans le pool.
+        kwargs["pool_use_lifo"] = True
+        kwargs["pool_reset_on_return"] = "rollback"
+    return kwargs
+
+
+def _is_pgbouncer_url(database_url: str) -> bool:
+    query_params = urllib.parse.parse_qs(urllib.parse.urlparse(database_url).query)
+    return query_params.get("pgbouncer", ["false"])[0].lower() in ("true", "1", "yes")
+
+
+def _decode_database_url(database_url) -> str:
     # S'assurer que l'URL est une chaîne UTF-8 valide
     if isinstance(database_url, bytes):
         try:
@@ -30,124 +123,136 @@ def get_engine():
         except UnicodeDecodeError:
             # Si UTF-8 échoue, essayer latin-1 (qui peut décoder n'importe quel byte)
             database_url = database_url.decode('latin-1')
-    
+    return database_url
+
+
+@functools.lru_cache(maxsize=8)
+def _clean_postgres_url(database_url: str) -> str:
+    """
+    Reconstruit l'URL PostgreSQL: hôte résolu en IPv4, mot de passe ré-encodé
+    et paramètre pgbouncer retiré (non supporté par les drivers).
+    """
+    parsed = urllib.parse.urlparse(database_url)
+    hostname = parsed.hostname
+
+    # Essayer de résoudre le hostname en IPv4 pour éviter les problèmes IPv6
+    try:
+        # Résoudre uniquement en IPv4 (AF_INET)
+        ipv4_address = socket.gethostbyname(hostname)
+        print(f"✅ Résolution DNS IPv4: {hostname} -> {ipv4_address}")
+        # Remplacer le hostname par l'IP IPv4 dans l'URL
+        hostname = ipv4_address
+    except socket.gaierror as dns_error:
+        print(f"⚠️ Warning: Impossible de résoudre {hostname} en IPv4: {dns_error}")
+        print("   Utilisation du hostname original (peut causer des timeouts IPv6)")
+
+    # Décoder le mot de passe si nécessaire
+    password = urllib.parse.unquote(parsed.password) if parsed.password else None
+
+    # Nettoyer les paramètres de requête - retirer pgbouncer qui n'est pas supporté par psycopg2
+    query_params = urllib.parse.parse_qs(parsed.query)
+    query_params.pop('pgbouncer', None)
+    clean_query = urllib.parse.urlencode(query_params, doseq=True)
+
+    # Reconstruire l'URL avec le mot de passe correctement encodé et l'IP IPv4
+    if password:
+        # Ré-encoder le mot de passe pour s'assurer qu'il est correct
+        encoded_password = urllib.parse.quote(password, safe='')
+        netloc = f"{parsed.username}:{encoded_password}@{hostname}"
+    else:
+        # Pas de mot de passe, mais on doit quand même remplacer le hostname
+        netloc = f"{parsed.username}@{hostname}"
+    if parsed.port:
+        netloc += f":{parsed.port}"
+    return urllib.parse.urlunparse((
+        parsed.scheme,
+        netloc,
+        parsed.path,
+        parsed.params,
+        clean_query,  # Utiliser la query nettoyée (sans pgbouncer)
+        parsed.fragment
+    ))
+
+
+def _to_asyncpg_url(database_url: str) -> str:
+    """Convertit une URL psycopg2 en URL asyncpg (sslmode -> ssl, options libpq retirées)."""
+    parsed = urllib.parse.urlparse(database_url)
+    scheme = "postgresql+asyncpg"
+    query_params = urllib.parse.parse_qs(parsed.query)
+    sslmode = query_params.pop("sslmode", None)
+    # asyncpg ne connaît pas les options libpq
+    for key in ("client_encoding", "connect_timeout", "keepalives", "keepalives_idle",
+                "keepalives_interval", "keepalives_count", "options"):
+        query_params.pop(key, None)
+    if sslmode and sslmode[0] != "disable":
+        query_params["ssl"] = sslmode
+    return urllib.parse.urlunparse((
+        scheme,
+        parsed.netloc,
+        parsed.path,
+        parsed.params,
+        urllib.parse.urlencode(query_params, doseq=True),
+        parsed.fragment,
+    ))
+
+
+def _report_connection_error(conn_error: Exception):
+    error_msg = str(conn_error)
+    error_lower = error_msg.lower()
+    # Ne pas afficher l'erreur complète si c'est juste un timeout (trop verbeux)
+    if "Connection timed out" in error_msg or "timeout" in error_lower:
+        print(f"⚠️ Warning: Test de connexion à Supabase échoué (timeout)")
+        print("   Le serveur peut démarrer, mais les tables doivent être créées manuellement.")
+        print("   💡 Exécutez: python diagnostic_supabase.py pour diagnostiquer le problème")
+    elif "does not exist" in error_lower or "relation" in error_lower:
+        print(f"⚠️ Warning: Les tables n'existent peut-être pas dans Supabase")
+        print("   💡 Créez les tables via Supabase Dashboard > SQL Editor (voir VERIFIER_TABLES.md)")
+    else:
+        print(f"⚠️ Warning: Test de connexion échoué: {conn_error}")
+        print("   💡 Exécutez: python diagnostic_supabase.py pour diagnostiquer le problème")
+
+
+# Gérer l'encodage de l'URL de la base de données
+def create_db_engine(database_url=None):
+    """Crée l'engine SQLAlchemy avec gestion d'encodage (sans se connecter)."""
+    database_url = _decode_database_url(database_url or settings.database_url)
+    pgbouncer = _is_pgbouncer_url(database_url)
+    pool_mode = resolve_pool_mode(pgbouncer)
+
     # Préparer les arguments de connexion
     if database_url.startswith("sqlite"):
         connect_args = {"check_same_thread": False}
     elif database_url.startswith("postgresql"):
         # Pour PostgreSQL, essayer de parser l'URL et reconstruire proprement
         try:
-            parsed = urllib.parse.urlparse(database_url)
-            hostname = parsed.hostname
-            
-            # Essayer de résoudre le hostname en IPv4 pour éviter les problèmes IPv6
-            try:
-                # Résoudre uniquement en IPv4 (AF_INET)
-                ipv4_address = socket.gethostbyname(hostname)
-                print(f"✅ Résolution DNS IPv4: {hostname} -> {ipv4_address}")
-                # Remplacer le hostname par l'IP IPv4 dans l'URL
-                hostname = ipv4_address
-            except socket.gaierror as dns_error:
-                print(f"⚠️ Warning: Impossible de résoudre {hostname} en IPv4: {dns_error}")
-                print("   Utilisation du hostname original (peut causer des timeouts IPv6)")
-            
-            # Décoder le mot de passe si nécessaire
-            password = urllib.parse.unquote(parsed.password) if parsed.password else None
-            
-            # Nettoyer les paramètres de requête - retirer pgbouncer qui n'est pas supporté par psycopg2
-            query_params = urllib.parse.parse_qs(parsed.query)
-            # Retirer pgbouncer des paramètres
-            if 'pgbouncer' in query_params:
-                del query_params['pgbouncer']
-            # Reconstruire la query string sans pgbouncer
-            clean_query = urllib.parse.urlencode(query_params, doseq=True)
-            
-            # Reconstruire l'URL avec le mot de passe correctement encodé et l'IP IPv4
-            if password:
-                # Ré-encoder le mot de passe pour s'assurer qu'il est correct
-                encoded_password = urllib.parse.quote(password, safe='')
-                # Reconstruire l'URL avec l'IP IPv4
-                netloc = f"{parsed.username}:{encoded_password}@{hostname}"
-                if parsed.port:
-                    netloc += f":{parsed.port}"
-                database_url = urllib.parse.urlunparse((
-                    parsed.scheme,
-                    netloc,
-                    parsed.path,
-                    parsed.params,
-                    clean_query,  # Utiliser la query nettoyée (sans pgbouncer)
-                    parsed.fragment
-                ))
-            else:
-                # Pas de mot de passe, mais on doit quand même remplacer le hostname
-                netloc = f"{parsed.username}@{hostname}"
-                if parsed.port:
-                    netloc += f":{parsed.port}"
-                database_url = urllib.parse.urlunparse((
-                    parsed.scheme,
-                    netloc,
-                    parsed.path,
-                    parsed.params,
-                    clean_query,  # Utiliser la query nettoyée (sans pgbouncer)
-                    parsed.fragment
-                ))
-            # Forcer IPv4 si nécessaire (résout les problèmes de timeout IPv6)
-            # Ajouter connect_timeout pour éviter les timeouts trop longs
-            # Timeout augmenté à 15 secondes pour les connexions lentes
-            connect_args = {
-                "client_encoding": "UTF8",
-                "connect_timeout": 15,  # Timeout de 15 secondes (augmenté pour connexions lentes)
-                "keepalives": 1,  # Activer les keepalives TCP
-                "keepalives_idle": 30,  # Temps avant le premier keepalive
-                "keepalives_interval": 10,  # Intervalle entre les keepalives
-                "keepalives_count": 3,  # Nombre de keepalives avant déconnexion
-            }
+            database_url = _clean_postgres_url(database_url)
         except Exception as e:
             print(f"⚠️ Warning: Could not parse database URL, using as-is: {e}")
-            connect_args = {
-                "client_encoding": "UTF8",
-                "connect_timeout": 15,  # Timeout de 15 secondes (augmenté pour connexions lentes)
-                "keepalives": 1,
-                "keepalives_idle": 30,
-                "keepalives_interval": 10,
-                "keepalives_count": 3,
-            }
+        # Forcer IPv4 si nécessaire (résout les problèmes de timeout IPv6)
+        # Ajouter connect_timeout pour éviter les timeouts trop longs
+        # Timeout configurable (DB_CONNECT_TIMEOUT, 15 secondes par défaut)
+        connect_args = {
+            "client_encoding": "UTF8",
+            "connect_timeout": settings.db_connect_timeout,
+            "keepalives": 1,  # Activer les keepalives TCP
+            "keepalives_idle": 30,  # Temps avant le premier keepalive
+            "keepalives_interval": 10,  # Intervalle entre les keepalives
+            "keepalives_count": 3,  # Nombre de keepalives avant déconnexion
+        }
     else:
         connect_args = {}
-    
+
     try:
         # Essayer de créer l'engine avec l'URL nettoyée
-        # Configuration du pool pour gérer les timeouts et les reconnexions
-        # Note: poolclass=NullPool désactive le pool pour éviter les problèmes de connexion persistante
-        from sqlalchemy.pool import NullPool
+        # Configuration du pool selon DB_POOL_MODE (voir _pool_kwargs)
         engine = create_engine(
             database_url,
             connect_args=connect_args,
-            poolclass=NullPool,  # Pas de pool pour éviter les problèmes de connexion persistante
-            pool_pre_ping=False,  # Désactivé car on n'utilise pas de pool
             echo=False,  # Désactiver les logs SQL en production
+            **_pool_kwargs(pool_mode),
         )
-        # Tester la connexion immédiatement pour détecter les erreurs
-        # Note: Ne pas faire planter si la connexion échoue (problème réseau temporaire)
-        try:
-            from sqlalchemy import text
-            with engine.connect() as conn:
-                conn.execute(text("SELECT 1"))
-        except Exception as conn_error:
-            error_msg = str(conn_error)
-            error_lower = error_msg.lower()
-            # Ne pas afficher l'erreur complète si c'est juste un timeout (trop verbeux)
-            if "Connection timed out" in error_msg or "timeout" in error_lower:
-                print(f"⚠️ Warning: Test de connexion à Supabase échoué (timeout)")
-                print("   Le serveur peut démarrer, mais les tables doivent être créées manuellement.")
-                print("   💡 Exécutez: python diagnostic_supabase.py pour diagnostiquer le problème")
-            elif "does not exist" in error_lower or "relation" in error_lower:
-                print(f"⚠️ Warning: Les tables n'existent peut-être pas dans Supabase")
-                print("   💡 Créez les tables via Supabase Dashboard > SQL Editor (voir VERIFIER_TABLES.md)")
-            else:
-                print(f"⚠️ Warning: Test de connexion échoué: {conn_error}")
-                print("   💡 Exécutez: python diagnostic_supabase.py pour diagnostiquer le problème")
-            # Ne pas lever l'erreur ici, laisser SQLAlchemy gérer les reconnexions
+        engine.info = {"pool_mode": pool_mode, "pgbouncer": pgbouncer}
+        print(f"✅ Pool de connexions: mode={pool_mode}")
         return engine
     except Exception as e:
         print(f"❌ Erreur lors de la création de l'engine de base de données: {e}")
@@ -157,12 +262,130 @@ def get_engine():
         raise
 
 
-engine = get_engine()
+def create_async_db_engine(database_url=None) -> AsyncEngine:
+    """Crée l'engine asynchrone (asyncpg) avec le même paramétrage de pool."""
+    database_url = _decode_database_url(database_url or settings.database_url)
+    pgbouncer = _is_pgbouncer_url(database_url)
+    pool_mode = resolve_pool_mode(pgbouncer)
+    try:
+        database_url = _clean_postgres_url(database_url)
+    except Exception as e:
+        print(f"⚠️ Warning: Could not parse database URL, using as-is: {e}")
+    database_url = _to_asyncpg_url(database_url)
+
+    connect_args = {"timeout": settings.db_connect_timeout}
+    if pool_mode == "pgbouncer":
+        # pgbouncer (mode transaction) ne supporte pas les prepared statements nommés
+        # réutilisés d'une transaction à l'autre: désactiver les caches asyncpg et
+        # donner un nom unique à chaque statement.
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+
+    pool_kwargs = _pool_kwargs(pool_mode)
+    if pool_kwargs["poolclass"] is InstrumentedQueuePool:
+        pool_kwargs["poolclass"] = InstrumentedAsyncQueuePool
+    engine = create_async_engine(
+        database_url,
+        connect_args=connect_args,
+        echo=False,
+        **pool_kwargs,
+    )
+    engine.sync_engine.info = {"pool_mode": pool_mode, "pgbouncer": pgbouncer}
+    return engine
+
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Les engines sont créés à la première utilisation (ou par le hook de démarrage
+# de l'application): importer ce module ne fait ni résolution DNS ni connexion.
+_engine = None
+_async_engine = None
+_async_replica_engine = None
+_engine_lock = threading.Lock()
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+# expire_on_commit=False: les objets restent lisibles après commit sans
+# rechargement implicite (le lazy-loading n'est pas disponible en asynchrone)
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+
+
+def get_engine():
+    """Retourne l'engine synchrone, créé à la première demande."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_db_engine()
+                SessionLocal.configure(bind=_engine)
+    return _engine
+
+
+def get_async_engine() -> AsyncEngine:
+    """Retourne l'engine asynchrone, créé à la première demande."""
+    global _async_engine
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                _async_engine = create_async_db_engine()
+                AsyncSessionLocal.configure(bind=_async_engine)
+    return _async_engine
+
+
+def get_async_replica_engine() -> AsyncEngine | None:
+    """Engine asynchrone du réplica en lecture (pool distinct), ou None si non configuré."""
+    global _async_replica_engine
+    if not settings.database_replica_url:
+        return None
+    if _async_replica_engine is None:
+        with _engine_lock:
+            if _async_replica_engine is None:
+                _async_replica_engine = create_async_db_engine(settings.database_replica_url)
+    return _async_replica_engine
+
+
+def __getattr__(name):
+    # Compatibilité: `from app.db import engine` crée l'engine à la demande
+    if name == "engine":
+        return get_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def check_connection() -> bool:
+    """Teste la connexion (SELECT 1) sans faire planter l'application."""
+    try:
+        with get_engine().connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return True
+    except Exception as conn_error:
+        _report_connection_error(conn_error)
+        # Ne pas lever l'erreur ici, laisser SQLAlchemy gérer les reconnexions
+        return False
+
+
+async def check_async_connection() -> bool:
+    try:
+        async with get_async_engine().connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        return True
+    except Exception as conn_error:
+        _report_connection_error(conn_error)
+        return False
+
+
+async def dispose_engines():
+    """Ferme les pools (arrêt de l'application)."""
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _async_replica_engine is not None:
+        await _async_replica_engine.dispose()
+    if _engine is not None:
+        _engine.dispose()
 
 
 def get_db():
+    get_engine()
     db = SessionLocal()
     try:
         yield db
@@ -170,3 +393,117 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    get_async_engine()
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# --- Routage des lectures vers le réplica ---
+#
+# Après une écriture, les lectures de l'utilisateur restent sur le primaire
+# pendant REPLICA_STICKY_SECONDS (read-your-writes). L'état est local au
+# processus: avec plusieurs workers, la fenêtre couvre le retard de réplication
+# habituel mais pas une requête servie par un autre worker.
+
+_routing_lock = threading.Lock()
+_recent_writers: dict[int, float] = {}
+_replica_down_until = 0.0
+_routing_stats = {"replica": 0, "primary_sticky": 0, "primary_fallback": 0, "primary_no_replica": 0}
+
+
+def note_user_write(user_id: int):
+    """Garde les lectures de cet utilisateur sur le primaire pendant la fenêtre sticky."""
+    now = time.monotonic()
+    with _routing_lock:
+        _recent_writers[user_id] = now + settings.replica_sticky_seconds
+        if len(_recent_writers) > 10_000:
+            for uid, until in list(_recent_writers.items()):
+                if until <= now:
+                    del _recent_writers[uid]
+
+
+def is_read_sticky(user_id: int | None) -> bool:
+    if user_id is None:
+        return False
+    with _routing_lock:
+        until = _recent_writers.get(user_id)
+    return until is not None and until > time.monotonic()
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_session_write(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _record_user_write(session):
+    # user_id est renseigné par get_current_user / get_current_user_async
+    if session.info.pop("wrote", False) and session.info.get("user_id") is not None:
+        note_user_write(session.info["user_id"])
+
+
+@event.listens_for(Session, "after_rollback")
+def _reset_session_write(session):
+    session.info.pop("wrote", None)
+
+
+def _count_route(key: str):
+    with _routing_lock:
+        _routing_stats[key] += 1
+
+
+async def open_async_read_session(user_id: int | None = None) -> AsyncSession:
+    """
+    Ouvre une session de lecture: réplica si configuré, disponible et si
+    l'utilisateur n'a pas écrit récemment; primaire sinon.
+    """
+    global _replica_down_until
+    replica = get_async_replica_engine()
+    if replica is None:
+        _count_route("primary_no_replica")
+    elif is_read_sticky(user_id):
+        _count_route("primary_sticky")
+    elif time.monotonic() < _replica_down_until:
+        _count_route("primary_fallback")
+    else:
+        db = AsyncSessionLocal(bind=replica)
+        try:
+            # Obtenir la connexion tout de suite pour détecter un réplica indisponible
+            await db.connection()
+            _count_route("replica")
+            return db
+        except Exception as e:
+            await db.close()
+            _replica_down_until = time.monotonic() + settings.replica_retry_seconds
+            print(f"⚠️ Warning: réplica indisponible, lectures sur le primaire pendant {settings.replica_retry_seconds}s: {e}")
+            _count_route("primary_fallback")
+    get_async_engine()
+    return AsyncSessionLocal()
+
+
+def _engine_pool_stats(engine) -> dict:
+    if engine is None:
+        return {"status": "not initialized"}
+    pool = engine.pool
+    stats = {"mode": engine.info.get("pool_mode"), "status": pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update(pool.wait_stats())
+    return stats
+
+
+def pool_stats() -> dict:
+    """Statistiques des pools de connexions (exposées sur /health/stats)."""
+    return {
+        "primary": _engine_pool_stats(_engine),
+        "primary_async": _engine_pool_stats(_async_engine.sync_engine if _async_engine else None),
+        "replica_async": _engine_pool_stats(_async_replica_engine.sync_engine if _async_replica_engine else None),
+        "read_routing": dict(_routing_stats, replica_available=time.monotonic() >= _replica_down_until),
+    }
@@ -1,35 +1,43 @@
-"""Service d'envoi d'emails pour la vérification de compte."""
+"""
+Service d'envoi d'emails pour la vérification de compte.
+
+Les routes n'envoient plus d'email elles-mêmes: elles enregistrent une ligne
+email_deliveries et déposent le message dans une file. Un thread de fond
+(MailWorker) garde une connexion SMTP authentifiée ouverte, envoie les
+messages par lots, réessaie avec un délai exponentiel et met à jour le statut
+de chaque envoi.
+"""
 import smtplib
+import time
+from dataclasses import dataclass
+from datetime import datetime
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import Optional
+
+from sqlalchemy.orm import Session
+
 from .config import settings
+from .db import SessionLocal, get_engine
+from .workers import BackgroundWorker
+from . import models
 
 
-def send_verification_email(email: str, verification_code: str) -> bool:
+def build_verification_message(email: str, verification_code: str) -> MIMEMultipart:
     """
-    Envoie un email avec le code de vérification.
+    Construit l'email contenant le code de vérification.
     
     Args:
         email: Adresse email du destinataire
         verification_code: Code de vérification à 6 chiffres
-        
-    Returns:
-        True si l'email a été envoyé avec succès, False sinon
     """
-    if not settings.email_user or not settings.email_pass:
-        print("Warning: Email credentials not configured. Cannot send verification email.")
-        return False
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = "Vérification de votre compte HumanLink"
+    msg["From"] = settings.email_from or settings.email_user
+    msg["To"] = email
     
-    try:
-        # Créer le message
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = "Vérification de votre compte HumanLink"
-        msg["From"] = settings.email_user
-        msg["To"] = email
-        
-        # Corps du message en texte brut
-        text = f"""Bonjour,
+    # Corps du message en texte brut
+    text = f"""Bonjour,
 
 Merci de vous être inscrit sur HumanLink!
 
@@ -42,9 +50,9 @@ Si vous n'avez pas créé de compte, veuillez ignorer cet email.
 Cordialement,
 L'équipe HumanLink
 """
-        
-        # Corps du message en HTML
-        html = f"""<!DOCTYPE html>
+    
+    # Corps du message en HTML
+    html = f"""<!DOCTYPE html>
 <html>
 <head>
     <meta charset="utf-8">
@@ -95,23 +103,149 @@ L'équipe HumanLink
 </body>
 </html>
 """
-        
-        # Attacher les deux versions
-        part1 = MIMEText(text, "plain", "utf-8")
-        part2 = MIMEText(html, "html", "utf-8")
-        msg.attach(part1)
-        msg.attach(part2)
-        
-        # Envoyer l'email via SMTP
-        with smtplib.SMTP(settings.email_host, settings.email_port) as server:
+    
+    # Attacher les deux versions
+    msg.attach(MIMEText(text, "plain", "utf-8"))
+    msg.attach(MIMEText(html, "html", "utf-8"))
+    return msg
+
+
+@dataclass
+class OutboundEmail:
+    delivery_id: int
+    email: str
+    message: MIMEMultipart
+    attempts: int = 0
+
+
+class MailWorker(BackgroundWorker):
+    """Envoie les emails en file via une connexion SMTP persistante."""
+
+    def __init__(self):
+        super().__init__(
+            "mail-worker",
+            max_queue=settings.email_queue_max,
+            batch_size=settings.email_batch_size,
+            batch_wait=0.05,
+        )
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    # --- Connexion SMTP ---
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(settings.email_host, settings.email_port, timeout=settings.email_smtp_timeout)
+        if settings.email_starttls:
             server.starttls()
+        if settings.email_user and settings.email_pass:
             server.login(settings.email_user, settings.email_pass)
-            server.send_message(msg)
-        
-        print(f"Verification email sent to {email}")
-        return True
-        
-    except Exception as e:
-        print(f"Error sending verification email to {email}: {e}")
+        return server
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._smtp is not None:
+            try:
+                # Vérifier que la connexion est toujours vivante
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except smtplib.SMTPException:
+                pass
+            except OSError:
+                pass
+            self._close()
+        self._smtp = self._connect()
+        return self._smtp
+
+    def _close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def on_idle(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > settings.email_smtp_idle_seconds:
+            self._close()
+
+    def on_stop(self):
+        self._close()
+
+    # --- Envoi ---
+    def process_batch(self, items: list[OutboundEmail]):
+        results: list[tuple[OutboundEmail, Optional[str]]] = []
+        for item in items:
+            item.attempts += 1
+            try:
+                self._connection().send_message(item.message)
+                results.append((item, None))
+            except Exception as e:
+                # Connexion probablement cassée: la rouvrir pour le message suivant
+                self._close()
+                results.append((item, f"{type(e).__name__}: {e}"))
+        self._last_used = time.monotonic()
+
+        for item, error in results:
+            if error is None:
+                print(f"Verification email sent to {item.email}")
+            elif item.attempts < settings.email_max_attempts:
+                delay = settings.email_retry_base_seconds * (2 ** (item.attempts - 1))
+                print(f"⚠️ Envoi à {item.email} échoué (tentative {item.attempts}), nouvel essai dans {delay}s: {error}")
+                self.retry_later(item, delay)
+            else:
+                print(f"Error sending verification email to {item.email}: {error}")
+        self._record(results)
+
+    def _record(self, results: list[tuple[OutboundEmail, Optional[str]]]):
+        """Met à jour email_deliveries pour tout le lot en une transaction."""
+        get_engine()
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            for item, error in results:
+                delivery = db.get(models.EmailDelivery, item.delivery_id)
+                if delivery is None:
+                    continue
+                delivery.attempts = item.attempts
+                if error is None:
+                    delivery.status = "sent"
+                    delivery.sent_at = now
+                    delivery.last_error = None
+                else:
+                    delivery.status = "retrying" if item.attempts < settings.email_max_attempts else "failed"
+                    delivery.last_error = error[:500]
+                delivery.updated_at = now
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ Warning: statut des emails non enregistré: {e}")
+        finally:
+            db.close()
+
+
+mail_worker = MailWorker()
+
+
+def queue_verification_email(db: Session, user: models.User, verification_code: str) -> bool:
+    """
+    Enregistre l'envoi et met l'email en file d'attente (ne bloque pas la requête).
+
+    Returns:
+        True si l'email a été mis en file, False si l'envoi est impossible
+        (configuration manquante ou file pleine)
+    """
+    if not settings.email_user:
+        print("Warning: Email credentials not configured. Cannot send verification email.")
         return False
 
+    delivery = models.EmailDelivery(user_id=user.id, email=user.email, kind="verification", status="queued")
+    db.add(delivery)
+    db.commit()
+    db.refresh(delivery)
+
+    message = build_verification_message(user.email, verification_code)
+    if not mail_worker.submit(OutboundEmail(delivery_id=delivery.id, email=user.email, message=message)):
+        delivery.status = "failed"
+        delivery.last_error = "queue full"
+        db.commit()
+        print(f"⚠️ File d'envoi des emails pleine, email non envoyé à {user.email}")
+        return False
+    return True
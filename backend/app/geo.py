@@ -0,0 +1,160 @@
+"""
+Index spatial par cellules geohash.
+
+Chaque humeur géolocalisée reçoit ses cellules geohash à plusieurs précisions
+(colonnes geohash_4, geohash_5, geohash_6, indexées). Une recherche "dans un
+rayon" devient:
+  1. covering_cells(): cellules qui recouvrent le cercle, à la précision la
+     plus fine qui reste sous MAX_COVERING_CELLS;
+  2. cell_filter(): `geohash_N IN (...)` en SQL (recherche par index);
+  3. haversine_m(): filtre exact sur les lignes retournées (ou distance_m_sql()
+     quand la requête doit trier ou plafonner sur les seules lignes du cercle).
+
+Tailles approximatives (hauteur x largeur à l'équateur):
+  précision 4: 19.5 km x 39 km, 5: 4.9 km x 4.9 km, 6: 610 m x 1.2 km.
+"""
+from math import asin, cos, degrees, floor, radians, sin, sqrt
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, func
+
+
+EARTH_RADIUS_M = 6371000.0
+CELL_PRECISIONS = (4, 5, 6)
+# Au-delà, on passe à une précision plus grossière (liste IN trop longue)
+MAX_COVERING_CELLS = 48
+# Rayon trop grand même pour la précision la plus grossière: fenêtre lat/lng seule
+MAX_COARSE_CELLS = 1024
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * asin(sqrt(a))
+
+
+def haversine_m_array(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Distances (m) d'un point à un ensemble de points, en une passe vectorisée."""
+    lat1 = np.radians(lat)
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    dlat = lat2 - lat1
+    dlon = np.radians(np.asarray(lngs, dtype=np.float64) - lng)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def geohash_encode(lat: float, lng: float, precision: int) -> str:
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True  # les bits pairs codent la longitude
+    while len(chars) < precision:
+        rng, coord = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def cell_size_deg(precision: int) -> Tuple[float, float]:
+    """(hauteur, largeur) d'une cellule en degrés."""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def cell_columns(lat: Optional[float], lng: Optional[float]) -> dict:
+    """Valeurs des colonnes geohash_<p> pour une position (None si pas de position)."""
+    if lat is None or lng is None:
+        return {f"geohash_{p}": None for p in CELL_PRECISIONS}
+    full = geohash_encode(lat, lng, max(CELL_PRECISIONS))
+    return {f"geohash_{p}": full[:p] for p in CELL_PRECISIONS}
+
+
+def bounding_box(lat: float, lng: float, radius_m: float) -> Tuple[float, float, float, float]:
+    """(lat_min, lat_max, lng_min, lng_max) contenant le cercle; la largeur tient compte de la latitude."""
+    dlat = degrees(radius_m / EARTH_RADIUS_M)
+    lat_min, lat_max = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    # Largeur à la latitude la plus proche du pôle (la plus large en degrés)
+    cos_lat = cos(radians(max(abs(lat_min), abs(lat_max))))
+    if cos_lat < 1e-6:
+        return lat_min, lat_max, -180.0, 180.0
+    dlng = degrees(radius_m / (EARTH_RADIUS_M * cos_lat))
+    if dlng >= 180.0:
+        return lat_min, lat_max, -180.0, 180.0
+    return lat_min, lat_max, lng - dlng, lng + dlng
+
+
+def _cells_in_box(box: Tuple[float, float, float, float], precision: int, limit: int) -> Optional[List[str]]:
+    lat_min, lat_max, lng_min, lng_max = box
+    height, width = cell_size_deg(precision)
+    n_rows, n_cols = round(180.0 / height), round(360.0 / width)
+    row_first = max(int(floor((lat_min + 90.0) / height)), 0)
+    row_last = min(int(floor((lat_max + 90.0) / height)), n_rows - 1)
+    col_first = int(floor((lng_min + 180.0) / width))
+    col_last = int(floor((lng_max + 180.0) / width))
+    cols = min(col_last - col_first + 1, n_cols)
+    if (row_last - row_first + 1) * cols > limit:
+        return None
+    cells = []
+    for row in range(row_first, row_last + 1):
+        center_lat = -90.0 + (row + 0.5) * height
+        for i in range(cols):
+            col = (col_first + i) % n_cols  # antiméridien
+            cells.append(geohash_encode(center_lat, -180.0 + (col + 0.5) * width, precision))
+    return cells
+
+
+def cells_for_radius(lat: float, lng: float, radius_m: float, precision: int) -> List[str]:
+    """Toutes les cellules de précision donnée qui recoupent le cercle (sans limite de nombre)."""
+    return _cells_in_box(bounding_box(lat, lng, radius_m), precision, limit=1 << 62)
+
+
+def covering_cells(lat: float, lng: float, radius_m: float) -> Optional[Tuple[int, List[str]]]:
+    """(précision, cellules) recouvrant le cercle, ou None si le rayon est trop grand."""
+    box = bounding_box(lat, lng, radius_m)
+    for precision in sorted(CELL_PRECISIONS, reverse=True):
+        cells = _cells_in_box(box, precision, MAX_COVERING_CELLS)
+        if cells is not None:
+            return precision, cells
+    cells = _cells_in_box(box, min(CELL_PRECISIONS), MAX_COARSE_CELLS)
+    return (min(CELL_PRECISIONS), cells) if cells is not None else None
+
+
+def cell_filter(model, lat: float, lng: float, radius_m: float):
+    """
+    Clause WHERE (approximative, par excès) pour les lignes de `model` dans le rayon.
+    `model` doit avoir les colonnes lat, lng et geohash_<p>; compléter par haversine_m.
+    """
+    covering = covering_cells(lat, lng, radius_m)
+    if covering is not None:
+        precision, cells = covering
+        return getattr(model, f"geohash_{precision}").in_(cells)
+    lat_min, lat_max, lng_min, lng_max = bounding_box(lat, lng, radius_m)
+    return and_(model.lat.between(lat_min, lat_max), model.lng.between(lng_min, lng_max))
+
+
+def distance_m_sql(model, lat: float, lng: float):
+    """Expression SQL de haversine_m() entre le point et (model.lat, model.lng), en mètres."""
+    dlat = func.radians(model.lat - lat)
+    dlng = func.radians(model.lng - lng)
+    a = func.power(func.sin(dlat / 2), 2) + cos(radians(lat)) * func.cos(func.radians(model.lat)) * func.power(
+        func.sin(dlng / 2), 2
+    )
+    return 2 * EARTH_RADIUS_M * func.asin(func.sqrt(func.least(a, 1.0)))
@@ -0,0 +1,734 @@
+"""
+Index géographique des utilisateurs actifs, partagé par les workers d'un nœud.
+
+Dernière position et humeur des utilisateurs actifs (GEO_INDEX_ACTIVE_HOURS),
+sous forme de tableaux NumPy dans un segment multiprocessing.shared_memory:
+tous les workers uvicorn du nœud lisent la même copie.
+
+Recherche par grille: chaque utilisateur est chaîné dans le seau de sa case
+(GEO_INDEX_CELL_DEG degrés); une recherche parcourt les seaux du rayon, ou
+balaie tout le tableau (vectorisé) quand les seaux couvrent trop de lignes.
+
+Mises à jour:
+  - POST /mood/ (record_mood) et l'affinage par le LLM (relabel) écrivent
+    directement dans le segment;
+  - toutes les GEO_INDEX_SYNC_SECONDS, un worker relit les humeurs récentes de
+    user_latest_mood (écrites par les autres nœuds);
+  - reconstruction depuis la base au démarrage, toutes les
+    GEO_INDEX_REBUILD_MINUTES (purge des inactifs) et quand l'index est plein.
+
+Concurrence: écritures sérialisées par un verrou de fichier (fcntl.flock)
+entre processus (sans fcntl, ex: Windows, l'index est désactivé); lectures sans verrou avec un compteur de séquence (impair
+pendant une écriture, relecture si modifié). Quand l'index n'est pas
+utilisable (désactivé, en construction, incomplet), nearby() retourne None et
+les routeurs interrogent la base.
+"""
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from math import floor
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import settings
+from .db import SessionLocal, get_engine
+from .geo import bounding_box, haversine_m_array
+from . import models
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: pas de flock, les routeurs interrogent la base
+    fcntl = None
+
+
+_MAGIC = 0x484C47454F0001  # "HLGEO", version 1 de la disposition
+# En-tête (int64)
+(
+    _H_MAGIC, _H_SEQ, _H_COUNT, _H_CAPACITY, _H_HEADS, _H_SORTED, _H_LABELS, _H_CELL_NANODEG,
+    _H_COMPLETE, _H_NEEDS_REBUILD, _H_BUILT_AT_MS, _H_SYNCED_AT_MS, _H_REBUILDS, _H_WRITES,
+) = range(14)
+_HEADER_LEN = 16
+_MAX_LABELS = 32
+_LABEL_BYTES = 32
+
+# Au-delà, balayage vectorisé de tout le tableau plutôt que parcours des seaux
+_MAX_WALK_BUCKETS = 1024
+_MIN_SCAN_ROWS = 4096
+# Marge de relecture de la synchronisation (transactions validées dans le désordre)
+_SYNC_OVERLAP = timedelta(seconds=10)
+_SYNC_BATCH = 10_000
+_READ_ATTEMPTS = 3
+
+
+class GeoHits(NamedTuple):
+    """Utilisateurs trouvés (tableaux alignés), avec leur distance au point recherché."""
+    user_ids: np.ndarray
+    mood_event_ids: np.ndarray
+    lats: np.ndarray
+    lngs: np.ndarray
+    labels: List[str]
+    mood_scores: np.ndarray
+    created_at: np.ndarray  # secondes epoch (UTC)
+    dist: np.ndarray
+
+    def top(self, n: int, key: np.ndarray) -> "GeoHits":
+        """Les `n` résultats de plus petite clé: même plafond que la requête SQL de repli."""
+        if len(self.user_ids) <= n:
+            return self
+        keep = np.argpartition(key, n - 1)[:n]
+        return GeoHits(*(f[keep] if isinstance(f, np.ndarray) else [f[i] for i in keep] for f in self))
+
+
+def _layout(capacity: int, n_heads: int):
+    fields = [
+        ("header", np.int64, _HEADER_LEN),
+        ("label_names", np.uint8, _MAX_LABELS * _LABEL_BYTES),
+        ("user_id", np.int64, capacity),
+        ("mood_event_id", np.int64, capacity),
+        ("lat", np.float64, capacity),
+        ("lng", np.float64, capacity),
+        ("created_at", np.float64, capacity),
+        ("mood_score", np.float32, capacity),
+        ("row", np.int32, capacity),
+        ("col", np.int32, capacity),
+        ("next", np.int32, capacity),
+        ("heads", np.int32, n_heads),
+        ("bucket_count", np.int32, n_heads),
+        ("label", np.int8, capacity),
+    ]
+    offsets, size = {}, 0
+    for name, dtype, length in fields:
+        size = (size + 7) // 8 * 8
+        offsets[name] = (size, dtype, length)
+        size += np.dtype(dtype).itemsize * length
+    return offsets, size
+
+
+def _epoch(dt: datetime) -> float:
+    # Colonnes DateTime naïves en UTC; timestamptz (aware) avec asyncpg
+    return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def _bucket_hash(row, col, mask: int):
+    return ((row * 73856093) ^ (col * 19349663)) & mask
+
+
+class SharedGeoIndex:
+    def __init__(self):
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._lock_path: Optional[str] = None
+        self._lock_file = None
+        self._thread_lock = threading.Lock()
+        self._labels_cache: tuple = (0, [])
+        self._stats_lock = threading.Lock()
+        self._stats = {"lookups": 0, "served": 0, "fallbacks": 0, "retries": 0, "bucket_walks": 0, "scans": 0}
+
+    # --- segment partagé -------------------------------------------------
+
+    def open(self, name: str, capacity: int, cell_deg: float) -> bool:
+        """Attache le segment `name` (le crée s'il n'existe pas); True s'il vient d'être créé."""
+        self._lock_path = os.path.join(tempfile.gettempdir(), f"{name}.lock")
+        self._lock_file = open(self._lock_path, "a+")
+        with self._file_lock(self._lock_file):
+            created = False
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+                header = np.ndarray((_HEADER_LEN,), dtype=np.int64, buffer=shm.buf)
+                if header[_H_MAGIC] != _MAGIC or shm.size < _layout(int(header[_H_CAPACITY]), int(header[_H_HEADS]))[1]:
+                    # Segment d'une version précédente: le remplacer
+                    del header
+                    shm.close()
+                    shm.unlink()
+                    raise FileNotFoundError
+            except FileNotFoundError:
+                n_heads = 1 << max(2 * capacity - 1, 1).bit_length()
+                shm = shared_memory.SharedMemory(name=name, create=True, size=_layout(capacity, n_heads)[1])
+                created = True
+            # Le segment survit aux workers: ne pas le laisser supprimer à la sortie du processus
+            resource_tracker.unregister(shm._name, "shared_memory")
+            if created:
+                header = np.ndarray((_HEADER_LEN,), dtype=np.int64, buffer=shm.buf)
+                header[_H_CAPACITY], header[_H_HEADS] = capacity, n_heads
+                header[_H_CELL_NANODEG] = round(cell_deg * 1e9)
+                header[_H_NEEDS_REBUILD] = 1
+            del header
+            self._shm = shm
+            self._map()
+            if created:
+                self.heads[:] = -1
+                self.header[_H_MAGIC] = _MAGIC
+            elif self.capacity != capacity or self.cell_deg != round(cell_deg * 1e9) / 1e9:
+                print(
+                    f"⚠️  Index géographique {name}: capacité {self.capacity} et cases de "
+                    f"{self.cell_deg}° du segment existant conservées"
+                )
+        return created
+
+    def _map(self):
+        header = np.ndarray((_HEADER_LEN,), dtype=np.int64, buffer=self._shm.buf)
+        capacity, n_heads = int(header[_H_CAPACITY]), int(header[_H_HEADS])
+        offsets, _ = _layout(capacity, n_heads)
+        for name, (offset, dtype, length) in offsets.items():
+            setattr(self, name, np.ndarray((length,), dtype=dtype, buffer=self._shm.buf, offset=offset))
+        # Parcours des chaînes en Python: memoryview (plus rapide que l'indexation NumPy élément par élément)
+        self._heads_mv = memoryview(self.heads).cast("B").cast("i")
+        self._next_mv = memoryview(self.next).cast("B").cast("i")
+        self._row_mv = memoryview(self.row).cast("B").cast("i")
+        self._col_mv = memoryview(self.col).cast("B").cast("i")
+        self.capacity, self.mask = capacity, n_heads - 1
+        self.cell_deg = int(header[_H_CELL_NANODEG]) / 1e9 or 0.01
+        self.n_rows, self.n_cols = round(180.0 / self.cell_deg), round(360.0 / self.cell_deg)
+
+    def close(self):
+        if self._shm is None:
+            return
+        shm, self._shm = self._shm, None
+        for name in ("_heads_mv", "_next_mv", "_row_mv", "_col_mv"):
+            getattr(self, name).release()
+            delattr(self, name)
+        for name in _layout(0, 0)[0]:
+            delattr(self, name)
+        shm.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    @property
+    def attached(self) -> bool:
+        return self._shm is not None
+
+    @property
+    def ready(self) -> bool:
+        if self._shm is None:
+            return False
+        h = self.header
+        return bool(h[_H_COMPLETE]) and not h[_H_NEEDS_REBUILD]
+
+    # --- écritures -------------------------------------------------------
+
+    @staticmethod
+    @contextmanager
+    def _file_lock(lock_file, blocking: bool = True):
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _writing(self):
+        # flock exclut les autres processus, le verrou local les autres threads (même descripteur)
+        with self._thread_lock, self._file_lock(self._lock_file):
+            h = self.header
+            if h[_H_SEQ] & 1:
+                # Un écrivain s'est arrêté au milieu d'une écriture: contenu incertain
+                h[_H_SEQ] += 1
+                h[_H_NEEDS_REBUILD] = 1
+            h[_H_SEQ] += 1
+            try:
+                yield h
+            finally:
+                h[_H_WRITES] += 1
+                h[_H_SEQ] += 1
+
+    def _label_names(self) -> List[str]:
+        n = int(self.header[_H_LABELS])
+        if self._labels_cache[0] != n:
+            raw = self.label_names.reshape(_MAX_LABELS, _LABEL_BYTES)[:n]
+            self._labels_cache = (n, [bytes(r).rstrip(b"\0").decode("utf-8") for r in raw])
+        return self._labels_cache[1]
+
+    def _label_id(self, label: str) -> int:
+        """Identifiant du label, ajouté à la table si besoin (sous _writing); -1 si la table est pleine."""
+        names = self._label_names()
+        if label in names:
+            return names.index(label)
+        n = len(names)
+        encoded = label.encode("utf-8")
+        if n >= _MAX_LABELS or len(encoded) > _LABEL_BYTES:
+            return -1
+        table = self.label_names.reshape(_MAX_LABELS, _LABEL_BYTES)
+        table[n] = 0
+        table[n, :len(encoded)] = np.frombuffer(encoded, dtype=np.uint8)
+        self.header[_H_LABELS] = n + 1
+        return n
+
+    def _cell(self, lat: float, lng: float):
+        row = min(max(int(floor((lat + 90.0) / self.cell_deg)), 0), self.n_rows - 1)
+        return row, int(floor((lng + 180.0) / self.cell_deg)) % self.n_cols
+
+    def _slot(self, user_id: int) -> int:
+        h = self.header
+        n_sorted, count = int(h[_H_SORTED]), int(h[_H_COUNT])
+        # Partie triée par user_id (reconstruction), puis ajouts depuis
+        i = int(np.searchsorted(self.user_id[:n_sorted], user_id))
+        if i < n_sorted and self.user_id[i] == user_id:
+            return i
+        tail = np.flatnonzero(self.user_id[n_sorted:count] == user_id)
+        return n_sorted + int(tail[0]) if len(tail) else -1
+
+    def _link(self, s: int, row: int, col: int):
+        b = _bucket_hash(row, col, self.mask)
+        self.row[s], self.col[s] = row, col
+        self.next[s] = self.heads[b]
+        self.heads[b] = s
+        self.bucket_count[b] += 1
+
+    def _unlink(self, s: int):
+        b = _bucket_hash(int(self.row[s]), int(self.col[s]), self.mask)
+        prev, cur = -1, int(self.heads[b])
+        while cur != -1:
+            if cur == s:
+                if prev == -1:
+                    self.heads[b] = self.next[s]
+                else:
+                    self.next[prev] = self.next[s]
+                self.bucket_count[b] -= 1
+                self.next[s] = -1
+                return
+            prev, cur = cur, int(self.next[cur])
+
+    def upsert(
+        self, user_id: int, mood_event_id: int, lat: float, lng: float, label: str, mood_score: float, created_at: float
+    ) -> bool:
+        """Enregistre la dernière humeur d'un utilisateur (ignorée si une plus récente est déjà indexée)."""
+        with self._writing() as h:
+            s = self._slot(user_id)
+            if s >= 0 and self.mood_event_id[s] > mood_event_id:
+                return False
+            if s < 0:
+                count = int(h[_H_COUNT])
+                if count >= self.capacity:
+                    # Plein: servir depuis la base jusqu'à la prochaine reconstruction (purge des inactifs)
+                    h[_H_COMPLETE] = 0
+                    h[_H_NEEDS_REBUILD] = 1
+                    return False
+                s = count
+                self.user_id[s] = user_id
+                self.label[s] = -1
+                h[_H_COUNT] = count + 1
+            if self.label[s] >= 0:
+                self._unlink(s)
+            label_id = self._label_id(label)
+            self.mood_event_id[s] = mood_event_id
+            self.lat[s], self.lng[s] = lat, lng
+            self.created_at[s] = created_at
+            self.mood_score[s] = mood_score
+            self.label[s] = label_id
+            if label_id >= 0:
+                self._link(s, *self._cell(lat, lng))
+            return True
+
+    def remove(self, user_id: int, mood_event_id: int):
+        """La dernière humeur de l'utilisateur (mood_event_id) n'a pas de position."""
+        with self._writing():
+            s = self._slot(user_id)
+            if s >= 0 and self.mood_event_id[s] <= mood_event_id:
+                if self.label[s] >= 0:
+                    self._unlink(s)
+                self.label[s] = -1
+                self.mood_event_id[s] = mood_event_id
+
+    def relabel(self, mood_event_id: int, label: str, mood_score: float):
+        """Étiquette affinée d'une humeur, si c'est encore la dernière indexée de son auteur."""
+        with self._writing() as h:
+            hit = np.flatnonzero(self.mood_event_id[:int(h[_H_COUNT])] == mood_event_id)
+            if len(hit) and self.label[hit[0]] >= 0:
+                s = int(hit[0])
+                label_id = self._label_id(label)
+                if label_id < 0:
+                    self._unlink(s)
+                self.label[s] = label_id
+                self.mood_score[s] = mood_score
+
+    def load(self, snapshot: Dict[str, np.ndarray], labels: List[str], complete: bool, started_at: float, synced_at: float):
+        """
+        Remplace le contenu par `snapshot` (lu en base à partir de `started_at`).
+
+        Les entrées indexées plus récentes que la ligne lue (écrites pendant la
+        lecture) sont conservées.
+        """
+        with self._writing() as h:
+            count = int(h[_H_COUNT])
+            keep = np.flatnonzero((self.label[:count] >= 0) & (self.created_at[:count] >= started_at))
+            keep = keep[self._newer_than(snapshot, keep)]
+            if len(keep):
+                kept_names = self._label_names()
+                kept_names = [kept_names[i] for i in self.label[keep]]
+                labels = labels + sorted(set(kept_names) - set(labels))
+                index = {name: i for i, name in enumerate(labels)}
+                replaced = np.isin(snapshot["user_id"], self.user_id[keep])
+                merged = {k: np.concatenate((v[~replaced], getattr(self, k)[keep])) for k, v in snapshot.items() if k != "label"}
+                merged["label"] = np.concatenate(
+                    (snapshot["label"][~replaced], np.fromiter((index[n] for n in kept_names), dtype=np.int16, count=len(keep)))
+                )
+                order = np.argsort(merged["user_id"], kind="stable")
+                snapshot = {k: v[order] for k, v in merged.items()}
+            n = min(len(snapshot["user_id"]), self.capacity)
+            if n < len(snapshot["user_id"]):
+                complete = False
+                snapshot = {k: v[:n] for k, v in snapshot.items()}
+
+            # Table des labels (au-delà de _MAX_LABELS: entrées non indexées)
+            table = self.label_names.reshape(_MAX_LABELS, _LABEL_BYTES)
+            table[:] = 0
+            for i, name in enumerate(labels[:_MAX_LABELS]):
+                encoded = name.encode("utf-8")[:_LABEL_BYTES]
+                table[i, :len(encoded)] = np.frombuffer(encoded, dtype=np.uint8)
+            h[_H_LABELS] = min(len(labels), _MAX_LABELS)
+            label_ids = np.where(snapshot["label"] < _MAX_LABELS, snapshot["label"], -1).astype(np.int8)
+
+            for k in ("user_id", "mood_event_id", "lat", "lng", "created_at", "mood_score"):
+                getattr(self, k)[:n] = snapshot[k]
+            self.label[:n] = label_ids
+            rows = np.clip(np.floor((snapshot["lat"] + 90.0) / self.cell_deg), 0, self.n_rows - 1).astype(np.int64)
+            cols = np.floor((snapshot["lng"] + 180.0) / self.cell_deg).astype(np.int64) % self.n_cols
+            self.row[:n], self.col[:n] = rows, cols
+
+            # Chaînes de seaux: entrées triées par seau, chacune pointe vers la suivante du même seau
+            self.heads[:] = -1
+            self.next[:n] = -1
+            linked = np.flatnonzero(label_ids >= 0)
+            buckets = _bucket_hash(rows[linked], cols[linked], self.mask)
+            order = np.argsort(buckets, kind="stable")
+            slots, buckets = linked[order], buckets[order]
+            same = buckets[:-1] == buckets[1:]
+            self.next[slots[:-1][same]] = slots[1:][same]
+            first = np.ones(len(slots), dtype=bool)
+            first[1:] = ~same
+            self.heads[buckets[first]] = slots[first]
+            self.bucket_count[:] = np.bincount(buckets, minlength=self.mask + 1)
+
+            h[_H_COUNT] = n
+            h[_H_SORTED] = n
+            h[_H_COMPLETE] = int(complete)
+            h[_H_NEEDS_REBUILD] = 0
+            h[_H_BUILT_AT_MS] = int(time.time() * 1000)
+            h[_H_SYNCED_AT_MS] = int(synced_at * 1000)
+            h[_H_REBUILDS] += 1
+        self._labels_cache = (0, [])
+
+    def _newer_than(self, snapshot: Dict[str, np.ndarray], slots: np.ndarray) -> np.ndarray:
+        """Masque des entrées `slots` absentes de `snapshot` ou plus récentes que sa ligne."""
+        snap_ids = snapshot["user_id"]
+        if len(snap_ids) == 0 or len(slots) == 0:
+            return np.ones(len(slots), dtype=bool)
+        pos = np.minimum(np.searchsorted(snap_ids, self.user_id[slots]), len(snap_ids) - 1)
+        found = snap_ids[pos] == self.user_id[slots]
+        return ~found | (self.mood_event_id[slots] > snapshot["mood_event_id"][pos])
+
+    # --- lectures --------------------------------------------------------
+
+    def _walk(self, buckets) -> Optional[List[int]]:
+        heads, nxt, rows, cols = self._heads_mv, self._next_mv, self._row_mv, self._col_mv
+        capacity, mask = self.capacity, self.mask
+        found, steps = [], 0
+        for row, col in buckets:
+            s = heads[_bucket_hash(row, col, mask)]
+            while s != -1:
+                steps += 1
+                if not 0 <= s < capacity or steps > capacity:
+                    return None  # chaîne modifiée pendant la lecture
+                if rows[s] == row and cols[s] == col:
+                    found.append(s)
+                s = nxt[s]
+        return found
+
+    def _buckets(self, lat: float, lng: float, radius_m: float):
+        lat_min, lat_max, lng_min, lng_max = bounding_box(lat, lng, radius_m)
+        row_first = self._cell(lat_min, lng)[0]
+        row_last = self._cell(lat_max, lng)[0]
+        col_first = int(floor((lng_min + 180.0) / self.cell_deg))
+        col_last = int(floor((lng_max + 180.0) / self.cell_deg))
+        n_cols = min(col_last - col_first + 1, self.n_cols)
+        if (row_last - row_first + 1) * n_cols > _MAX_WALK_BUCKETS:
+            return None
+        return [(r, (col_first + c) % self.n_cols) for r in range(row_first, row_last + 1) for c in range(n_cols)]
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def nearby(
+        self, lat: float, lng: float, radius_m: float, active_since: float, exclude_user_id: Optional[int] = None
+    ) -> Optional[GeoHits]:
+        """
+        Utilisateurs indexés à moins de `radius_m`, actifs depuis `active_since`
+        (epoch); None si l'index n'est pas utilisable (la base fait foi).
+        """
+        self._count("lookups")
+        if not self.ready:
+            self._count("fallbacks")
+            return None
+        h = self.header
+        buckets = self._buckets(lat, lng, radius_m)
+        for attempt in range(_READ_ATTEMPTS):
+            seq = int(h[_H_SEQ])
+            if seq & 1:
+                time.sleep(0)
+                continue
+            count = int(h[_H_COUNT])
+            slots = None
+            if buckets is not None:
+                bucket_ids = np.fromiter((_bucket_hash(r, c, self.mask) for r, c in buckets), dtype=np.int64, count=len(buckets))
+                if int(self.bucket_count[bucket_ids].sum()) <= max(_MIN_SCAN_ROWS, count // 8):
+                    found = self._walk(buckets)
+                    if found is not None:
+                        slots = np.asarray(found, dtype=np.int64)
+                        slots = slots[self.label[slots] >= 0]
+                        self._count("bucket_walks")
+            if slots is None:
+                slots = np.flatnonzero(self.label[:count] >= 0)
+                self._count("scans")
+            slots = slots[self.created_at[slots] >= active_since]
+            if exclude_user_id is not None:
+                slots = slots[self.user_id[slots] != exclude_user_id]
+            dist = haversine_m_array(lat, lng, self.lat[slots], self.lng[slots])
+            inside = dist <= radius_m
+            slots, dist = slots[inside], dist[inside]
+            hits = GeoHits(
+                user_ids=self.user_id[slots],
+                mood_event_ids=self.mood_event_id[slots],
+                lats=self.lat[slots],
+                lngs=self.lng[slots],
+                labels=self.label[slots],
+                mood_scores=self.mood_score[slots].astype(np.float64),
+                created_at=self.created_at[slots],
+                dist=dist,
+            )
+            names = self._label_names()
+            if int(h[_H_SEQ]) == seq and h[_H_COMPLETE] and not h[_H_NEEDS_REBUILD]:
+                try:
+                    self._count("served")
+                    return hits._replace(labels=[names[i] for i in hits.labels])
+                except IndexError:
+                    pass
+            self._count("retries")
+        self._count("fallbacks")
+        return None
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        if self._shm is None:
+            return dict(stats, attached=False)
+        h = self.header
+        count = int(h[_H_COUNT])
+        now = time.time()
+        active_since = now - settings.geo_index_active_hours * 3600
+        built_at = int(h[_H_BUILT_AT_MS]) / 1000
+        return dict(
+            stats,
+            attached=True,
+            ready=self.ready,
+            name=self._shm.name,
+            size_mb=round(self._shm.size / 1e6, 1),
+            capacity=self.capacity,
+            cell_deg=self.cell_deg,
+            entries=count,
+            active=int(((self.label[:count] >= 0) & (self.created_at[:count] >= active_since)).sum()),
+            labels=self._label_names(),
+            rebuilds=int(h[_H_REBUILDS]),
+            writes=int(h[_H_WRITES]),
+            built_seconds_ago=round(now - built_at, 1) if built_at else None,
+            sync_watermark_seconds_ago=round(now - int(h[_H_SYNCED_AT_MS]) / 1000, 1) if h[_H_SYNCED_AT_MS] else None,
+        )
+
+
+geo_index = SharedGeoIndex()
+
+
+def _active_since() -> float:
+    return time.time() - settings.geo_index_active_hours * 3600
+
+
+def active_cutoff() -> datetime:
+    """Même seuil d'activité que l'index, pour les requêtes sur user_latest_mood (UTC naïf)."""
+    return datetime.utcnow() - timedelta(hours=settings.geo_index_active_hours)
+
+
+def _latest_columns():
+    latest = models.UserLatestMood
+    return select(
+        latest.user_id, latest.mood_event_id, latest.mood_label, latest.mood_score, latest.lat, latest.lng, latest.created_at
+    )
+
+
+def rebuild_geo_index() -> Optional[int]:
+    """Recharge l'index depuis user_latest_mood; None si un autre worker est en train de le faire."""
+    lock_file = open(geo_index._lock_path + ".rebuild", "a+")
+    try:
+        with SharedGeoIndex._file_lock(lock_file, blocking=False) as acquired:
+            if not acquired:
+                return None
+            latest = models.UserLatestMood
+            started_at = time.time()
+            get_engine()
+            db = SessionLocal()
+            try:
+                rows = db.execute(
+                    _latest_columns()
+                    .where(latest.lat.isnot(None), latest.lng.isnot(None))
+                    .where(latest.created_at >= active_cutoff())
+                    .order_by(latest.created_at.desc())
+                    .limit(geo_index.capacity + 1)
+                ).all()
+            finally:
+                db.close()
+            complete = len(rows) <= geo_index.capacity
+            rows = sorted(rows[:geo_index.capacity], key=lambda r: r.user_id)
+            labels = sorted({r.mood_label for r in rows})
+            index = {label: i for i, label in enumerate(labels)}
+            n = len(rows)
+            created_at = np.fromiter((_epoch(r.created_at) for r in rows), dtype=np.float64, count=n)
+            snapshot = {
+                "user_id": np.fromiter((r.user_id for r in rows), dtype=np.int64, count=n),
+                "mood_event_id": np.fromiter((r.mood_event_id for r in rows), dtype=np.int64, count=n),
+                "lat": np.fromiter((r.lat for r in rows), dtype=np.float64, count=n),
+                "lng": np.fromiter((r.lng for r in rows), dtype=np.float64, count=n),
+                "created_at": created_at,
+                "mood_score": np.fromiter((r.mood_score for r in rows), dtype=np.float32, count=n),
+                "label": np.fromiter((index[r.mood_label] for r in rows), dtype=np.int16, count=n),
+            }
+            synced_at = float(created_at.max()) if n else started_at
+            geo_index.load(snapshot, labels, complete, started_at, synced_at)
+            if not complete:
+                print(
+                    f"⚠️  Index géographique plein ({geo_index.capacity} utilisateurs actifs): "
+                    "recherches servies par la base, augmenter GEO_INDEX_CAPACITY"
+                )
+            return n
+    finally:
+        lock_file.close()
+
+
+def sync_geo_index() -> Optional[int]:
+    """Applique les humeurs récentes de user_latest_mood (autres nœuds); None si un autre worker synchronise."""
+    lock_file = open(geo_index._lock_path + ".sync", "a+")
+    try:
+        with SharedGeoIndex._file_lock(lock_file, blocking=False) as acquired:
+            if not acquired:
+                return None
+            latest = models.UserLatestMood
+            since = datetime.utcfromtimestamp(int(geo_index.header[_H_SYNCED_AT_MS]) / 1000) - _SYNC_OVERLAP
+            get_engine()
+            db = SessionLocal()
+            try:
+                rows = db.execute(
+                    _latest_columns().where(latest.created_at >= since).order_by(latest.created_at).limit(_SYNC_BATCH)
+                ).all()
+            finally:
+                db.close()
+            for r in rows:
+                if r.lat is None or r.lng is None:
+                    geo_index.remove(r.user_id, r.mood_event_id)
+                else:
+                    geo_index.upsert(r.user_id, r.mood_event_id, r.lat, r.lng, r.mood_label, r.mood_score, _epoch(r.created_at))
+            if rows:
+                with geo_index._writing() as h:
+                    h[_H_SYNCED_AT_MS] = max(int(h[_H_SYNCED_AT_MS]), int(_epoch(rows[-1].created_at) * 1000))
+            return len(rows)
+    finally:
+        lock_file.close()
+
+
+def _rebuild_due() -> bool:
+    h = geo_index.header
+    age = time.time() - int(h[_H_BUILT_AT_MS]) / 1000
+    return bool(h[_H_NEEDS_REBUILD]) or age >= settings.geo_index_rebuild_minutes * 60
+
+
+def geo_index_available() -> bool:
+    """Activé dans la configuration et verrou de fichier disponible sur la plateforme."""
+    return settings.geo_index_enabled and fcntl is not None
+
+
+def start_geo_index():
+    """Démarrage d'un worker: attache le segment, le reconstruit s'il est neuf ou ancien, sinon le synchronise."""
+    if not settings.geo_index_enabled:
+        return
+    if fcntl is None:
+        print("⚠️  Index géographique désactivé (fcntl indisponible sur cette plateforme): recherches servies par la base")
+        return
+    try:
+        geo_index.open(settings.geo_index_name, settings.geo_index_capacity, settings.geo_index_cell_deg)
+        if _rebuild_due():
+            n = rebuild_geo_index()
+            if n is not None:
+                print(f"✅ Index géographique {settings.geo_index_name}: {n} utilisateurs actifs chargés")
+        else:
+            sync_geo_index()
+    except Exception as e:
+        print(f"⚠️  Index géographique indisponible ({e}): recherches servies par la base")
+
+
+async def geo_index_loop():
+    """Tâche de fond de l'API: synchronisation et reconstruction périodiques."""
+    while True:
+        await asyncio.sleep(settings.geo_index_sync_seconds)
+        if not geo_index.attached:
+            continue
+        try:
+            if _rebuild_due():
+                await asyncio.to_thread(rebuild_geo_index)
+            else:
+                await asyncio.to_thread(sync_geo_index)
+        except Exception as e:
+            print(f"❌ Mise à jour de l'index géographique échouée: {e}")
+            traceback.print_exc()
+
+
+def stop_geo_index():
+    # Le segment n'est pas supprimé: les autres workers l'utilisent encore
+    geo_index.close()
+
+
+def record_mood(ev: models.MoodEvent):
+    """POST /mood/: la nouvelle humeur devient la position indexée de son auteur."""
+    if not geo_index.attached:
+        return
+    try:
+        if ev.lat is None or ev.lng is None:
+            geo_index.remove(ev.user_id, ev.id)
+        else:
+            geo_index.upsert(ev.user_id, ev.id, ev.lat, ev.lng, ev.mood_label, ev.mood_score, _epoch(ev.created_at))
+    except Exception as e:
+        print(f"⚠️  Index géographique non mis à jour: {e}")
+
+
+def relabel_mood(mood_event_id: int, label: str, mood_score: float):
+    if geo_index.attached:
+        geo_index.relabel(mood_event_id, label, mood_score)
+
+
+def nearby_active(lat: float, lng: float, radius_m: float, exclude_user_id: Optional[int] = None) -> Optional[GeoHits]:
+    """Utilisateurs actifs dans le rayon depuis l'index partagé, ou None (interroger la base)."""
+    if not geo_index.attached:
+        return None
+    return geo_index.nearby(lat, lng, radius_m, _active_since(), exclude_user_id)
+
+
+async def display_names(db: AsyncSession, user_ids: List[int]) -> Dict[int, Optional[str]]:
+    """Noms des utilisateurs trouvés dans l'index (qui ne les contient pas)."""
+    if not user_ids:
+        return {}
+    rows = await db.execute(select(models.User.id, models.User.display_name).where(models.User.id.in_(user_ids)))
+    return dict(rows.all())
+
+
+def geo_index_stats() -> dict:
+    return dict(geo_index.stats(), enabled=geo_index_available(), active_hours=settings.geo_index_active_hours)
@@ -0,0 +1,63 @@
+"""
+Table user_latest_mood: dernière humeur de chaque utilisateur.
+
+Mise à jour (upsert) dans la même transaction que l'insertion dans
+mood_events: les lectures "dernière humeur" (nearby, match, places) sont des
+recherches par clé ou par index au lieu d'un GROUP BY sur tout l'historique.
+"""
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+
+from . import models
+
+
+# Remplit la table à partir de l'historique (idempotent: ne remplace qu'une humeur plus ancienne)
+BACKFILL_SQL = text(
+    """
+    INSERT INTO user_latest_mood (
+        user_id, mood_event_id, mood_label, mood_score, label_source, lat, lng, geohash_4, geohash_5, geohash_6, created_at
+    )
+    SELECT DISTINCT ON (user_id)
+        user_id, id, mood_label, mood_score, label_source, lat, lng, geohash_4, geohash_5, geohash_6, created_at
+    FROM mood_events
+    WHERE user_id BETWEEN :first_user_id AND :last_user_id
+    ORDER BY user_id, created_at DESC, id DESC
+    ON CONFLICT (user_id) DO UPDATE SET
+        mood_event_id = EXCLUDED.mood_event_id,
+        mood_label = EXCLUDED.mood_label,
+        mood_score = EXCLUDED.mood_score,
+        label_source = EXCLUDED.label_source,
+        lat = EXCLUDED.lat,
+        lng = EXCLUDED.lng,
+        geohash_4 = EXCLUDED.geohash_4,
+        geohash_5 = EXCLUDED.geohash_5,
+        geohash_6 = EXCLUDED.geohash_6,
+        created_at = EXCLUDED.created_at
+    WHERE user_latest_mood.created_at <= EXCLUDED.created_at
+    """
+)
+
+
+def latest_mood_upsert(ev: models.MoodEvent):
+    """INSERT ... ON CONFLICT pour l'humeur `ev` (déjà flushée: id et created_at connus)."""
+    table = models.UserLatestMood.__table__
+    values = {
+        "user_id": ev.user_id,
+        "mood_event_id": ev.id,
+        "mood_label": ev.mood_label,
+        "mood_score": ev.mood_score,
+        "label_source": ev.label_source,
+        "lat": ev.lat,
+        "lng": ev.lng,
+        "geohash_4": ev.geohash_4,
+        "geohash_5": ev.geohash_5,
+        "geohash_6": ev.geohash_6,
+        "created_at": ev.created_at,
+    }
+    stmt = insert(table).values(**values)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id],
+        set_={key: stmt.excluded[key] for key in values if key != "user_id"},
+        # Deux humeurs simultanées du même utilisateur: garder la plus récente
+        where=table.c.created_at <= stmt.excluded.created_at,
+    )
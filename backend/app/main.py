@@ -1,3 +1,8 @@
+import asyncio
+import time
+
+import anyio
+from contextlib import asynccontextmanager
 from datetime import datetime
 
 from fastapi import FastAPI, Request
@@ -15,15 +20,91 @@ from .routers import chat as chat_router
 from .routers import notifications as notifications_router
 from .routers import feed as feed_router
 from .routers import design as design_router
-from .db import Base, engine
-from .models import User, MoodEvent, Feedback, Conversation, Message, Notification
+from .db import check_connection, check_async_connection, dispose_engines, pool_stats
+from .schema import verify_schema
+from .auth import auth_cache_stats
+from .passwords import bound_to_threadpool, password_pool_stats, shutdown_password_pool, warm_up_password_pool
+from .email_service import mail_worker
+from .mood_pipeline import mood_refiner
+from .mood_cache import mood_cache_stats
+from .mood_model import mood_model_stats
+from .services import llm_stats
+from .match_cache import suggestion_cache
+from .match_push import match_push
+from .chat_push import chat_hub
+from .realtime import broker_stats, get_broker, start_broker, stop_broker
+from .batch_matching import batch_matching_loop, batch_stats
+from .geo_index import geo_index_available, geo_index_loop, geo_index_stats, start_geo_index, stop_geo_index
+from . import IMPORT_STARTED_AT
+
+
+async def _timed(report: dict, key: str, awaitable):
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        report[key] = round(time.perf_counter() - started, 3)
+
+
+def _warm_up_database(report: dict) -> None:
+    # Création de l'engine (résolution DNS), test de connexion puis vérification du schéma
+    if check_connection():
+        report["schema"] = verify_schema()
+    else:
+        report["schema"] = {"status": "unavailable"}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    report = app.state.startup_report
+    started = time.perf_counter()
+    # Chaque demande bcrypt en attente bloque un thread des routes synchrones
+    bound_to_threadpool(anyio.to_thread.current_default_thread_limiter().total_tokens)
+    # Le démarrage des processus bcrypt n'est pas attendu: il se termine en arrière-plan
+    app.state.password_pool_warmup = asyncio.create_task(
+        _timed(report, "password_pool_seconds", asyncio.to_thread(warm_up_password_pool))
+    )
+    # Les étapes de préchauffage sont indépendantes: les lancer en parallèle
+    await asyncio.gather(
+        _timed(report, "db_seconds", asyncio.to_thread(_warm_up_database, report)),
+        _timed(report, "db_async_seconds", check_async_connection()),
+        _timed(report, "template_seconds", asyncio.to_thread(app.state.templates.get_template, "index.html")),
+    )
+    # Index géographique partagé: attaché (et reconstruit si besoin) une fois la base joignable
+    if settings.geo_index_enabled:
+        await _timed(report, "geo_index_seconds", asyncio.to_thread(start_geo_index))
+    geo_task = asyncio.create_task(geo_index_loop()) if geo_index_available() else None
+    # Diffusion temps réel: les humeurs de tous les workers alimentent les abonnés /match/ws de celui-ci
+    await _timed(report, "broker_seconds", start_broker())
+    await get_broker().subscribe("moods", match_push.on_mood)
+    mail_worker.start()
+    mood_refiner.start()
+    batch_task = asyncio.create_task(batch_matching_loop()) if settings.match_batch_interval_minutes > 0 else None
+    report["warmup_seconds"] = round(time.perf_counter() - started, 3)
+    print(
+        f"⏱️  Démarrage: import={report['import_seconds']}s, db={report['db_seconds']}s, "
+        f"db_async={report['db_async_seconds']}s, templates={report['template_seconds']}s, "
+        f"total warmup={report['warmup_seconds']}s"
+    )
+    yield
+    if batch_task is not None:
+        batch_task.cancel()
+    if geo_task is not None:
+        geo_task.cancel()
+    await asyncio.gather(asyncio.to_thread(mail_worker.stop), asyncio.to_thread(mood_refiner.stop))
+    shutdown_password_pool()
+    stop_geo_index()
+    await stop_broker()
+    await dispose_engines()
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title=settings.app_name, debug=settings.debug)
+    app = FastAPI(title=settings.app_name, debug=settings.debug, lifespan=lifespan)
+    app.state.startup_report = {"import_seconds": round(time.perf_counter() - IMPORT_STARTED_AT, 3)}
     
     app.mount("/static", StaticFiles(directory="static"), name="static")
     templates = Jinja2Templates(directory="templates")
+    app.state.templates = templates
 
     # Vérifier que nous utilisons Supabase
     if settings.database_url.startswith("postgresql"):
@@ -31,26 +112,6 @@ def create_app() -> FastAPI:
     else:
         print(f"⚠️  ATTENTION: Base de données non-Supabase détectée: {settings.database_url[:50]}...")
     
-    # Créer les tables au démarrage si elles n'existent pas
-    # Note: Ne pas faire planter le serveur si la connexion échoue (problème réseau temporaire)
-    try:
-        Base.metadata.create_all(bind=engine)
-        print("✅ Tables Supabase vérifiées/créées avec succès")
-    except Exception as e:
-        error_msg = str(e)
-        if "Connection timed out" in error_msg or "timeout" in error_msg.lower():
-            print(f"⚠️  AVERTISSEMENT: Connexion à Supabase échouée (timeout)")
-            print("   Le serveur démarre quand même, mais les tables doivent être créées manuellement.")
-            print("   💡 Solutions:")
-            print("      1. Créez les tables via Supabase Dashboard > SQL Editor (copiez database/schema.sql)")
-            print("      2. Vérifiez votre connexion internet et réessayez: python init_supabase_tables.py")
-            print("      3. Vérifiez que votre projet Supabase est actif (pas en pause)")
-        else:
-            print(f"⚠️  AVERTISSEMENT: Impossible de créer les tables dans Supabase: {e}")
-            print("   💡 Exécutez: python init_supabase_tables.py pour initialiser les tables")
-            print("   💡 Ou créez les tables manuellement via Supabase Dashboard > SQL Editor")
-        # Ne pas faire planter le serveur - l'utilisateur peut créer les tables manuellement
-
     # Configuration CORS pour permettre les requêtes depuis l'application web Expo
     # Note: On ne peut pas utiliser "*" avec allow_credentials=True, donc on liste explicitement les origines
     allowed_origins = [
@@ -77,6 +138,26 @@ def create_app() -> FastAPI:
     def health():
         return {"status": "ok"}
 
+    @app.get("/health/stats", tags=["meta"])
+    def health_stats():
+        return {
+            "db_pool": pool_stats(),
+            "auth_cache": auth_cache_stats(),
+            "password_pool": password_pool_stats(),
+            "mail_queue": mail_worker.stats(),
+            "mood_refiner": mood_refiner.stats(),
+            "mood_cache": mood_cache_stats(),
+            "mood_model": mood_model_stats(),
+            "openai": llm_stats(),
+            "match_cache": suggestion_cache.stats(),
+            "match_batch": batch_stats(),
+            "match_push": match_push.stats(),
+            "chat_push": chat_hub.stats(),
+            "realtime": broker_stats(),
+            "geo_index": geo_index_stats(),
+            "startup": app.state.startup_report,
+        }
+
     @app.get("/", response_class=HTMLResponse, tags=["meta"])
     def landing(request: Request):
         return templates.TemplateResponse(
@@ -0,0 +1,149 @@
+"""
+Cache des suggestions de /match/suggestions, par processus.
+
+Clé: (user_id, rayon, anonymous). Chaque entrée retient les cellules geohash
+qui recouvrent son rayon et les utilisateurs qu'elle affiche; une nouvelle
+humeur invalide:
+  - les entrées de son auteur (sa position ou son humeur a changé);
+  - les entrées dont une cellule contient la nouvelle position;
+  - les entrées qui affichaient son auteur (il a pu quitter la zone).
+Les workers ne partagent pas ce cache: MATCH_CACHE_TTL_SECONDS (court) borne
+le délai avant qu'une humeur écrite par un autre worker, ou affinée par le
+LLM, soit prise en compte.
+
+L'ETag (empreinte du contenu) permet de répondre 304 Not Modified.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+from .config import settings
+from .geo import CELL_PRECISIONS, cell_columns, covering_cells
+
+
+# Entrées dont le rayon n'est pas recouvert par des cellules: invalidées par toute humeur
+_ANY_CELL = ("*", "*")
+
+
+def compute_etag(payload: Sequence[dict]) -> str:
+    body = json.dumps(payload, separators=(",", ":"), sort_keys=True, default=str)
+    return '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+class _Entry:
+    __slots__ = ("expires_at", "etag", "value", "cells", "user_id", "members")
+
+    def __init__(self, expires_at, etag, value, cells, user_id, members):
+        self.expires_at = expires_at
+        self.etag = etag
+        self.value = value
+        self.cells = cells
+        self.user_id = user_id
+        self.members = members
+
+
+class SuggestionCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        # Index inverses: cellule / utilisateur -> clés concernées
+        self._by_cell: Dict[Tuple, Set[Hashable]] = {}
+        self._by_user: Dict[int, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "not_modified": 0, "invalidations": 0, "evictions": 0}
+
+    def get(self, key: Hashable) -> Optional[Tuple[str, list]]:
+        """(etag, suggestions) si l'entrée est présente et fraîche."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry.expires_at <= now:
+                if entry is not None:
+                    self._remove(key)
+                self._stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry.etag, entry.value
+
+    def set(self, key: Hashable, user_id: int, lat: float, lng: float, radius_m: float, value: list, etag: str):
+        covering = covering_cells(lat, lng, radius_m)
+        if covering is not None:
+            precision, covered = covering
+            cells = [(precision, cell) for cell in covered]
+        else:
+            cells = [_ANY_CELL]
+        members = {s.user_id for s in value}
+        entry = _Entry(time.monotonic() + self.ttl, etag, value, cells, user_id, members)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = entry
+            for cell in cells:
+                self._by_cell.setdefault(cell, set()).add(key)
+            for uid in members | {user_id}:
+                self._by_user.setdefault(uid, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+                self._stats["evictions"] += 1
+
+    def count_not_modified(self):
+        with self._lock:
+            self._stats["not_modified"] += 1
+
+    def invalidate_mood(self, user_id: int, lat: Optional[float], lng: Optional[float]) -> int:
+        """Appelé après l'enregistrement d'une humeur; retourne le nombre d'entrées supprimées."""
+        cells: List[Tuple] = [_ANY_CELL]
+        if lat is not None and lng is not None:
+            columns = cell_columns(lat, lng)
+            cells += [(p, columns[f"geohash_{p}"]) for p in CELL_PRECISIONS]
+        with self._lock:
+            keys = set(self._by_user.get(user_id, ()))
+            for cell in cells:
+                keys |= self._by_cell.get(cell, set())
+            for key in keys:
+                self._remove(key)
+            self._stats["invalidations"] += len(keys)
+        return len(keys)
+
+    def _remove(self, key: Hashable):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        for cell in entry.cells:
+            keys = self._by_cell.get(cell)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_cell[cell]
+        for uid in entry.members | {entry.user_id}:
+            keys = self._by_user.get(uid)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_user[uid]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._by_cell.clear()
+            self._by_user.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(
+                self._stats,
+                size=len(self._data),
+                maxsize=self.maxsize,
+                ttl_seconds=self.ttl,
+                indexed_cells=len(self._by_cell),
+                hit_rate=round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            )
+
+
+suggestion_cache = SuggestionCache(settings.match_cache_max_entries, settings.match_cache_ttl_seconds)
@@ -0,0 +1,194 @@
+"""
+Suggestions de match poussées en temps réel (WebSocket /match/ws).
+
+Un client connecté s'abonne avec une position et un rayon; chaque humeur
+enregistrée par POST /mood/ est publiée sur le canal "moods" du broker temps
+réel (app/realtime.py), puis évaluée par chaque worker contre les abonnés des cellules
+geohash qui contiennent sa position (index cellule -> abonnés, comme le cache
+des suggestions): pas de parcours de tous les abonnés. Règle d'éligibilité de
+/match/suggestions: distance <= rayon, humeur compatible (is_mood_compatible)
+ou scores d'humeur proches.
+
+L'humeur d'un abonné est sa dernière humeur (user_latest_mood au moment de
+l'abonnement, puis celles qu'il publie). Les messages sortants passent par une
+file bornée par connexion: une connexion lente perd des suggestions
+(comptées), elle ne ralentit pas POST /mood/.
+
+Avec le broker "memory", un abonné ne reçoit que les humeurs enregistrées par
+son worker; avec "redis", celles de tous les workers.
+"""
+import asyncio
+import itertools
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from . import schemas
+from .batch_matching import public_name
+from .config import settings
+from .geo import CELL_PRECISIONS, cell_columns, covering_cells, haversine_m
+from .match_scoring import MOOD_SCORE_TOLERANCE, is_mood_compatible
+
+
+# Abonnements dont le rayon n'est pas recouvert par des cellules: évalués pour toute humeur
+_ANY_CELL = ("*", "*")
+
+
+class PushConnection:
+    """Une connexion WebSocket: file sortante et abonnement courant."""
+
+    def __init__(self, conn_id: int, user_id: int, queue_max: int):
+        self.id = conn_id
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_max)
+        self.lat: Optional[float] = None
+        self.lng: Optional[float] = None
+        self.radius_m = 0.0
+        self.anonymous = True
+        self.mood_label: Optional[str] = None
+        self.mood_score = 0.0
+        self.cells: List[Tuple] = []
+
+    @property
+    def subscribed(self) -> bool:
+        return bool(self.cells)
+
+
+class MatchPushHub:
+    def __init__(self, queue_max: int):
+        self.queue_max = queue_max
+        self._ids = itertools.count(1)
+        self._connections: Dict[int, PushConnection] = {}
+        self._by_cell: Dict[Tuple, Set[int]] = {}
+        self._by_user: Dict[int, Set[int]] = {}
+        # Appelé depuis la boucle asyncio; le verrou protège stats() (thread de /health/stats)
+        self._lock = threading.Lock()
+        self._stats = {"moods": 0, "candidates": 0, "pushed": 0, "dropped": 0, "subscribes": 0}
+
+    def connect(self, user_id: int) -> PushConnection:
+        conn = PushConnection(next(self._ids), user_id, self.queue_max)
+        with self._lock:
+            self._connections[conn.id] = conn
+            self._by_user.setdefault(user_id, set()).add(conn.id)
+        return conn
+
+    def disconnect(self, conn: PushConnection):
+        with self._lock:
+            self._unindex(conn)
+            self._connections.pop(conn.id, None)
+            ids = self._by_user.get(conn.user_id)
+            if ids is not None:
+                ids.discard(conn.id)
+                if not ids:
+                    del self._by_user[conn.user_id]
+
+    def subscribe(
+        self,
+        conn: PushConnection,
+        lat: float,
+        lng: float,
+        radius_m: float,
+        anonymous: bool,
+        mood_label: Optional[str],
+        mood_score: float,
+    ):
+        """Remplace l'abonnement de la connexion."""
+        covering = covering_cells(lat, lng, radius_m)
+        cells = [(covering[0], cell) for cell in covering[1]] if covering is not None else [_ANY_CELL]
+        with self._lock:
+            self._unindex(conn)
+            conn.lat, conn.lng, conn.radius_m, conn.anonymous = lat, lng, radius_m, anonymous
+            conn.mood_label, conn.mood_score = mood_label, mood_score
+            conn.cells = cells
+            for cell in cells:
+                self._by_cell.setdefault(cell, set()).add(conn.id)
+            self._stats["subscribes"] += 1
+
+    def unsubscribe(self, conn: PushConnection):
+        with self._lock:
+            self._unindex(conn)
+
+    def _unindex(self, conn: PushConnection):
+        for cell in conn.cells:
+            ids = self._by_cell.get(cell)
+            if ids is not None:
+                ids.discard(conn.id)
+                if not ids:
+                    del self._by_cell[cell]
+        conn.cells = []
+
+    def send(self, conn: PushConnection, message: dict) -> bool:
+        try:
+            conn.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            with self._lock:
+                self._stats["dropped"] += 1
+            return False
+
+    def publish_mood(
+        self,
+        user_id: int,
+        display_name: Optional[str],
+        lat: Optional[float],
+        lng: Optional[float],
+        mood_label: str,
+        mood_score: float,
+    ) -> int:
+        """
+        Nouvelle humeur (dans la boucle asyncio): pousse une suggestion aux
+        abonnés concernés; retourne le nombre de suggestions envoyées.
+        """
+        # Les abonnements de l'auteur suivent sa nouvelle humeur
+        with self._lock:
+            for conn_id in self._by_user.get(user_id, ()):
+                conn = self._connections[conn_id]
+                conn.mood_label, conn.mood_score = mood_label, mood_score
+            self._stats["moods"] += 1
+            if lat is None or lng is None or not self._by_cell:
+                return 0
+            columns = cell_columns(lat, lng)
+            candidates = set(self._by_cell.get(_ANY_CELL, ()))
+            for p in CELL_PRECISIONS:
+                candidates |= self._by_cell.get((p, columns[f"geohash_{p}"]), set())
+            targets = [self._connections[c] for c in candidates]
+            self._stats["candidates"] += len(targets)
+
+        pushed = 0
+        for conn in targets:
+            if conn.user_id == user_id or conn.mood_label is None:
+                continue
+            distance = haversine_m(conn.lat, conn.lng, lat, lng)
+            if distance > conn.radius_m:
+                continue
+            if not (is_mood_compatible(conn.mood_label, mood_label) or abs(mood_score - conn.mood_score) < MOOD_SCORE_TOLERANCE):
+                continue
+            suggestion = schemas.MatchSuggestion(
+                user_id=user_id,
+                distance_m=round(distance, 1),
+                mood_label=mood_label,
+                display_name=public_name(user_id, display_name, conn.anonymous),
+                lat=lat,
+                lng=lng,
+            )
+            if self.send(conn, {"type": "match", "suggestion": suggestion.model_dump()}):
+                pushed += 1
+        with self._lock:
+            self._stats["pushed"] += pushed
+        return pushed
+
+    def on_mood(self, channel: str, message: dict):
+        """Gestionnaire du canal "moods" (abonné au démarrage, voir app/main.py)."""
+        self.publish_mood(**message)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self._stats,
+                connections=len(self._connections),
+                subscribed=sum(1 for c in self._connections.values() if c.subscribed),
+                indexed_cells=len(self._by_cell),
+                queue_max=self.queue_max,
+            )
+
+
+match_push = MatchPushHub(settings.match_push_queue_max)
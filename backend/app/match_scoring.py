@@ -0,0 +1,153 @@
+"""
+Classement vectorisé des candidats de /match/suggestions.
+
+Les candidats arrivent sous forme de tableaux (lat, lng, label, score, âge);
+distances haversine, compatibilité d'humeur (matrice label x label calculée
+une fois) et score de classement pondéré sont calculés en quelques opérations
+NumPy, puis les k meilleurs sont choisis avec argpartition (pas de tri complet).
+
+Éligibilité (inchangée): distance <= rayon et humeur compatible
+(is_mood_compatible) ou scores d'humeur proches (écart < MOOD_SCORE_TOLERANCE).
+"""
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .config import settings
+from .geo import haversine_m_array
+
+
+# Humeurs compatibles avec chaque humeur (en plus d'elle-même); un label absent n'est compatible qu'avec lui-même
+COMPATIBLE_MOODS: Dict[str, Set[str]] = {
+    "calm": {"calm", "joy"},
+    "joy": {"joy", "calm", "energy"},
+    "energy": {"energy", "joy"},
+    "fatigue": {"calm", "joy"},
+    "stress": {"calm"},
+}
+MOOD_SCORE_TOLERANCE = 0.2
+
+
+def is_mood_compatible(a: str, b: str) -> bool:
+    if a == b:
+        return True
+    return b in COMPATIBLE_MOODS.get(a, {a})
+
+
+class MatchScorer:
+    def __init__(
+        self,
+        compatible: Dict[str, Set[str]],
+        weight_distance: float,
+        weight_compatible: float,
+        weight_mood_score: float,
+        weight_recency: float,
+        recency_half_life_hours: float,
+    ):
+        self.labels = sorted(set(compatible) | {b for bs in compatible.values() for b in bs})
+        self.label_index = {label: i for i, label in enumerate(self.labels)}
+        # Ligne/colonne supplémentaire (tout à False) pour les labels inconnus
+        n = len(self.labels)
+        self.compat = np.zeros((n + 1, n + 1), dtype=bool)
+        for i, a in enumerate(self.labels):
+            self.compat[i, i] = True
+            for b in compatible.get(a, ()):
+                self.compat[i, self.label_index[b]] = True
+        self.unknown = n
+        self.weights = np.array([weight_distance, weight_compatible, weight_mood_score, weight_recency])
+        self.recency_decay = np.log(2) / (recency_half_life_hours * 3600.0)
+
+    def label_ids(self, labels: Sequence[str]) -> np.ndarray:
+        index, unknown = self.label_index, self.unknown
+        return np.fromiter((index.get(label, unknown) for label in labels), dtype=np.int64, count=len(labels))
+
+    def compatible(self, label: str, labels: Sequence[str], label_ids: Optional[np.ndarray] = None) -> np.ndarray:
+        """is_mood_compatible(label, b) pour chaque b de `labels`."""
+        i = self.label_index.get(label)
+        if i is None:
+            return np.asarray(labels, dtype=object) == label
+        ids = self.label_ids(labels) if label_ids is None else label_ids
+        return self.compat[i, ids]
+
+    def rank(
+        self,
+        lat: float,
+        lng: float,
+        label: str,
+        mood_score: float,
+        lats: np.ndarray,
+        lngs: np.ndarray,
+        labels: Sequence[str],
+        mood_scores: np.ndarray,
+        ages_seconds: np.ndarray,
+        radius_m: float,
+        k: int,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(indices des k meilleurs candidats éligibles, par score décroissant; distances; scores)."""
+        dist = haversine_m_array(lat, lng, lats, lngs)
+        compatible = self.compatible(label, labels)
+        score_gap = np.abs(np.asarray(mood_scores, dtype=np.float64) - mood_score)
+        eligible = np.flatnonzero((dist <= radius_m) & (compatible | (score_gap < MOOD_SCORE_TOLERANCE)))
+        if len(eligible) == 0:
+            empty = np.zeros(0)
+            return eligible, empty, empty
+
+        features = np.column_stack(
+            (
+                1.0 - dist[eligible] / max(radius_m, 1.0),
+                compatible[eligible],
+                1.0 - np.minimum(score_gap[eligible], 1.0),
+                np.exp(-self.recency_decay * np.maximum(np.asarray(ages_seconds, dtype=np.float64)[eligible], 0.0)),
+            )
+        )
+        scores = features @ self.weights
+        if len(eligible) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(eligible))
+        # Tri des seuls k retenus: score décroissant, puis distance croissante
+        top = top[np.lexsort((dist[eligible][top], -scores[top]))]
+        chosen = eligible[top]
+        return chosen, dist[chosen], scores[top]
+
+    def rank_rows(self, origin, rows: Sequence, radius_m: float, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        rank() pour des lignes ayant lat, lng, mood_label, mood_score, created_at
+        (ex: user_latest_mood); `origin` est la dernière humeur de l'appelant.
+        """
+        n = len(rows)
+        # timestamptz (aware) avec asyncpg, naïf (UTC) sinon
+        now_utc = datetime.now(timezone.utc)
+        now_naive = now_utc.replace(tzinfo=None)
+        chosen, dist, _ = self.rank(
+            origin.lat,
+            origin.lng,
+            origin.mood_label,
+            origin.mood_score,
+            lats=np.fromiter((r.lat for r in rows), dtype=np.float64, count=n),
+            lngs=np.fromiter((r.lng for r in rows), dtype=np.float64, count=n),
+            labels=[r.mood_label for r in rows],
+            mood_scores=np.fromiter((r.mood_score for r in rows), dtype=np.float64, count=n),
+            ages_seconds=np.fromiter(
+                (((now_utc if r.created_at.tzinfo else now_naive) - r.created_at).total_seconds() for r in rows),
+                dtype=np.float64,
+                count=n,
+            ),
+            radius_m=radius_m,
+            k=k,
+        )
+        return chosen, dist
+
+
+@lru_cache(maxsize=1)
+def get_match_scorer() -> MatchScorer:
+    return MatchScorer(
+        COMPATIBLE_MOODS,
+        weight_distance=settings.match_weight_distance,
+        weight_compatible=settings.match_weight_compatible,
+        weight_mood_score=settings.match_weight_mood_score,
+        weight_recency=settings.match_weight_recency,
+        recency_half_life_hours=settings.match_recency_half_life_hours,
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .db import Base
@@ -33,13 +33,54 @@ class MoodEvent(Base):
     text = Column(String, nullable=True)
     mood_label = Column(String, nullable=False)  # e.g., joy, calm, energy, fatigue, stress
     mood_score = Column(Float, nullable=False, default=0.0)
+    # rules: étiquette provisoire (analyze_mood), model: modèle local confiant, llm: affinée en arrière-plan
+    label_source = Column(String, nullable=False, default="rules")
     lat = Column(Float, nullable=True)
     lng = Column(Float, nullable=True)
+    # Cellules geohash de la position (app/geo.py), calculées à l'insertion
+    geohash_4 = Column(String(4), nullable=True, index=True)
+    geohash_5 = Column(String(5), nullable=True, index=True)
+    geohash_6 = Column(String(6), nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     user = relationship("User", back_populates="moods")
 
 
+class UserLatestMood(Base):
+    """Dernière humeur de chaque utilisateur, mise à jour dans la transaction de POST /mood/."""
+    __tablename__ = "user_latest_mood"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    mood_event_id = Column(Integer, ForeignKey("mood_events.id"), nullable=False)
+    mood_label = Column(String, nullable=False)
+    mood_score = Column(Float, nullable=False, default=0.0)
+    label_source = Column(String, nullable=False, default="rules")
+    lat = Column(Float, nullable=True)
+    lng = Column(Float, nullable=True)
+    geohash_4 = Column(String(4), nullable=True, index=True)
+    geohash_5 = Column(String(5), nullable=True, index=True)
+    geohash_6 = Column(String(6), nullable=True, index=True)
+    created_at = Column(DateTime, nullable=False)  # date de l'humeur (mood_events.created_at)
+
+    user = relationship("User")
+
+    __table_args__ = (
+        Index("idx_user_latest_mood_location", "lat", "lng", postgresql_where=lat.isnot(None)),
+        Index("idx_user_latest_mood_created_at", "created_at"),
+    )
+
+
+class PrecomputedMatch(Base):
+    """Suggestions calculées en lot (app/batch_matching.py) pour un utilisateur actif."""
+    __tablename__ = "precomputed_matches"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    mood_event_id = Column(Integer, nullable=False)  # humeur de l'utilisateur au moment du calcul
+    radius_m = Column(Integer, nullable=False)
+    suggestions = Column(String, nullable=False)  # JSON string (noms non anonymisés)
+    computed_at = Column(DateTime, nullable=False, index=True)
+
+
 class Feedback(Base):
     __tablename__ = "feedbacks"
 
@@ -60,9 +101,18 @@ class Conversation(Base):
     user_one_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     user_two_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Dernier message (mis à jour par POST /chat/send), pour la boîte de réception sans agrégation
+    last_message_id = Column(Integer, nullable=True)
+    last_message_at = Column(DateTime, nullable=True)
 
     messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # GET /chat/inbox: conversations d'un participant par activité récente
+        Index("idx_conversations_user_one_last_message", "user_one_id", "last_message_at", "id"),
+        Index("idx_conversations_user_two_last_message", "user_two_id", "last_message_at", "id"),
+    )
+
 
 class Message(Base):
     __tablename__ = "messages"
@@ -79,6 +129,13 @@ class Message(Base):
     sender = relationship("User", foreign_keys=[sender_id], back_populates="sent_messages")
     recipient = relationship("User", foreign_keys=[recipient_id], back_populates="received_messages")
 
+    __table_args__ = (
+        # Historique paginé par curseur (GET /chat/messages): dernière page, avant / après un message
+        Index("idx_messages_conversation_created_id", "conversation_id", "created_at", "id"),
+        # Messages non lus par destinataire (compteurs de GET /chat/inbox)
+        Index("idx_messages_unread", "recipient_id", "conversation_id", postgresql_where=read_at.is_(None)),
+    )
+
 
 class Notification(Base):
     __tablename__ = "notifications"
@@ -102,3 +159,36 @@ class DesignToken(Base):
     value = Column(String, nullable=False)  # JSON string
     updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
+
+class EmailDelivery(Base):
+    __tablename__ = "email_deliveries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    email = Column(String, nullable=False)
+    kind = Column(String, nullable=False)  # e.g., verification
+    status = Column(String, nullable=False, default="queued")  # queued, retrying, sent, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+
+
+class MoodClassification(Base):
+    """Cache des classifications LLM, partagé par tous les workers (clé: modèle + empreinte du texte normalisé)."""
+    __tablename__ = "mood_classifications"
+
+    model = Column(String, primary_key=True)
+    text_hash = Column(String(64), primary_key=True)
+    mood_label = Column(String, nullable=False)
+    mood_score = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    id = Column(Integer, primary_key=True, default=1)
+    version = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,110 @@
+"""
+Cache des classifications d'humeur par le LLM.
+
+Le texte est normalisé (Unicode NFKC, casse, espaces) puis haché avec le nom
+du modèle (settings.openai_emotion_model): changer de modèle invalide donc le
+cache. Deux niveaux:
+  - LRU mémoire par processus (TTLCache);
+  - table mood_classifications, partagée par tous les workers.
+Seuls les résultats du LLM sont mis en cache, jamais les replis par règles.
+"""
+import hashlib
+import re
+import threading
+import unicodedata
+from typing import Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from .cache import TTLCache
+from .config import settings
+from .db import SessionLocal, get_engine
+from . import models
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+_memory = TTLCache(maxsize=settings.mood_cache_max_entries, ttl=settings.mood_cache_ttl_seconds)
+_stats_lock = threading.Lock()
+_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "db_errors": 0}
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def cache_key(text: str, model: str | None = None) -> str:
+    model = model or settings.openai_emotion_model
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def _count(key: str, n: int = 1):
+    with _stats_lock:
+        _stats[key] += n
+
+
+def get_cached(text: str) -> Tuple[str, float] | None:
+    """Cherche en mémoire puis en base. None si le texte n'a jamais été classé avec ce modèle."""
+    model = settings.openai_emotion_model
+    key = cache_key(text, model)
+    hit = _memory.get(key)
+    if hit is not None:
+        _count("memory_hits")
+        return hit
+    if settings.mood_cache_db:
+        try:
+            get_engine()
+            with SessionLocal() as db:
+                row = db.execute(
+                    select(models.MoodClassification.mood_label, models.MoodClassification.mood_score).where(
+                        models.MoodClassification.model == model,
+                        models.MoodClassification.text_hash == key,
+                    )
+                ).first()
+        except Exception as e:
+            _count("db_errors")
+            print(f"⚠️ Warning: lecture du cache de classification impossible: {e}")
+            row = None
+        if row is not None:
+            result = (row[0], float(row[1]))
+            _memory.set(key, result)
+            _count("db_hits")
+            return result
+    _count("misses")
+    return None
+
+
+def store(text: str, label: str, score: float):
+    model = settings.openai_emotion_model
+    key = cache_key(text, model)
+    _memory.set(key, (label, score))
+    _count("stores")
+    if not settings.mood_cache_db:
+        return
+    try:
+        get_engine()
+        with SessionLocal() as db:
+            db.execute(
+                insert(models.MoodClassification)
+                .values(model=model, text_hash=key, mood_label=label, mood_score=score)
+                .on_conflict_do_nothing(index_elements=["model", "text_hash"])
+            )
+            db.commit()
+    except Exception as e:
+        _count("db_errors")
+        print(f"⚠️ Warning: écriture du cache de classification impossible: {e}")
+
+
+def mood_cache_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+    hits = stats["memory_hits"] + stats["db_hits"]
+    stats.update(
+        model=settings.openai_emotion_model,
+        hit_rate=round(hits / lookups, 4) if lookups else 0.0,
+        memory=_memory.stats(),
+    )
+    return stats
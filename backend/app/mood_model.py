@@ -0,0 +1,152 @@
+"""
+Classifieur d'humeur local (Bayes naïf multinomial sur n-grammes hachés).
+
+Niveau intermédiaire entre les règles et le LLM: entraîné hors ligne à partir
+des étiquettes de mood_events (database/train_mood_model.py), il classe un
+texte en moins d'une milliseconde. Il n'est utilisé que si sa confiance
+dépasse MOOD_MODEL_MIN_CONFIDENCE; sinon le texte part vers le LLM.
+
+Fichiers (MOOD_MODEL_PATH, sans extension):
+  - <path>.npy : log-probabilités float32 (features x labels), mappé en
+    mémoire (np.load(mmap_mode="r")): chargé à la demande et partagé par
+    les workers via le cache de pages du système;
+  - <path>.json : labels, log-priors, score moyen par label, paramètres.
+"""
+import json
+import threading
+import zlib
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .config import settings
+from .mood_rules import tokenize
+
+
+DEFAULT_MODEL_PATH = Path(__file__).parent / "data" / "mood_model"
+N_FEATURES = 1 << 18
+
+
+def extract_features(text: str, n_features: int = N_FEATURES) -> np.ndarray:
+    """Indices hachés (crc32, stable entre processus) des unigrammes et bigrammes de mots."""
+    tokens = tokenize(text)
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) % n_features for g in grams), dtype=np.int64, count=len(grams))
+
+
+def model_path() -> Path:
+    return Path(settings.mood_model_path) if settings.mood_model_path else DEFAULT_MODEL_PATH
+
+
+class MoodModel:
+    def __init__(self, weights: np.ndarray, meta: dict):
+        self.weights = weights
+        self.labels: List[str] = meta["labels"]
+        self.log_priors = np.asarray(meta["log_priors"], dtype=np.float64)
+        self.label_scores = np.asarray(meta["label_scores"], dtype=np.float64)
+        self.n_features = int(meta["n_features"])
+        self.meta = meta
+
+    @classmethod
+    def load(cls, path: Path) -> "MoodModel":
+        with open(path.with_suffix(".json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(np.load(path.with_suffix(".npy"), mmap_mode="r"), meta)
+
+    def save(self, path: Path):
+        """Écrit les deux fichiers puis les renomme (un worker ne lit jamais un fichier à moitié écrit)."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_npy = path.with_suffix(".tmp.npy")
+        tmp_json = path.with_suffix(".tmp.json")
+        np.save(tmp_npy, np.asarray(self.weights, dtype=np.float32))
+        with open(tmp_json, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        tmp_npy.replace(path.with_suffix(".npy"))
+        tmp_json.replace(path.with_suffix(".json"))
+
+    def predict_proba(self, text: str) -> np.ndarray:
+        return self._proba(extract_features(text, self.n_features))
+
+    def _proba(self, features: np.ndarray) -> np.ndarray:
+        # Une ligne contiguë par feature: quelques pages lues dans le fichier mappé
+        log_posterior = self.log_priors + np.asarray(self.weights[features], dtype=np.float64).sum(axis=0)
+        log_posterior -= log_posterior.max()
+        proba = np.exp(log_posterior)
+        return proba / proba.sum()
+
+    def predict(self, text: str) -> Tuple[str, float, float]:
+        """
+        (label, score, confiance). Confiance 0 pour un texte sans feature
+        (espaces seuls): la probabilité ne serait que le prior du label
+        majoritaire, pas un avis sur le texte.
+        """
+        features = extract_features(text, self.n_features)
+        proba = self._proba(features)
+        best = int(proba.argmax())
+        confidence = float(proba[best]) if len(features) else 0.0
+        return self.labels[best], float(self.label_scores[best]), confidence
+
+
+_model: Optional[MoodModel] = None
+_load_attempted = False
+_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"confident": 0, "low_confidence": 0, "no_features": 0}
+
+
+def get_mood_model() -> Optional[MoodModel]:
+    """Charge le modèle au premier appel. None si désactivé ou pas encore entraîné."""
+    global _model, _load_attempted
+    if _load_attempted:
+        return _model
+    with _lock:
+        if not _load_attempted:
+            path = model_path()
+            if settings.mood_model_enabled and path.with_suffix(".npy").exists():
+                try:
+                    _model = MoodModel.load(path)
+                    print(f"✅ Modèle d'humeur local chargé: {path.with_suffix('.npy')}")
+                except Exception as e:
+                    print(f"⚠️ Warning: modèle d'humeur local illisible ({path}): {e}")
+            _load_attempted = True
+    return _model
+
+
+def reload_mood_model() -> Optional[MoodModel]:
+    global _model, _load_attempted
+    with _lock:
+        _model, _load_attempted = None, False
+    return get_mood_model()
+
+
+def predict_confident(text: Optional[str]) -> Optional[Tuple[str, float]]:
+    """(label, score) si le modèle est chargé et assez confiant, sinon None."""
+    if not text:
+        return None
+    model = get_mood_model()
+    if model is None:
+        return None
+    label, score, confidence = model.predict(text)
+    if confidence == 0.0:
+        # Aucune feature: règles / LLM, même avec MOOD_MODEL_MIN_CONFIDENCE=0
+        with _stats_lock:
+            _stats["no_features"] += 1
+        return None
+    confident = confidence >= settings.mood_model_min_confidence
+    with _stats_lock:
+        _stats["confident" if confident else "low_confidence"] += 1
+    return (label, score) if confident else None
+
+
+def mood_model_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats["confident"] + stats["low_confidence"]
+    stats["confident_rate"] = round(stats["confident"] / total, 4) if total else 0.0
+    stats["min_confidence"] = settings.mood_model_min_confidence
+    stats["loaded"] = _model is not None
+    if _model is not None:
+        stats["trained_at"] = _model.meta.get("trained_at")
+        stats["examples"] = _model.meta.get("examples")
+    return stats
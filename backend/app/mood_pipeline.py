@@ -0,0 +1,114 @@
+"""
+Classification des humeurs en deux temps.
+
+POST /mood/ enregistre immédiatement l'humeur avec l'étiquette des règles
+(analyze_mood, label_source="rules") puis la dépose dans une file. Le
+MoodRefiner appelle le LLM hors de la requête et met à jour mood_label,
+mood_score et label_source="llm" quand la classification aboutit. Quand le
+modèle local (app/mood_model.py) est confiant, l'humeur est enregistrée
+directement avec label_source="model" et n'est pas mise en file.
+
+Les humeurs arrivées en même temps (fenêtre MOOD_REFINE_BATCH_WAIT_MS, au plus
+MOOD_REFINE_BATCH_SIZE) sont classées en un seul appel au LLM (classify_moods).
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+
+from sqlalchemy import update
+
+from .config import settings
+from .db import SessionLocal, get_engine
+from .services import classify_moods, llm_available
+from .workers import BackgroundWorker
+from .geo_index import relabel_mood
+from . import models
+
+
+@dataclass
+class RefineJob:
+    mood_event_id: int
+    text: str
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class MoodRefiner(BackgroundWorker):
+    """Affine en arrière-plan les étiquettes provisoires des humeurs."""
+
+    def __init__(self):
+        super().__init__(
+            "mood-refiner",
+            max_queue=settings.mood_refine_queue_max,
+            batch_size=settings.mood_refine_batch_size,
+            batch_wait=settings.mood_refine_batch_wait_ms / 1000.0,
+        )
+        self._lag_lock = threading.Lock()
+        self._lag = {"refined": 0, "fallbacks": 0, "lag_total": 0.0, "lag_max": 0.0, "lag_last": 0.0}
+
+    def process_batch(self, items: list[RefineJob]):
+        # Un seul appel au LLM pour tout le lot
+        results = zip(items, classify_moods([item.text for item in items]))
+        refined = [(item, label, score, source) for item, (label, score, source) in results if source != "rules"]
+        if refined:
+            get_engine()
+            db = SessionLocal()
+            try:
+                for item, label, score, source in refined:
+                    # Ne pas écraser une étiquette déjà affinée
+                    for model, key in ((models.MoodEvent, models.MoodEvent.id), (models.UserLatestMood, models.UserLatestMood.mood_event_id)):
+                        db.execute(
+                            update(model)
+                            .where(key == item.mood_event_id, model.label_source == "rules")
+                            .values(mood_label=label, mood_score=score, label_source=source)
+                        )
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+            for item, label, score, _ in refined:
+                relabel_mood(item.mood_event_id, label, score)
+
+        now = time.monotonic()
+        with self._lag_lock:
+            self._lag["fallbacks"] += len(items) - len(refined)
+            for item, _, _, _ in refined:
+                lag = now - item.enqueued_at
+                self._lag["refined"] += 1
+                self._lag["lag_total"] += lag
+                self._lag["lag_max"] = max(self._lag["lag_max"], lag)
+                self._lag["lag_last"] = lag
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        with self._lag_lock:
+            lag = dict(self._lag)
+        done = lag["refined"] + lag["fallbacks"]
+        stats.update(
+            queue_depth=self.queue_depth(),
+            refined=lag["refined"],
+            fallbacks=lag["fallbacks"],
+            fallback_rate=round(lag["fallbacks"] / done, 3) if done else 0.0,
+            lag_avg_seconds=round(lag["lag_total"] / lag["refined"], 3) if lag["refined"] else 0.0,
+            lag_max_seconds=round(lag["lag_max"], 3),
+            lag_last_seconds=round(lag["lag_last"], 3),
+            llm_enabled=llm_available(),
+        )
+        return stats
+
+
+mood_refiner = MoodRefiner()
+
+
+def enqueue_refinement(ev: models.MoodEvent) -> bool:
+    """
+    Met l'humeur en file pour affinage par le LLM.
+
+    False si rien n'est à affiner (pas de texte, LLM non configuré, étiquette
+    déjà donnée par le modèle local) ou si la file est pleine: l'étiquette
+    provisoire est alors conservée.
+    """
+    if not ev.text or ev.label_source != "rules" or not llm_available():
+        return False
+    return mood_refiner.submit(RefineJob(mood_event_id=ev.id, text=ev.text))
@@ -0,0 +1,171 @@
+"""
+Moteur de règles compilé pour la classification d'humeur sans LLM.
+
+Les mots-clés (app/data/mood_rules.json) sont compilés une seule fois en une
+expression régulière (trie des mots-clés: préfixes communs factorisés). Le
+texte est seulement découpé aux espaces (str.split); chaque morceau distinct
+("Épuisée,", "soirée?") n'est mis en minuscules sans accents, découpé en mots
+et résolu par l'expression qu'une fois, puis mémorisé avec ses mots-clés. Un
+texte coûte donc un split et un map(dict.get) en C, sans boucle Python par mot.
+Chaque mot-clé ajoute son poids à son label et le label de poids maximal
+l'emporte (égalités départagées par l'ordre du fichier).
+
+analyze_moods() classe une liste de textes en un seul découpage de leur
+concaténation et accumule les poids avec NumPy (backfills, re-étiquetage):
+mêmes résultats que classify() texte par texte, un peu plus rapide sur de
+gros lots.
+"""
+import json
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+from itertools import chain
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+RULES_PATH = Path(__file__).parent / "data" / "mood_rules.json"
+
+_COMBINING = re.compile(r"[\u0300-\u036f]")
+# Mots, ou symbole isolé (emoji, ponctuation)
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+# Morceau qui sépare les textes d'un lot (classify_many)
+_SEPARATOR = "\x00"
+_NO_KEYWORD = 0
+_SEPARATOR_ID = -1
+_MAX_MEMO = 200_000
+
+
+def fold_text(text: str) -> str:
+    """Minuscules sans accents: 'Épuisé' -> 'epuise'."""
+    if text.isascii():
+        return text.lower()
+    return _COMBINING.sub("", unicodedata.normalize("NFKD", text)).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(fold_text(text))
+
+
+class MoodRuleEngine:
+    def __init__(self, rules: dict):
+        self.labels: List[str] = [entry["label"] for entry in rules["labels"]]
+        self.label_scores = np.array([entry["score"] for entry in rules["labels"]], dtype=np.float64)
+        self.empty: Tuple[str, float] = (rules["empty"]["label"], float(rules["empty"]["score"]))
+        self.default: Tuple[str, float] = (rules["default"]["label"], float(rules["default"]["score"]))
+        self._results = [(label, float(score)) for label, score in zip(self.labels, self.label_scores)]
+
+        # Trie des mots-clés: chaque fin de mot-clé porte un groupe vide "()" dont
+        # le numéro (m.lastindex) identifie le mot-clé reconnu.
+        trie: dict = {}
+        for label_index, entry in enumerate(rules["labels"]):
+            for keyword, weight in entry["keywords"].items():
+                node = trie
+                for char in fold_text(keyword.rstrip("*")):
+                    node = node.setdefault(char, {})
+                node[""] = (label_index, float(weight), keyword.endswith("*"))
+
+        # Identifiant n (= groupe capturant n) -> (index du label, poids); 0 = aucun mot-clé
+        keyword_label = [0]
+        keyword_weight = [0.0]
+
+        def compile_node(node: dict) -> str:
+            branches = []
+            for char, child in node.items():
+                if char:
+                    branches.append(re.escape(char) + compile_node(child))
+            if "" in node:
+                label_index, weight, prefix = node[""]
+                keyword_label.append(label_index)
+                keyword_weight.append(weight)
+                branches.append(r"()\w*" if prefix else "()")
+            return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+        self.pattern = re.compile(compile_node(trie))
+        self.keyword_label = np.array(keyword_label, dtype=np.intp)
+        self.keyword_weight = np.array(keyword_weight, dtype=np.float64)
+        self._keywords = list(zip(keyword_label, keyword_weight))
+        # Morceau de texte (entre deux espaces) -> identifiants de ses mots-clés
+        self._memo: dict = {_SEPARATOR: (_SEPARATOR_ID,)}
+        self._memo_lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: Path = RULES_PATH) -> "MoodRuleEngine":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def keyword_id(self, token: str) -> int:
+        """Mot-clé reconnu pour un mot entier déjà plié (0 si aucun)."""
+        # fullmatch revient sur les autres branches du trie quand la première ne
+        # couvre qu'un préfixe du mot ('anxiously': 'anxious' puis 'anxi*')
+        m = self.pattern.fullmatch(token)
+        return m.lastindex if m is not None else _NO_KEYWORD
+
+    def _remember(self, memo: dict, chunk: str):
+        ids = tuple(k for k in map(self.keyword_id, tokenize(chunk)) if k != _NO_KEYWORD)
+        with self._memo_lock:
+            if len(self._memo) >= _MAX_MEMO:
+                self._memo = {_SEPARATOR: (_SEPARATOR_ID,)}
+            memo[chunk] = ids
+
+    def chunk_keywords(self, chunks: List[str]) -> list:
+        """Identifiants des mots-clés de chaque morceau (tuples), résolus une fois par morceau distinct."""
+        memo = self._memo
+        found = list(map(memo.get, chunks))
+        if None in found:
+            for chunk in set(chunks).difference(memo):
+                self._remember(memo, chunk)
+            found = list(map(memo.get, chunks))
+        return found
+
+    def classify(self, text: Optional[str]) -> Tuple[str, float]:
+        if not text:
+            return self.empty
+        weights = [0.0] * len(self.labels)
+        keywords = self._keywords
+        # Boucle sur les seuls mots-clés trouvés (quelques-uns par texte)
+        for keyword in chain.from_iterable(self.chunk_keywords(text.replace(_SEPARATOR, " ").split())):
+            label_index, weight = keywords[keyword]
+            weights[label_index] += weight
+        best = max(weights)
+        # index() renvoie le premier maximum: égalités départagées par l'ordre du fichier
+        return self._results[weights.index(best)] if best > 0 else self.default
+
+    def classify_many(self, texts: Sequence[Optional[str]]) -> List[Tuple[str, float]]:
+        if not texts:
+            return []
+        joined = f" {_SEPARATOR} ".join((t or "").replace(_SEPARATOR, " ") for t in texts)
+        ids = np.fromiter(chain.from_iterable(self.chunk_keywords(joined.split())), dtype=np.intp)
+        # Index du texte de chaque mot-clé: nombre de séparateurs rencontrés avant lui
+        rows = np.cumsum(ids == _SEPARATOR_ID)
+        hits = ids != _SEPARATOR_ID
+        n_labels = len(self.labels)
+        flat = rows[hits] * n_labels + self.keyword_label[ids[hits]]
+        weights = np.bincount(flat, weights=self.keyword_weight[ids[hits]], minlength=len(texts) * n_labels)
+        weights = weights.reshape(len(texts), n_labels)
+
+        # argmax renvoie le premier maximum: même départage que classify()
+        best = weights.argmax(axis=1)
+        matched = weights.max(axis=1) > 0
+        results = []
+        for text, index, hit in zip(texts, best.tolist(), matched.tolist()):
+            if not text:
+                results.append(self.empty)
+            elif hit:
+                results.append(self._results[index])
+            else:
+                results.append(self.default)
+        return results
+
+
+@lru_cache(maxsize=1)
+def get_rule_engine() -> MoodRuleEngine:
+    return MoodRuleEngine.from_file()
+
+
+def analyze_moods(texts: Sequence[Optional[str]]) -> List[Tuple[str, float]]:
+    """Version par lots de analyze_mood (mêmes résultats, un seul découpage)."""
+    return get_rule_engine().classify_many(texts)
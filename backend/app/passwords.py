@@ -0,0 +1,173 @@
+"""
+Hachage des mots de passe (bcrypt) dans un pool de processus dédié.
+
+bcrypt coûte 100 à 300 ms de CPU par appel: exécuté dans le threadpool de
+l'API, une rafale de connexions prive les autres routes de threads. Les calculs
+passent donc par un ProcessPoolExecutor de taille fixe, et les demandes au-delà
+de PASSWORD_HASH_MAX_PENDING sont refusées en 429 avec Retry-After.
+
+Les routes /auth sont synchrones: chaque demande en attente occupe un thread
+du threadpool d'AnyIO (40 par défaut) jusqu'à la fin du calcul. Au démarrage,
+bound_to_threadpool() ramène donc la file à la moitié de ce threadpool au
+plus, pour que les autres routes synchrones gardent des threads.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from .config import settings
+
+
+_contexts: dict[int, CryptContext] = {}
+
+
+def _context(rounds: int) -> CryptContext:
+    # Les hash dont le coût diffère de `rounds` sont signalés par verify_and_update
+    ctx = _contexts.get(rounds)
+    if ctx is None:
+        ctx = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds,
+        )
+        _contexts[rounds] = ctx
+    return ctx
+
+
+def _truncate(password: str) -> str:
+    # bcrypt a une limite de 72 bytes pour les mots de passe
+    # On encode en UTF-8 et on tronque si nécessaire
+    password_bytes = password.encode('utf-8')
+    if len(password_bytes) > 72:
+        # Décoder pour obtenir une chaîne valide (peut tronquer au milieu d'un caractère UTF-8)
+        password = password_bytes[:72].decode('utf-8', errors='ignore')
+    return password
+
+
+# Fonctions exécutées dans les processus du pool (doivent rester au niveau module)
+def _warm_job(rounds: int) -> None:
+    _context(rounds)
+
+
+def _hash_job(password: str, rounds: int) -> str:
+    return _context(rounds).hash(_truncate(password))
+
+
+def _verify_job(password: str, hashed: str, rounds: int) -> tuple[bool, str | None]:
+    return _context(rounds).verify_and_update(_truncate(password), hashed)
+
+
+_executor: ProcessPoolExecutor | None = None
+_lock = threading.Lock()
+_pending = 0
+_max_pending = settings.password_hash_max_pending
+_stats = {"completed": 0, "errors": 0, "rejected": 0, "rehashed": 0}
+# Part du threadpool d'AnyIO que les demandes en attente peuvent occuper
+_THREADPOOL_SHARE = 0.5
+
+
+def _get_executor() -> ProcessPoolExecutor | None:
+    global _executor
+    if settings.password_hash_workers <= 0:
+        return None
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                # spawn: pas de fork d'un processus multi-thread (uvicorn)
+                _executor = ProcessPoolExecutor(
+                    max_workers=settings.password_hash_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _executor
+
+
+def bound_to_threadpool(threads: int):
+    """Borne la file d'attente à la part du threadpool (`threads` threads) réservée à bcrypt."""
+    global _max_pending
+    bound = max(1, int(threads * _THREADPOOL_SHARE))
+    with _lock:
+        _max_pending = min(settings.password_hash_max_pending, bound)
+    if settings.password_hash_max_pending > bound:
+        print(
+            f"⚠️  PASSWORD_HASH_MAX_PENDING={settings.password_hash_max_pending} ramené à {bound} "
+            f"(threadpool de {threads} threads)"
+        )
+
+
+def _run(fn, *args):
+    """Exécute un calcul bcrypt dans le pool, ou 429 si la file d'attente est pleine."""
+    global _pending
+    with _lock:
+        if _pending >= _max_pending:
+            _stats["rejected"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many authentication requests, please retry shortly.",
+                headers={"Retry-After": str(settings.password_hash_retry_after_seconds)},
+            )
+        _pending += 1
+    succeeded = False
+    try:
+        executor = _get_executor()
+        if executor is None:
+            # PASSWORD_HASH_WORKERS=0: calcul dans le thread appelant (développement)
+            result = fn(*args)
+        else:
+            result = executor.submit(fn, *args).result()
+        succeeded = True
+        return result
+    finally:
+        with _lock:
+            _pending -= 1
+            _stats["completed" if succeeded else "errors"] += 1
+
+
+def hash_password(password: str) -> str:
+    return _run(_hash_job, password, settings.bcrypt_rounds)
+
+
+def verify_password(plain: str, hashed: str) -> bool:
+    return verify_and_update_password(plain, hashed)[0]
+
+
+def verify_and_update_password(plain: str, hashed: str) -> tuple[bool, str | None]:
+    """
+    Vérifie le mot de passe. Si le hash a été calculé avec un autre coût que
+    BCRYPT_ROUNDS, retourne aussi un nouveau hash à enregistrer.
+    """
+    ok, new_hash = _run(_verify_job, plain, hashed, settings.bcrypt_rounds)
+    if new_hash:
+        with _lock:
+            _stats["rehashed"] += 1
+    return ok, new_hash
+
+
+def warm_up_password_pool():
+    """Démarre les processus du pool (évite le coût de spawn sur la première connexion)."""
+    executor = _get_executor()
+    if executor is not None:
+        for future in [executor.submit(_warm_job, settings.bcrypt_rounds) for _ in range(settings.password_hash_workers)]:
+            future.result()
+
+
+def shutdown_password_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def password_pool_stats() -> dict:
+    with _lock:
+        return dict(
+            _stats,
+            pending=_pending,
+            max_pending=_max_pending,
+            workers=settings.password_hash_workers,
+            bcrypt_rounds=settings.bcrypt_rounds,
+        )
@@ -0,0 +1,274 @@
+"""
+Diffusion des événements temps réel (WebSocket) entre processus.
+
+Un broker transmet des messages JSON sur des canaux nommés aux gestionnaires
+enregistrés dans chaque processus:
+  - "memory" (par défaut): dans le processus, pour un seul worker;
+  - "redis": PUBLISH/SUBSCRIBE sur un serveur parlant le protocole Redis
+    (Redis, Valkey, ou un substitut local), pour plusieurs workers ou nœuds.
+
+Canaux utilisés:
+  - chat:user:<id>  messages destinés à un utilisateur (app/chat_push.py);
+  - moods           humeurs enregistrées, évaluées par les abonnés de
+                    /match/ws de chaque worker (app/match_push.py).
+
+Un gestionnaire est appelé dans la boucle asyncio et doit rester court
+(ex: déposer le message dans la file d'une connexion).
+
+publish() ne fait jamais attendre l'appelant (POST /mood/, POST /chat/send):
+le broker Redis dépose le message dans une file bornée
+(REALTIME_PUBLISH_QUEUE_MAX) vidée par une tâche de fond, par lots en
+pipeline. Serveur injoignable: la file se remplit puis les messages suivants
+sont perdus (comptés), la requête n'est pas retardée.
+"""
+import asyncio
+import json
+import threading
+import traceback
+from typing import Callable, Dict, Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from .config import settings
+
+
+Handler = Callable[[str, dict], None]
+
+# Messages envoyés au serveur en un seul aller-retour (pipeline)
+_PUBLISH_BATCH = 100
+
+
+class Broker:
+    name = "base"
+
+    def __init__(self):
+        self._handlers: Dict[str, Set[Handler]] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "published": 0, "received": 0, "publish_errors": 0, "publish_dropped": 0, "handler_errors": 0, "listen_errors": 0
+        }
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, channel: str, message: dict):
+        raise NotImplementedError
+
+    async def subscribe(self, channel: str, handler: Handler):
+        # Enregistré avant tout await: deux abonnements simultanés ne s'abonnent qu'une fois au serveur
+        first = not self._handlers.get(channel)
+        self._handlers.setdefault(channel, set()).add(handler)
+        if first:
+            await self._remote_subscribe(channel)
+
+    async def unsubscribe(self, channel: str, handler: Handler):
+        handlers = self._handlers.get(channel)
+        if handlers is None:
+            return
+        handlers.discard(handler)
+        if not handlers:
+            del self._handlers[channel]
+            await self._remote_unsubscribe(channel)
+
+    async def _remote_subscribe(self, channel: str):
+        pass
+
+    async def _remote_unsubscribe(self, channel: str):
+        pass
+
+    def _dispatch(self, channel: str, message: dict):
+        self._count("received")
+        for handler in list(self._handlers.get(channel, ())):
+            try:
+                handler(channel, message)
+            except Exception:
+                self._count("handler_errors")
+                traceback.print_exc()
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._stats[key] += n
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, broker=self.name, channels=len(self._handlers))
+
+
+class InProcessBroker(Broker):
+    """Un seul processus: le message est remis directement aux gestionnaires locaux."""
+
+    name = "memory"
+
+    async def publish(self, channel: str, message: dict):
+        self._count("published")
+        self._dispatch(channel, message)
+
+
+class RedisBroker(Broker):
+    """PUBLISH/SUBSCRIBE Redis: chaque processus ne s'abonne qu'aux canaux de ses connexions."""
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str, queue_max: int = 10_000):
+        super().__init__()
+        self.url = url
+        self.prefix = prefix
+        self._redis = None
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        # File d'envoi: publish() y dépose le message, _publish_loop() l'envoie
+        self._outbox: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_max))
+        self._publisher: Optional[asyncio.Task] = None
+        self._dropping = False
+        # Abonnements refusés (serveur indisponible), réessayés par la boucle d'écoute
+        self._pending: Set[str] = set()
+
+    async def start(self):
+        import redis.asyncio as aioredis
+        from redis.asyncio.retry import Retry
+        from redis.backoff import NoBackoff
+        from redis.exceptions import ConnectionError as RedisConnectionError
+
+        # Un nouvel essai: la connexion du pool peut être morte après un redémarrage du serveur
+        self._redis = aioredis.from_url(
+            self.url, socket_connect_timeout=5, retry=Retry(NoBackoff(), 1), retry_on_error=[RedisConnectionError]
+        )
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        # Canal de contrôle: la connexion d'écoute existe avant le premier abonnement
+        await self._remote_subscribe("broker")
+        if not self._pending:
+            print(f"✅ Broker temps réel Redis: {self.url.rsplit('@', 1)[-1]}")
+        self._listener = asyncio.create_task(self._listen())
+        self._publisher = asyncio.create_task(self._publish_loop())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._publisher is not None:
+            self._publisher.cancel()
+            self._publisher = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        if self._redis is not None:
+            await self._redis.aclose()
+
+    async def publish(self, channel: str, message: dict):
+        data = json.dumps(message, separators=(",", ":"), default=str)
+        try:
+            self._outbox.put_nowait((self.prefix + channel, data))
+            self._dropping = False
+        except asyncio.QueueFull:
+            # L'émetteur n'échoue pas: le message est enregistré, seule la remise en direct est perdue
+            self._count("publish_dropped")
+            if not self._dropping:
+                self._dropping = True
+                print(f"⚠️  File de publication temps réel pleine ({self._outbox.maxsize}): messages perdus")
+
+    async def _publish_loop(self):
+        while True:
+            batch = [await self._outbox.get()]
+            while len(batch) < _PUBLISH_BATCH and not self._outbox.empty():
+                batch.append(self._outbox.get_nowait())
+            try:
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    for channel, data in batch:
+                        pipe.publish(channel, data)
+                    await pipe.execute()
+                self._count("published", len(batch))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._count("publish_errors", len(batch))
+                print(f"⚠️  Publication temps réel impossible ({len(batch)} messages): {e}")
+
+    def stats(self) -> dict:
+        return dict(super().stats(), publish_queue=self._outbox.qsize())
+
+    async def _remote_subscribe(self, channel: str):
+        try:
+            await self._pubsub.subscribe(self.prefix + channel)
+            self._pending.discard(channel)
+        except Exception as e:
+            if not self._pending:
+                print(f"❌ Broker temps réel Redis indisponible: {e}")
+            self._pending.add(channel)
+
+    async def _remote_unsubscribe(self, channel: str):
+        self._pending.discard(channel)
+        try:
+            await self._pubsub.unsubscribe(self.prefix + channel)
+        except Exception as e:
+            print(f"⚠️  Désabonnement temps réel impossible ({channel}): {e}")
+
+    async def _listen(self):
+        failing = False
+        while True:
+            try:
+                for channel in list(self._pending):
+                    if channel in self._handlers or channel == "broker":
+                        await self._remote_subscribe(channel)
+                    else:
+                        self._pending.discard(channel)
+                message = await self._pubsub.get_message(timeout=1.0)
+                if failing:
+                    failing = False
+                    print("✅ Écoute temps réel rétablie")
+                if message is None or message.get("type") != "message":
+                    continue
+                channel = message["channel"].decode("utf-8")[len(self.prefix):]
+                self._dispatch(channel, json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Serveur indisponible: redis-py se reconnecte et rétablit les abonnements
+                self._count("listen_errors")
+                if not failing:
+                    failing = True
+                    print(f"⚠️  Écoute temps réel interrompue: {e}")
+                await asyncio.sleep(1.0)
+
+
+_broker: Optional[Broker] = None
+
+
+def get_broker() -> Broker:
+    global _broker
+    if _broker is None:
+        if settings.realtime_broker == "redis":
+            _broker = RedisBroker(
+                settings.realtime_redis_url, settings.realtime_channel_prefix, settings.realtime_publish_queue_max
+            )
+        else:
+            _broker = InProcessBroker()
+    return _broker
+
+
+async def start_broker() -> Broker:
+    broker = get_broker()
+    await broker.start()
+    return broker
+
+
+async def stop_broker():
+    if _broker is not None:
+        await _broker.stop()
+
+
+def broker_stats() -> dict:
+    return get_broker().stats()
+
+
+async def send_queued(websocket: WebSocket, queue: asyncio.Queue, on_sent: Optional[Callable[[dict], None]] = None):
+    """Seule tâche qui écrit sur la socket: réponses et événements passent par la file de la connexion."""
+    try:
+        while True:
+            message = await queue.get()
+            await websocket.send_json(message)
+            if on_sent is not None:
+                on_sent(message)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
@@ -6,9 +6,9 @@ from sqlalchemy.orm import Session
 
 from ..db import get_db
 from .. import models, schemas
-from ..auth import hash_password, verify_password, create_access_token, get_current_user
+from ..auth import hash_password, verify_and_update_password, create_access_token, get_current_user, invalidate_principal
 from ..config import settings
-from ..email_service import send_verification_email
+from ..email_service import queue_verification_email
 
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -119,9 +119,9 @@ def register(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
                 )
             raise  # Re-raise si c'est une autre erreur
         
-        # Envoyer l'email de vérification
-        print(f"📧 Envoi de l'email de vérification à {user_in.email}...")
-        email_sent = send_verification_email(user_in.email, verification_code)
+        # Mettre l'email de vérification en file d'envoi (envoyé en arrière-plan)
+        print(f"📧 Mise en file de l'email de vérification pour {user_in.email}...")
+        email_sent = queue_verification_email(db, user, verification_code)
         if not email_sent:
             # Si l'email n'a pas pu être envoyé, on continue quand même
             # L'utilisateur pourra demander un nouveau code plus tard
@@ -130,7 +130,7 @@ def register(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
             print(f"   L'utilisateur peut utiliser ce code pour vérifier son compte")
             print(f"   OU demander un nouveau code via /auth/resend-verification")
         else:
-            print(f"✅ Email de vérification envoyé avec succès à {user_in.email}")
+            print(f"✅ Email de vérification mis en file pour {user_in.email}")
         
         # Convertir email_verified de string à bool pour la réponse
         return schemas.UserPublic(
@@ -244,6 +244,7 @@ def verify_email(verification: schemas.EmailVerification, db: Session = Depends(
     user.verification_code_expires = None
     db.commit()
     db.refresh(user)
+    invalidate_principal(user.id)
     
     print(f"✅ Email vérifié avec succès pour {user.email}")
     
@@ -275,12 +276,13 @@ def resend_verification(email_data: schemas.ResendVerificationRequest, db: Sessi
     user.verification_code_expires = verification_code_expires
     db.commit()
     db.refresh(user)
+    invalidate_principal(user.id)
     
     print(f"✅ Code sauvegardé en base de données")
     
-    # Envoyer l'email
-    print(f"📧 Envoi de l'email de vérification à {email_data.email}...")
-    email_sent = send_verification_email(email_data.email, verification_code)
+    # Mettre l'email en file d'envoi
+    print(f"📧 Mise en file de l'email de vérification pour {email_data.email}...")
+    email_sent = queue_verification_email(db, user, verification_code)
     if not email_sent:
         print(f"❌ Échec de l'envoi de l'email, mais le code est sauvegardé: {verification_code}")
         raise HTTPException(
@@ -288,7 +290,7 @@ def resend_verification(email_data: schemas.ResendVerificationRequest, db: Sessi
             detail="Could not send verification email. Please check your email configuration or try again later."
         )
     
-    print(f"✅ Code de vérification renvoyé avec succès à {email_data.email}")
+    print(f"✅ Code de vérification mis en file pour {email_data.email}")
     
     return schemas.ResendVerificationResponse(sent=True, message="Verification code sent successfully")
 
@@ -331,6 +333,7 @@ def update_current_user_info(
         db.add(user)
         db.commit()
         db.refresh(user)
+        invalidate_principal(user.id)
 
     return schemas.UserPublic(
         id=user.id,
@@ -344,8 +347,16 @@ def update_current_user_info(
 @router.post("/token", response_model=schemas.Token)
 def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
+    password_ok, new_hash = verify_and_update_password(form_data.password, user.hashed_password)
+    if not password_ok:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
+    if new_hash:
+        # BCRYPT_ROUNDS a changé: ré-enregistrer le hash de façon transparente
+        user.hashed_password = new_hash
+        db.commit()
+        invalidate_principal(user.id)
     
     # Vérifier que l'email est vérifié
     if user.email_verified != "true":
@@ -1,60 +1,212 @@
+import asyncio
+import json
 from datetime import datetime
 from typing import List, Optional, Tuple
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, desc
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, WebSocket, WebSocketDisconnect, status
+from sqlalchemy import select, or_, and_, desc, tuple_, union_all, update, case, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
-from ..db import get_db
+from ..db import get_async_db
 from .. import models, schemas
-from ..auth import get_current_user
+from ..auth import authenticate_websocket, get_current_user_async, get_async_read_db
+from ..chat_push import chat_hub
+from ..realtime import send_queued
 
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 
-def get_or_create_conversation(db: Session, user_a_id: int, user_b_id: int) -> models.Conversation:
+async def get_or_create_conversation(db: AsyncSession, user_a_id: int, user_b_id: int) -> models.Conversation:
     # Order pair to avoid duplicates (A,B) and (B,A)
     a, b = sorted([user_a_id, user_b_id])
     conv = (
-        db.query(models.Conversation)
-        .filter(and_(models.Conversation.user_one_id == a, models.Conversation.user_two_id == b))
-        .first()
-    )
+        await db.execute(
+            select(models.Conversation)
+            .where(and_(models.Conversation.user_one_id == a, models.Conversation.user_two_id == b))
+            .limit(1)
+        )
+    ).scalar_one_or_none()
     if conv:
         return conv
     conv = models.Conversation(user_one_id=a, user_two_id=b)
     db.add(conv)
-    db.commit()
-    db.refresh(conv)
+    await db.commit()
+    await db.refresh(conv)
     return conv
 
 
 @router.get("/conversations", response_model=List[schemas.ConversationPublic])
-def list_conversations(db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    return (
-        db.query(models.Conversation)
-        .filter(or_(models.Conversation.user_one_id == user.id, models.Conversation.user_two_id == user.id))
+async def list_conversations(db: AsyncSession = Depends(get_async_read_db), user: models.User = Depends(get_current_user_async)):
+    result = await db.execute(
+        select(models.Conversation)
+        .where(or_(models.Conversation.user_one_id == user.id, models.Conversation.user_two_id == user.id))
         .order_by(desc(models.Conversation.created_at))
-        .all()
     )
+    return result.scalars().all()
 
 
-@router.get("/messages/{conversation_id}", response_model=List[schemas.MessagePublic])
-def list_messages(conversation_id: int, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    conv = db.query(models.Conversation).filter(models.Conversation.id == conversation_id).first()
+INBOX_SNIPPET_CHARS = 120
+
+
+def _parse_inbox_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Curseur "last_message_at:id" de la dernière conversation de la page précédente."""
+    try:
+        last_message_at, conversation_id = cursor.rsplit(":", 1)
+        return datetime.fromisoformat(last_message_at), int(conversation_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def inbox_query(user_id: int, limit: int, cursor: Optional[Tuple[datetime, int]] = None):
+    """
+    Une page de la boîte de réception en une requête: conversations par
+    dernier message (index par participant, une branche par colonne), nom de
+    l'autre participant, extrait du dernier message et nombre de non lus.
+    """
+    conv = models.Conversation
+
+    def participant(column):
+        query = select(conv.id, conv.user_one_id, conv.user_two_id, conv.last_message_id, conv.last_message_at).where(
+            column == user_id, conv.last_message_at.isnot(None)
+        )
+        if cursor is not None:
+            query = query.where(tuple_(conv.last_message_at, conv.id) < tuple_(*cursor))
+        return query.order_by(conv.last_message_at.desc(), conv.id.desc()).limit(limit)
+
+    page = union_all(participant(conv.user_one_id), participant(conv.user_two_id)).subquery()
+    last_message = aliased(models.Message)
+    other_user_id = case((page.c.user_one_id == user_id, page.c.user_two_id), else_=page.c.user_one_id)
+    unread = (
+        select(func.count())
+        .where(
+            models.Message.conversation_id == page.c.id,
+            models.Message.recipient_id == user_id,
+            models.Message.read_at.is_(None),
+        )
+        .scalar_subquery()
+    )
+    return (
+        select(
+            page.c.id,
+            other_user_id.label("other_user_id"),
+            models.User.display_name.label("other_display_name"),
+            page.c.last_message_id,
+            func.substr(last_message.text, 1, INBOX_SNIPPET_CHARS).label("last_message_text"),
+            last_message.sender_id.label("last_message_sender_id"),
+            page.c.last_message_at,
+            unread.label("unread_count"),
+        )
+        .join(last_message, last_message.id == page.c.last_message_id)
+        .join(models.User, models.User.id == other_user_id)
+        .order_by(page.c.last_message_at.desc(), page.c.id.desc())
+        .limit(limit)
+    )
+
+
+@router.get("/inbox", response_model=List[schemas.InboxConversation])
+async def list_inbox(
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    user: models.User = Depends(get_current_user_async),
+):
+    """
+    Conversations avec au moins un message, la plus récemment active
+    d'abord. Page pleine: X-Next-Cursor à repasser dans `cursor`.
+    """
+    rows = (await db.execute(inbox_query(user.id, limit, _parse_inbox_cursor(cursor) if cursor else None))).all()
+    if len(rows) == limit:
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = f"{last.last_message_at.replace(tzinfo=None).isoformat()}:{last.id}"
+    return [schemas.InboxConversation.model_validate(row, from_attributes=True) for row in rows]
+
+
+@router.post("/conversations/{conversation_id}/read", response_model=schemas.ConversationRead)
+async def mark_conversation_read(
+    conversation_id: int,
+    up_to_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+    user: models.User = Depends(get_current_user_async),
+):
+    """Marque comme lus les messages reçus dans la conversation (jusqu'à up_to_id inclus, si fourni)."""
+    conv = await db.get(models.Conversation, conversation_id)
     if not conv or (user.id not in [conv.user_one_id, conv.user_two_id]):
         raise HTTPException(status_code=404, detail="Conversation not found")
-    return (
-        db.query(models.Message)
-        .filter(models.Message.conversation_id == conversation_id)
-        .order_by(models.Message.created_at.asc())
-        .limit(200)
-        .all()
+    query = update(models.Message).where(
+        models.Message.conversation_id == conversation_id,
+        models.Message.recipient_id == user.id,
+        models.Message.read_at.is_(None),
     )
+    if up_to_id is not None:
+        query = query.where(models.Message.id <= up_to_id)
+    result = await db.execute(query.values(read_at=datetime.utcnow()).execution_options(synchronize_session=False))
+    await db.commit()
+    return schemas.ConversationRead(conversation_id=conversation_id, marked_read=result.rowcount)
+
+
+def message_page_query(conversation_id: int, before_id: Optional[int], after_id: Optional[int], limit: int):
+    """
+    Page de l'historique par curseur (created_at, id), lue dans l'ordre de
+    idx_messages_conversation_created_id: du plus récent au plus ancien, sauf
+    avec after_id (du plus ancien au plus récent).
+    """
+    key = tuple_(models.Message.created_at, models.Message.id)
+    query = select(models.Message).where(models.Message.conversation_id == conversation_id)
+    cursor_id = after_id if after_id is not None else before_id
+    if cursor_id is not None:
+        # Sous-requête scalaire (évaluée une fois): la comparaison reste une condition d'index
+        cursor_created_at = (
+            select(models.Message.created_at)
+            .where(models.Message.id == cursor_id, models.Message.conversation_id == conversation_id)
+            .scalar_subquery()
+        )
+        cursor_key = tuple_(cursor_created_at, cursor_id)
+        query = query.where(key > cursor_key if after_id is not None else key < cursor_key)
+    if after_id is not None:
+        return query.order_by(models.Message.created_at.asc(), models.Message.id.asc()).limit(limit)
+    return query.order_by(models.Message.created_at.desc(), models.Message.id.desc()).limit(limit)
+
+
+@router.get("/messages/{conversation_id}", response_model=List[schemas.MessagePublic])
+async def list_messages(
+    conversation_id: int,
+    response: Response,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_db),
+    user: models.User = Depends(get_current_user_async),
+):
+    """
+    Historique par pages, chacune dans l'ordre chronologique:
+      - sans curseur: les `limit` derniers messages;
+      - before_id: la page précédente (plus anciens que ce message);
+      - after_id: les messages suivants ("depuis X", ex: après une reconnexion à /chat/ws).
+    Page pleine: X-Next-Cursor contient l'id à repasser dans le même paramètre.
+    """
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status_code=400, detail="Use either before_id or after_id")
+    conv = await db.get(models.Conversation, conversation_id)
+    if not conv or (user.id not in [conv.user_one_id, conv.user_two_id]):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    messages = list((await db.execute(message_page_query(conversation_id, before_id, after_id, limit))).scalars().all())
+
+    if len(messages) == limit:
+        response.headers["X-Next-Cursor"] = str(messages[-1].id)
+    if after_id is None:
+        messages.reverse()
+    return messages
 
 
 @router.post("/send", response_model=schemas.MessagePublic)
-def send_message(payload: schemas.MessageCreate, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+async def send_message(
+    payload: schemas.MessageCreate,
+    db: AsyncSession = Depends(get_async_db),
+    user: models.User = Depends(get_current_user_async),
+):
     if not payload.text or not payload.text.strip():
         raise HTTPException(status_code=400, detail="Message text is required")
     if payload.recipient_id == user.id:
@@ -62,11 +214,11 @@ def send_message(payload: schemas.MessageCreate, db: Session = Depends(get_db),
 
     # Ensure conversation exists
     if payload.conversation_id:
-        conv = db.query(models.Conversation).filter(models.Conversation.id == payload.conversation_id).first()
+        conv = await db.get(models.Conversation, payload.conversation_id)
         if not conv or (user.id not in [conv.user_one_id, conv.user_two_id]):
             raise HTTPException(status_code=404, detail="Conversation not found")
     else:
-        conv = get_or_create_conversation(db, user.id, payload.recipient_id)
+        conv = await get_or_create_conversation(db, user.id, payload.recipient_id)
 
     msg = models.Message(
         conversation_id=conv.id,
@@ -75,8 +227,23 @@ def send_message(payload: schemas.MessageCreate, db: Session = Depends(get_db),
         text=payload.text.strip(),
     )
     db.add(msg)
-    db.commit()
-    db.refresh(msg)
+    await db.flush()
+    # Dernier message de la conversation, dans la même transaction; envois simultanés: le plus récent l'emporte
+    await db.execute(
+        update(models.Conversation)
+        .where(
+            models.Conversation.id == conv.id,
+            or_(
+                models.Conversation.last_message_at.is_(None),
+                tuple_(models.Conversation.last_message_at, models.Conversation.last_message_id) < tuple_(msg.created_at, msg.id),
+            ),
+        )
+        .values(last_message_id=msg.id, last_message_at=msg.created_at)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    await db.refresh(msg)
+    await chat_hub.publish_message(msg)
 
     # Create notification for recipient
     notif = models.Notification(
@@ -87,8 +254,44 @@ def send_message(payload: schemas.MessageCreate, db: Session = Depends(get_db),
         icon="💬",
     )
     db.add(notif)
-    db.commit()
+    await db.commit()
 
     return msg
 
 
+@router.websocket("/ws")
+async def chat_socket(websocket: WebSocket):
+    """
+    Messages reçus en direct. Authentification: ?token=<JWT> ou en-tête
+    Authorization. L'envoi reste POST /chat/send.
+
+    Client -> serveur (JSON): {"type": "ping"}
+    Serveur -> client:
+      {"type": "message", "message": {MessagePublic}, "sent_at": <epoch>}
+      {"type": "pong"}
+      {"type": "error", "detail": ".."}
+    """
+    user = await authenticate_websocket(websocket)
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    conn = await chat_hub.connect(user.id)
+    sender = asyncio.create_task(send_queued(websocket, conn.queue, chat_hub.record_sent))
+    try:
+        while True:
+            try:
+                kind = json.loads(await websocket.receive_text()).get("type")
+            except (ValueError, AttributeError, KeyError):
+                # KeyError: trame binaire (receive_text ne lit que les trames texte)
+                chat_hub.send(conn, {"type": "error", "detail": "Invalid message"})
+                continue
+            if kind == "ping":
+                chat_hub.send(conn, {"type": "pong"})
+            else:
+                chat_hub.send(conn, {"type": "error", "detail": "Unknown message type"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await chat_hub.disconnect(conn)
+        sender.cancel()
@@ -1,33 +1,33 @@
 from typing import List
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
+from sqlalchemy import select, desc, func
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..db import get_db
 from .. import models
-from ..auth import get_current_user
+from ..auth import get_current_user_async, get_async_read_db
 
 router = APIRouter(prefix="/feed", tags=["feed"])
 
 
 @router.get("/posts")
-def list_feed_posts(db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+async def list_feed_posts(db: AsyncSession = Depends(get_async_read_db), user: models.User = Depends(get_current_user_async)):
     """
     Retourne un flux de 'posts' basé sur les derniers MoodEvent de tous les utilisateurs.
     """
     rows = (
-        db.query(
-            models.MoodEvent.id.label("id"),
-            models.User.display_name.label("author"),
-            models.MoodEvent.text.label("content"),
-            models.MoodEvent.created_at.label("timestamp"),
-            models.MoodEvent.mood_label.label("mood"),
+        await db.execute(
+            select(
+                models.MoodEvent.id.label("id"),
+                models.User.display_name.label("author"),
+                models.MoodEvent.text.label("content"),
+                models.MoodEvent.created_at.label("timestamp"),
+                models.MoodEvent.mood_label.label("mood"),
+            )
+            .join(models.User, models.User.id == models.MoodEvent.user_id)
+            .order_by(desc(models.MoodEvent.created_at))
+            .limit(50)
         )
-        .join(models.User, models.User.id == models.MoodEvent.user_id)
-        .order_by(desc(models.MoodEvent.created_at))
-        .limit(50)
-        .all()
-    )
+    ).all()
     # Shape into simple dicts expected by mobile
     return [
         {
@@ -1,85 +1,231 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import json
+import math
+import time
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, WebSocket, WebSocketDisconnect, status
 from typing import List
-from math import radians, sin, cos, asin, sqrt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..db import get_db
 from .. import models, schemas
-from ..auth import get_current_user
+from ..auth import authenticate_websocket, get_current_user_async, get_async_read_db
+from ..db import open_async_read_session
 from ..config import settings
+from ..geo import cell_filter, distance_m_sql
+from ..match_scoring import get_match_scorer
+from ..match_cache import compute_etag, suggestion_cache
+from ..batch_matching import precomputed_suggestions, public_name
+from ..geo_index import active_cutoff, display_names, nearby_active
+from ..match_push import PushConnection, match_push
+from ..realtime import send_queued
 
 
 router = APIRouter(prefix="/match", tags=["match"])
 
 
-def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    R = 6371000.0
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
-    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
-    c = 2 * asin(sqrt(a))
-    return R * c
+def candidate_query(user_id: int, lat: float, lng: float, radius_m: float, limit: int):
+    """
+    Dernière humeur (une ligne par utilisateur) des autres utilisateurs actifs
+    (GEO_INDEX_ACTIVE_HOURS) dans le rayon, les plus récentes d'abord, au plus
+    `limit` lignes.
+    """
+    latest = models.UserLatestMood
+    return (
+        select(
+            latest.user_id,
+            latest.mood_label,
+            latest.mood_score,
+            latest.lat,
+            latest.lng,
+            latest.created_at,
+            models.User.display_name,
+        )
+        .join(models.User, models.User.id == latest.user_id)
+        .where(latest.user_id != user_id)
+        .where(latest.lat.isnot(None), latest.lng.isnot(None))
+        .where(cell_filter(latest, lat, lng, radius_m))
+        # Distance exacte avant le plafond: mêmes candidats que l'index partagé
+        .where(distance_m_sql(latest, lat, lng) <= radius_m)
+        .where(latest.created_at >= active_cutoff())
+        .order_by(latest.created_at.desc())
+        .limit(limit)
+    )
 
 
-def is_mood_compatible(a: str, b: str) -> bool:
-    if a == b:
-        return True
-    complementary: dict[str, set[str]] = {
-        "calm": {"calm", "joy"},
-        "joy": {"joy", "calm", "energy"},
-        "energy": {"energy", "joy"},
-        "fatigue": {"calm", "joy"},
-        "stress": {"calm"},
-    }
-    return b in complementary.get(a, {a})
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or etag in tags
 
 
 @router.get("/suggestions", response_model=List[schemas.MatchSuggestion])
-def match_suggestions(
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+async def match_suggestions(
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+    user: models.User = Depends(get_current_user_async),
     radius_m: int | None = None,
     anonymous: bool = True,
+    if_none_match: str | None = Header(default=None),
 ):
-    radius = radius_m or settings.default_matching_radius_m
-    last_mood = (
-        db.query(models.MoodEvent)
-        .filter(models.MoodEvent.user_id == user.id)
-        .order_by(models.MoodEvent.created_at.desc())
-        .first()
-    )
+    radius = min(radius_m or settings.default_matching_radius_m, settings.match_max_radius_m)
+    cache_key = (user.id, radius, anonymous)
+    use_cache = settings.match_cache_ttl_seconds > 0
+    cached = suggestion_cache.get(cache_key) if use_cache else None
+    if cached is not None:
+        etag, out = cached
+    else:
+        out, last_mood = await _compute_suggestions(db, user, radius, anonymous)
+        etag = compute_etag([s.model_dump() for s in out])
+        if use_cache:
+            suggestion_cache.set(cache_key, user.id, last_mood.lat, last_mood.lng, radius, out, etag)
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(if_none_match, etag):
+        suggestion_cache.count_not_modified()
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return out
+
+
+async def _compute_suggestions(db: AsyncSession, user: models.User, radius: float, anonymous: bool):
+    last_mood = await db.get(models.UserLatestMood, user.id)
     if not last_mood or last_mood.lat is None or last_mood.lng is None:
         raise HTTPException(status_code=400, detail="User location/mood required")
 
+    if settings.match_precomputed_max_age_seconds > 0:
+        # Résultat du calcul en lot, s'il est encore valable
+        precomputed = await precomputed_suggestions(db, last_mood, radius, anonymous)
+        if precomputed is not None:
+            return precomputed, last_mood
+
+    scorer = get_match_scorer()
+    # Index partagé des utilisateurs actifs: ceux du rayon, sans lire user_latest_mood
+    hits = nearby_active(last_mood.lat, last_mood.lng, radius, exclude_user_id=user.id)
+    if hits is not None:
+        # Comme candidate_query: les match_max_candidates plus récents
+        hits = hits.top(settings.match_max_candidates, -hits.created_at)
+        chosen, distances, _ = scorer.rank(
+            last_mood.lat,
+            last_mood.lng,
+            last_mood.mood_label,
+            last_mood.mood_score,
+            hits.lats,
+            hits.lngs,
+            hits.labels,
+            hits.mood_scores,
+            time.time() - hits.created_at,
+            radius,
+            settings.match_max_results,
+        )
+        user_ids = hits.user_ids[chosen].tolist()
+        names = {} if anonymous else await display_names(db, user_ids)
+        out = [
+            schemas.MatchSuggestion(
+                user_id=uid,
+                distance_m=round(float(d), 1),
+                mood_label=hits.labels[i],
+                display_name=public_name(uid, names.get(uid), anonymous),
+                lat=float(hits.lats[i]),
+                lng=float(hits.lngs[i]),
+            )
+            for i, uid, d in zip(chosen, user_ids, distances)
+        ]
+        return out, last_mood
+
     candidates = (
-        db.query(models.MoodEvent, models.User)
-        .join(models.User, models.User.id == models.MoodEvent.user_id)
-        .filter(models.MoodEvent.id != last_mood.id)
-        .filter(models.MoodEvent.lat.isnot(None))
-        .filter(models.MoodEvent.lng.isnot(None))
-        .order_by(models.MoodEvent.created_at.desc())
-        .limit(200)
-        .all()
-    )
+        await db.execute(
+            candidate_query(user.id, last_mood.lat, last_mood.lng, radius, settings.match_max_candidates)
+        )
+    ).all()
+
+    chosen, distances = scorer.rank_rows(last_mood, candidates, radius, settings.match_max_results)
 
     out: list[schemas.MatchSuggestion] = []
-    for ev, u in candidates:
-        d = haversine_m(last_mood.lat, last_mood.lng, ev.lat, ev.lng)
-        if d <= radius and (is_mood_compatible(last_mood.mood_label, ev.mood_label) or abs(ev.mood_score - last_mood.mood_score) < 0.2):
-            name = u.display_name
-            if anonymous or not name:
-                # simple deterministic pseudonym
-                name = f"Anonyme #{u.id%10000:04d}"
-            out.append(
-                schemas.MatchSuggestion(
-                    user_id=u.id,
-                    distance_m=round(d, 1),
-                    mood_label=ev.mood_label,
-                    display_name=name,
-                    lat=ev.lat,
-                    lng=ev.lng,
-                )
+    for i, d in zip(chosen, distances):
+        c = candidates[i]
+        out.append(
+            schemas.MatchSuggestion(
+                user_id=c.user_id,
+                distance_m=round(float(d), 1),
+                mood_label=c.mood_label,
+                display_name=public_name(c.user_id, c.display_name, anonymous),
+                lat=c.lat,
+                lng=c.lng,
             )
-    return sorted(out, key=lambda s: (s.distance_m or 0))
+        )
+    return out, last_mood
+
 
+@router.websocket("/ws")
+async def match_push_socket(websocket: WebSocket):
+    """
+    Suggestions poussées en temps réel. Authentification: ?token=<JWT> ou
+    en-tête Authorization.
 
+    Client -> serveur (JSON):
+      {"type": "subscribe", "radius_m": 1500, "anonymous": true, "lat": .., "lng": ..}
+        (position: par défaut celle de la dernière humeur; un nouvel abonnement remplace le précédent)
+      {"type": "unsubscribe"}
+    Serveur -> client:
+      {"type": "subscribed", "lat": .., "lng": .., "radius_m": .., "mood_label": ..}
+      {"type": "match", "suggestion": {MatchSuggestion}}
+      {"type": "error", "detail": ".."}
+    """
+    user = await authenticate_websocket(websocket)
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    conn = match_push.connect(user.id)
+    sender = asyncio.create_task(send_queued(websocket, conn.queue))
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                kind = message.get("type")
+            except (ValueError, AttributeError, KeyError):
+                # KeyError: trame binaire (receive_text ne lit que les trames texte)
+                match_push.send(conn, {"type": "error", "detail": "Invalid message"})
+                continue
+            if kind == "subscribe":
+                await _subscribe(conn, message)
+            elif kind == "unsubscribe":
+                match_push.unsubscribe(conn)
+            else:
+                match_push.send(conn, {"type": "error", "detail": "Unknown message type"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        match_push.disconnect(conn)
+        sender.cancel()
+
+
+async def _subscribe(conn: PushConnection, message: dict):
+    db = await open_async_read_session(conn.user_id)
+    try:
+        last_mood = await db.get(models.UserLatestMood, conn.user_id)
+    finally:
+        await db.close()
+    try:
+        lat = float(message["lat"]) if message.get("lat") is not None else (last_mood.lat if last_mood else None)
+        lng = float(message["lng"]) if message.get("lng") is not None else (last_mood.lng if last_mood else None)
+        radius = min(float(message.get("radius_m") or settings.default_matching_radius_m), settings.match_max_radius_m)
+    except (TypeError, ValueError):
+        match_push.send(conn, {"type": "error", "detail": "Invalid subscription"})
+        return
+    anonymous = message.get("anonymous", True)
+    # NaN passe min() et la comparaison à 0; "false" (chaîne) ne doit pas valoir True
+    if not math.isfinite(radius) or not isinstance(anonymous, bool):
+        match_push.send(conn, {"type": "error", "detail": "Invalid subscription"})
+        return
+    if lat is None or lng is None or not (-90 <= lat <= 90 and -180 <= lng <= 180) or radius <= 0:
+        match_push.send(conn, {"type": "error", "detail": "User location required"})
+        return
+    label = last_mood.mood_label if last_mood else None
+    match_push.subscribe(
+        conn, lat, lng, radius, anonymous, label, last_mood.mood_score if last_mood else 0.0
+    )
+    # Sans humeur, l'abonnement ne reçoit rien jusqu'à la première humeur publiée
+    match_push.send(conn, {"type": "subscribed", "lat": lat, "lng": lng, "radius_m": radius, "mood_label": label})
@@ -1,101 +1,180 @@
-from fastapi import APIRouter, Depends
-from typing import List
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import List, Optional, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..db import get_db
+from ..db import get_async_db
 from .. import models, schemas
-from ..auth import get_current_user
-from ..services import analyze_mood_smart
+from ..auth import get_current_user_async, get_async_read_db
+from ..services import classify_local
+from ..mood_pipeline import enqueue_refinement
+from ..latest_mood import latest_mood_upsert
+from ..geo import cell_columns, cell_filter, distance_m_sql, haversine_m_array
+from ..match_cache import suggestion_cache
+from ..geo_index import active_cutoff, display_names, nearby_active, record_mood
+from ..realtime import get_broker
 
 
 router = APIRouter(prefix="/mood", tags=["mood"])
 
-# Utilitaire simple pour convertir un rayon (m) en degrés approx (latitude/longitude)
-def meters_to_degrees(delta_m: float) -> float:
-    # 1 degré ~ 111_000 m (approx)
-    return delta_m / 111_000.0
+# /nearby: premier rayon de recherche, et plafond de lignes lues par requête SQL (les plus proches)
+NEARBY_INITIAL_RADIUS_M = 250.0
+NEARBY_MAX_CANDIDATES = 5000
 
 
 @router.post("/", response_model=schemas.MoodPublic)
-def submit_mood(mood_in: schemas.MoodCreate, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    label, score = analyze_mood_smart(mood_in.text)
+async def submit_mood(
+    mood_in: schemas.MoodCreate,
+    db: AsyncSession = Depends(get_async_db),
+    user: models.User = Depends(get_current_user_async),
+):
+    # Étiquette instantanée (modèle local si confiant, sinon règles); le LLM affine les règles en arrière-plan
+    label, score, source = classify_local(mood_in.text)
     ev = models.MoodEvent(
         user_id=user.id,
         text=mood_in.text,
         mood_label=label,
         mood_score=score,
+        label_source=source,
         lat=mood_in.lat,
         lng=mood_in.lng,
+        **cell_columns(mood_in.lat, mood_in.lng),
     )
     db.add(ev)
-    db.commit()
-    db.refresh(ev)
+    await db.flush()
+    # Même transaction: la dernière humeur de l'utilisateur suit l'insertion
+    await db.execute(latest_mood_upsert(ev))
+    await db.commit()
+    await db.refresh(ev)
+    suggestion_cache.invalidate_mood(ev.user_id, ev.lat, ev.lng)
+    record_mood(ev)
+    await get_broker().publish(
+        "moods",
+        {
+            "user_id": ev.user_id,
+            "display_name": user.display_name,
+            "lat": ev.lat,
+            "lng": ev.lng,
+            "mood_label": ev.mood_label,
+            "mood_score": ev.mood_score,
+        },
+    )
+    enqueue_refinement(ev)
     return ev
 
 
 @router.get("/", response_model=List[schemas.MoodPublic])
-def list_my_moods(db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    return (
-        db.query(models.MoodEvent)
-        .filter(models.MoodEvent.user_id == user.id)
+async def list_my_moods(db: AsyncSession = Depends(get_async_db), user: models.User = Depends(get_current_user_async)):
+    result = await db.execute(
+        select(models.MoodEvent)
+        .where(models.MoodEvent.user_id == user.id)
         .order_by(models.MoodEvent.created_at.desc())
         .limit(50)
-        .all()
     )
+    return result.scalars().all()
+
+
+def _parse_cursor(cursor: str) -> Tuple[float, int]:
+    """Curseur "distance:user_id" du dernier élément de la page précédente."""
+    try:
+        distance, user_id = cursor.split(":")
+        return float(distance), int(user_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @router.get("/nearby", response_model=List[schemas.MatchSuggestion])
-def list_nearby_latest_moods(
+async def list_nearby_latest_moods(
     lat: float,
     lng: float,
+    response: Response,
     radius_m: float = 1500,
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    user: models.User = Depends(get_current_user_async),
 ):
     """
-    Retourne la dernière humeur (avec position) de chaque utilisateur à proximité.
-    Le filtrage de proximité est approximatif (fenêtre en degrés).
-    """
-    # Sous-requête: dernière date par utilisateur
-    from sqlalchemy import func, and_
+    Retourne la dernière humeur (avec position) des `limit` utilisateurs les plus
+    proches dans `radius_m`, triés par distance (puis user_id). Seuls les
+    utilisateurs actifs depuis GEO_INDEX_ACTIVE_HOURS sont retournés.
 
-    sub = (
-        db.query(
-            models.MoodEvent.user_id.label("u_id"),
-            func.max(models.MoodEvent.created_at).label("last_dt"),
+    Page suivante: repasser l'en-tête X-Next-Cursor de la réponse en `cursor`.
+    """
+    after_d, after_id = _parse_cursor(cursor) if cursor else (-1.0, 0)
+    # Index partagé des utilisateurs actifs (GEO_INDEX_ACTIVE_HOURS), sinon la base
+    hits = nearby_active(lat, lng, radius_m)
+    if hits is not None:
+        # Comme la base: au plus NEARBY_MAX_CANDIDATES candidats après le curseur, les plus proches
+        after = _after_cursor(hits.dist, hits.user_ids, after_d, after_id)
+        hits = hits.top(NEARBY_MAX_CANDIDATES, np.where(after, hits.dist, np.inf))
+        dist, user_ids = hits.dist, hits.user_ids
+        keep = np.flatnonzero(_after_cursor(dist, user_ids, after_d, after_id))
+        page = _page(keep, dist, user_ids, limit, response)
+        names = await display_names(db, user_ids[page].tolist())
+        return [
+            schemas.MatchSuggestion(
+                user_id=int(user_ids[i]),
+                distance_m=round(float(dist[i]), 1),
+                mood_label=hits.labels[i],
+                display_name=names.get(int(user_ids[i])),
+                lat=float(hits.lats[i]),
+                lng=float(hits.lngs[i]),
+            )
+            for i in page
+        ]
+
+    # Dernière humeur par utilisateur: table user_latest_mood (mise à jour à chaque humeur)
+    latest = models.UserLatestMood
+    active_since = active_cutoff()
+    distance = distance_m_sql(latest, lat, lng)
+    # Rayon de recherche doublé jusqu'à trouver `limit` voisins (ou atteindre radius_m)
+    search_r = min(radius_m, max(NEARBY_INITIAL_RADIUS_M, 2 * after_d))
+    while True:
+        query = (
+            select(latest.user_id, latest.mood_label, latest.lat, latest.lng, models.User.display_name)
+            .join(models.User, models.User.id == latest.user_id)
+            .where(latest.lat.isnot(None), latest.lng.isnot(None))
+            .where(cell_filter(latest, lat, lng, search_r))
+            .where(latest.created_at >= active_since)
+            .where(distance <= search_r)
         )
-        .group_by(models.MoodEvent.user_id)
-        .subquery()
-    )
+        if cursor:
+            # 1 mm de marge (arrondis Python/SQL); le curseur exact est appliqué ci-dessous
+            query = query.where(distance >= after_d - 0.001)
+        rows = (await db.execute(query.order_by(distance, latest.user_id).limit(NEARBY_MAX_CANDIDATES))).all()
+        # Distances exactes (mêmes que l'index) des candidats en une passe
+        dist = haversine_m_array(lat, lng, [r.lat for r in rows], [r.lng for r in rows])
+        user_ids = np.fromiter((r.user_id for r in rows), dtype=np.int64, count=len(rows))
+        keep = np.flatnonzero((dist <= search_r) & _after_cursor(dist, user_ids, after_d, after_id))
+        # Lignes triées par distance: même plafonnées, ce sont les plus proches après le curseur
+        if len(keep) >= limit or search_r >= radius_m or len(rows) >= NEARBY_MAX_CANDIDATES:
+            break
+        search_r = min(radius_m, 2 * search_r)
+
+    return [
+        schemas.MatchSuggestion(
+            user_id=rows[i].user_id,
+            distance_m=round(float(dist[i]), 1),
+            mood_label=rows[i].mood_label,
+            display_name=rows[i].display_name,
+            lat=rows[i].lat,
+            lng=rows[i].lng,
+        )
+        for i in _page(keep, dist, user_ids, limit, response)
+    ]
 
-    # Joindre avec MoodEvent pour obtenir l'enregistrement complet de la dernière humeur
-    q = (
-        db.query(models.MoodEvent, models.User.display_name)
-        .join(sub, and_(models.MoodEvent.user_id == sub.c.u_id, models.MoodEvent.created_at == sub.c.last_dt))
-        .join(models.User, models.User.id == models.MoodEvent.user_id)
-        .filter(models.MoodEvent.lat.isnot(None), models.MoodEvent.lng.isnot(None))
-    )
 
-    # Filtre de proximité approximatif via fenêtre en degrés
-    deg = meters_to_degrees(radius_m)
-    q = q.filter(
-        models.MoodEvent.lat.between(lat - deg, lat + deg),
-        models.MoodEvent.lng.between(lng - deg, lng + deg),
-    )
+def _after_cursor(dist: np.ndarray, user_ids: np.ndarray, after_d: float, after_id: int) -> np.ndarray:
+    return (dist > after_d) | ((dist == after_d) & (user_ids > after_id))
 
-    rows = q.limit(200).all()
 
-    results: list[schemas.MatchSuggestion] = []
-    for ev, display_name in rows:
-        results.append(
-            schemas.MatchSuggestion(
-                user_id=ev.user_id,
-                distance_m=None,  # Optionnel: calculer la distance haversine si nécessaire
-                mood_label=ev.mood_label,
-                display_name=display_name,
-                lat=ev.lat,
-                lng=ev.lng,
-            )
-        )
-    return results
+def _page(keep: np.ndarray, dist: np.ndarray, user_ids: np.ndarray, limit: int, response: Response) -> np.ndarray:
+    """Les `limit` plus proches parmi `keep` (distance puis user_id); X-Next-Cursor si la page est pleine."""
+    page = keep[np.lexsort((user_ids[keep], dist[keep]))][:limit]
+    if len(page) == limit:
+        last = page[-1]
+        response.headers["X-Next-Cursor"] = f"{float(dist[last])!r}:{int(user_ids[last])}"
+    return page
 
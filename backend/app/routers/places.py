@@ -12,12 +12,7 @@ router = APIRouter(prefix="/places", tags=["places"])
 
 @router.get("/suggest", response_model=List[schemas.PlaceSuggestion])
 def suggest_places(db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    last_mood = (
-        db.query(models.MoodEvent)
-        .filter(models.MoodEvent.user_id == user.id)
-        .order_by(models.MoodEvent.created_at.desc())
-        .first()
-    )
+    last_mood = db.get(models.UserLatestMood, user.id)
     if not last_mood or last_mood.lat is None or last_mood.lng is None:
         raise HTTPException(status_code=400, detail="User location/mood required")
 
@@ -0,0 +1,120 @@
+"""
+Vérification de la version du schéma au démarrage.
+
+Au lieu d'exécuter Base.metadata.create_all() dans chaque worker, on lit une
+seule ligne de la table schema_version. Le résultat est mis en cache pour la
+durée de vie du processus.
+
+Incrémenter SCHEMA_VERSION à chaque migration (database/migration_*.sql) et
+terminer la migration par la mise à jour de schema_version.
+
+create_all() ne crée que les tables absentes (jamais de colonne ni d'index sur
+une table existante): une base en retard doit passer par ses migrations.
+"""
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+
+from .config import settings
+from .db import Base, get_engine
+from . import models  # noqa: F401  (enregistre les tables dans Base.metadata)
+
+
+SCHEMA_VERSION = 9
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "database"
+_MIGRATION_VERSION = re.compile(r"INSERT INTO schema_version \(id, version, updated_at\) VALUES \(1, (\d+)")
+
+_verified: dict | None = None
+_lock = threading.Lock()
+
+
+def read_schema_version(conn) -> int | None:
+    """Version enregistrée en base, ou None si la table n'existe pas."""
+    try:
+        row = conn.execute(text("SELECT version FROM schema_version WHERE id = 1")).first()
+    except ProgrammingError:
+        conn.rollback()
+        return None
+    return row[0] if row else None
+
+
+def stamp_schema_version(conn, version: int = SCHEMA_VERSION):
+    conn.execute(
+        text(
+            "INSERT INTO schema_version (id, version, updated_at) VALUES (1, :version, :now) "
+            "ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version, updated_at = EXCLUDED.updated_at"
+        ),
+        {"version": version, "now": datetime.utcnow()},
+    )
+
+
+def pending_migrations(found: int | None) -> List[str]:
+    """Fichiers database/migration_*.sql à appliquer après la version `found`, dans l'ordre."""
+    pending = []
+    for path in MIGRATIONS_DIR.glob("migration_*.sql"):
+        match = _MIGRATION_VERSION.search(path.read_text(encoding="utf-8"))
+        if match and int(match.group(1)) > (found or 0):
+            pending.append((int(match.group(1)), path.name))
+    return [name for _, name in sorted(pending)]
+
+
+def init_schema():
+    """Crée les tables manquantes et enregistre la version courante."""
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        stamp_schema_version(conn)
+
+
+def verify_schema(force: bool = False) -> dict:
+    """
+    Compare la version du schéma en base avec SCHEMA_VERSION.
+
+    Retourne {"expected", "found", "status"} où status vaut ok, missing,
+    outdated ou unavailable (plus "migrations" à appliquer si outdated). Un
+    résultat "ok" est mis en cache. DB_AUTO_CREATE_SCHEMA ne crée qu'une base
+    vide (missing): create_all n'ajoute pas les colonnes d'une base outdated.
+    """
+    global _verified
+    if _verified is not None and not force:
+        return _verified
+    with _lock:
+        if _verified is not None and not force:
+            return _verified
+        result = {"expected": SCHEMA_VERSION, "found": None, "status": "unavailable"}
+        try:
+            with get_engine().connect() as conn:
+                found = read_schema_version(conn)
+            result["found"] = found
+            if found is None:
+                result["status"] = "missing"
+            elif found < SCHEMA_VERSION:
+                result.update(status="outdated", migrations=pending_migrations(found))
+            else:
+                result["status"] = "ok"
+
+            if result["status"] == "missing" and settings.db_auto_create_schema:
+                init_schema()
+                result.update(found=SCHEMA_VERSION, status="ok")
+                print("✅ Tables Supabase vérifiées/créées avec succès")
+        except Exception as e:
+            print(f"⚠️  AVERTISSEMENT: Impossible de vérifier le schéma dans Supabase: {e}")
+            return result
+
+        if result["status"] == "ok":
+            _verified = result
+        else:
+            print(f"⚠️  AVERTISSEMENT: schéma {result['status']} (attendu v{SCHEMA_VERSION}, trouvé {result['found']})")
+            if result["status"] == "outdated":
+                print("   💡 Appliquez dans l'ordre via Supabase Dashboard > SQL Editor:")
+                for name in result["migrations"]:
+                    print(f"      database/{name}")
+            else:
+                print("   💡 Exécutez: python database/init_schema.py (nouvelle base)")
+        return result
@@ -67,6 +67,7 @@ class MoodPublic(BaseModel):
     text: Optional[str]
     mood_label: str
     mood_score: float
+    label_source: str = "rules"
     lat: Optional[float]
     lng: Optional[float]
     created_at: datetime
@@ -119,6 +120,22 @@ class ConversationPublic(BaseModel):
         from_attributes = True
 
 
+class InboxConversation(BaseModel):
+    id: int
+    other_user_id: int
+    other_display_name: Optional[str] = None
+    last_message_id: int
+    last_message_text: str
+    last_message_sender_id: int
+    last_message_at: datetime
+    unread_count: int
+
+
+class ConversationRead(BaseModel):
+    conversation_id: int
+    marked_read: int
+
+
 class MessageCreate(BaseModel):
     conversation_id: Optional[int] = None
     recipient_id: int
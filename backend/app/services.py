@@ -1,51 +1,246 @@
-from typing import Tuple
+import json
+import threading
+import time
+from typing import List, Optional, Tuple
 from .config import settings
+from .circuit_breaker import CircuitBreaker
+from . import mood_cache
+from .mood_model import predict_confident
+from .mood_rules import analyze_moods, get_rule_engine  # noqa: F401  (analyze_moods: API par lots)
 
 try:
-    from openai import OpenAI  # type: ignore
-    _openai_client = OpenAI(api_key=settings.openai_api_key) if settings.openai_api_key else None
+    from openai import OpenAI, APITimeoutError  # type: ignore
+    _openai_client = (
+        OpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url,
+            timeout=settings.openai_timeout_seconds,
+            max_retries=settings.openai_max_retries,
+        )
+        if settings.openai_api_key
+        else None
+    )
 except Exception:
     _openai_client = None
+    APITimeoutError = TimeoutError
+
+MOOD_LABELS = ["joy", "calm", "energy", "fatigue", "stress", "lonely", "social", "reflective"]
+
+_llm_lock = threading.Lock()
+_llm_stats = {
+    "calls": 0, "batched_calls": 0, "items": 0, "malformed_items": 0, "failed_calls": 0,
+    "timeouts": 0, "short_circuited": 0, "rejected_busy": 0,
+}
+
+# Protection de l'API: au plus N appels simultanés, délai max par appel (attente d'un
+# créneau comprise) et disjoncteur qui bascule directement sur les règles
+_in_flight = threading.BoundedSemaphore(max(1, settings.openai_max_in_flight))
+_in_flight_count = 0
+_breaker = CircuitBreaker(
+    "openai",
+    failure_threshold=settings.openai_breaker_failures,
+    reset_seconds=settings.openai_breaker_reset_seconds,
+    slow_call_seconds=settings.openai_breaker_slow_seconds,
+)
+
+
+class LLMUnavailable(Exception):
+    """Appel non tenté: disjoncteur ouvert ou trop d'appels en cours."""
 
 
 def analyze_mood(text: str | None) -> Tuple[str, float]:
-    if not text:
-        return "calm", 0.5
-    t = text.lower()
-    if any(k in t for k in ["seul", "triste", "fatigu", "épuis"]):
-        return "fatigue", 0.3
-    if any(k in t for k in ["stress", "angoiss", "tendu"]):
-        return "stress", 0.2
-    if any(k in t for k in ["inspir", "bouger", "march", "sortir", "énerg"]):
-        return "energy", 0.8
-    if any(k in t for k in ["heureux", "joyeux", "content", "bien"]):
-        return "joy", 0.9
-    return "calm", 0.6
+    """Classification par règles (mots-clés pondérés, voir app/mood_rules.py)."""
+    return get_rule_engine().classify(text)
 
 
-def analyze_mood_smart(text: str | None) -> Tuple[str, float]:
-    if not text:
-        return analyze_mood(text)
-    if not _openai_client:
-        return analyze_mood(text)
-    prompt = (
-        "Tu es un classificateur d'émotions. À partir du texte utilisateur, réponds au format JSON {label: string, score: number} "
-        "où label ∈ [joy, calm, energy, fatigue, stress, lonely, social, reflective] et score ∈ [0,1]. Texte: "
-        f"{text}"
-    )
+def classify_local(text: str | None) -> Tuple[str, float, str]:
+    """
+    Classification sans appel réseau (< 1 ms): modèle local s'il est confiant
+    (source "model"), sinon règles (source "rules").
+    """
+    predicted = predict_confident(text)
+    if predicted is not None:
+        return (*predicted, "model")
+    return (*analyze_mood(text), "rules")
+
+
+def _count_llm(key: str, n: int = 1):
+    with _llm_lock:
+        _llm_stats[key] += n
+
+
+def _complete(prompt: str) -> str:
+    global _in_flight_count
+    deadline = time.monotonic() + settings.openai_timeout_seconds
+    # Disjoncteur avant l'attente d'un créneau: ouvert, l'appel échoue tout de suite
+    permit = _breaker.allow()
+    if permit is None:
+        _count_llm("short_circuited")
+        raise LLMUnavailable("disjoncteur ouvert")
+    probe = permit == "probe"
+    if not _in_flight.acquire(timeout=settings.openai_slot_wait_seconds):
+        _breaker.cancel(probe)
+        _count_llm("rejected_busy")
+        raise LLMUnavailable("trop d'appels en cours")
+    try:
+        # Ouvert pendant l'attente (échecs des appels en cours): inutile de tenter
+        if _breaker.state == "open":
+            _breaker.cancel(probe)
+            _count_llm("short_circuited")
+            raise LLMUnavailable("disjoncteur ouvert")
+        with _llm_lock:
+            _in_flight_count += 1
+        started = time.monotonic()
+        error = True
+        try:
+            resp = _openai_client.chat.completions.create(
+                model=settings.openai_emotion_model,
+                messages=[{"role": "system", "content": "Classificateur d'émotions"}, {"role": "user", "content": prompt}],
+                temperature=0.1,
+                timeout=max(0.1, deadline - started),
+            )
+            error = False
+        except APITimeoutError:
+            _count_llm("timeouts")
+            raise
+        finally:
+            _breaker.record(time.monotonic() - started, error, probe)
+            with _llm_lock:
+                _in_flight_count -= 1
+        return resp.choices[0].message.content or ""
+    finally:
+        _in_flight.release()
+
+
+def _parse_result(data) -> Optional[Tuple[str, float]]:
+    """Valide un objet {label, score}; None s'il est mal formé."""
+    if not isinstance(data, dict):
+        return None
+    label = str(data.get("label", ""))
+    if label not in MOOD_LABELS:
+        return None
     try:
-        resp = _openai_client.chat.completions.create(
-            model=settings.openai_emotion_model,
-            messages=[{"role": "system", "content": "Classificateur d'émotions"}, {"role": "user", "content": prompt}],
-            temperature=0.1,
-        )
-        content = resp.choices[0].message.content or ""
-        import json
-        data = json.loads(content)
-        label = str(data.get("label", "calm"))
         score = float(data.get("score", 0.6))
-        return label, score
+    except (TypeError, ValueError):
+        return None
+    return label, min(1.0, max(0.0, score))
+
+
+def _classify_uncached(texts: List[str]) -> List[Optional[Tuple[str, float]]]:
+    """
+    Un seul appel au LLM pour tous les textes. Un texte seul garde le prompt
+    d'origine; plusieurs textes sont envoyés numérotés et la réponse attendue
+    est un tableau JSON dans le même ordre. None pour chaque élément absent ou
+    mal formé.
+    """
+    labels = ", ".join(MOOD_LABELS)
+    if len(texts) == 1:
+        prompt = (
+            "Tu es un classificateur d'émotions. À partir du texte utilisateur, réponds au format JSON {label: string, score: number} "
+            f"où label ∈ [{labels}] et score ∈ [0,1]. Texte: "
+            f"{texts[0]}"
+        )
+    else:
+        numbered = "\n".join(f"{i}. {json.dumps(t, ensure_ascii=False)}" for i, t in enumerate(texts, 1))
+        prompt = (
+            f"Tu es un classificateur d'émotions. Pour chacun des {len(texts)} textes numérotés ci-dessous, réponds uniquement "
+            "par un tableau JSON de la même longueur, dans le même ordre, dont chaque élément est {label: string, score: number} "
+            f"où label ∈ [{labels}] et score ∈ [0,1]. Textes:\n"
+            f"{numbered}"
+        )
+    _count_llm("calls")
+    if len(texts) > 1:
+        _count_llm("batched_calls")
+    _count_llm("items", len(texts))
+    try:
+        data = json.loads(_complete(prompt))
+    except LLMUnavailable:
+        return [None] * len(texts)
     except Exception:
-        return analyze_mood(text)
+        _count_llm("failed_calls")
+        return [None] * len(texts)
+
+    if len(texts) == 1:
+        items = [data]
+    elif isinstance(data, dict):
+        # Certains modèles enveloppent le tableau: {"results": [...]}
+        items = next((v for v in data.values() if isinstance(v, list)), [])
+    else:
+        items = data if isinstance(data, list) else []
+    results = [_parse_result(items[i]) if i < len(items) else None for i in range(len(texts))]
+    _count_llm("malformed_items", sum(1 for r in results if r is None))
+    return results
+
+
+def classify_moods(texts: List[Optional[str]]) -> List[Tuple[str, float, str]]:
+    """
+    Classe plusieurs textes avec au plus un appel au LLM.
+
+    Les textes déjà en cache ou classés avec confiance par le modèle local
+    (source "model") ne sont pas envoyés au LLM, et les doublons (après
+    normalisation) ne sont envoyés qu'une fois. Chaque élément est
+    (label, score, source) avec source "llm"/"model", ou "rules" quand le
+    résultat manque ou est mal formé (repli sur analyze_mood pour cet élément).
+    """
+    results: List[Optional[Tuple[str, float, str]]] = [None] * len(texts)
+    pending: dict[str, List[int]] = {}
+    for i, text in enumerate(texts):
+        if not text:
+            results[i] = (*analyze_mood(text), "rules")
+            continue
+        if _openai_client:
+            cached = mood_cache.get_cached(text)
+            if cached is not None:
+                results[i] = (*cached, "llm")
+                continue
+        predicted = predict_confident(text)
+        if predicted is not None:
+            results[i] = (*predicted, "model")
+            continue
+        if not _openai_client:
+            results[i] = (*analyze_mood(text), "rules")
+            continue
+        pending.setdefault(mood_cache.cache_key(text), []).append(i)
+
+    if pending:
+        unique = [texts[indices[0]] for indices in pending.values()]
+        for indices, text, result in zip(pending.values(), unique, _classify_uncached(unique)):
+            if result is None:
+                out = (*analyze_mood(text), "rules")
+            else:
+                mood_cache.store(text, *result)
+                out = (*result, "llm")
+            for i in indices:
+                results[i] = out
+    return results
 
 
+def classify_mood(text: str | None) -> Tuple[str, float, str]:
+    """
+    Classification par le LLM si disponible.
+
+    Retourne (label, score, source) où source vaut "llm" (ou "model" si le
+    modèle local est confiant), ou "rules" si l'appel a échoué ou n'est pas
+    possible (repli sur analyze_mood).
+    """
+    return classify_moods([text])[0]
+
+
+def llm_available() -> bool:
+    return _openai_client is not None
+
+
+def llm_stats() -> dict:
+    with _llm_lock:
+        stats = dict(_llm_stats)
+        stats["in_flight"] = _in_flight_count
+    stats["items_per_call"] = round(stats["items"] / stats["calls"], 2) if stats["calls"] else 0.0
+    stats["max_in_flight"] = settings.openai_max_in_flight
+    stats["timeout_seconds"] = settings.openai_timeout_seconds
+    stats["breaker"] = _breaker.stats()
+    return stats
+
+
+def analyze_mood_smart(text: str | None) -> Tuple[str, float]:
+    label, score, _ = classify_mood(text)
+    return label, score
@@ -0,0 +1,139 @@
+"""Threads de fond consommant une file bornée par lots (emails, classification...)."""
+import heapq
+import itertools
+import queue
+import threading
+import time
+import traceback
+from typing import Any
+
+
+class BackgroundWorker:
+    """
+    Consomme une file bornée dans un thread dédié.
+
+    Les éléments sont regroupés par lots d'au plus `batch_size`, en attendant
+    au plus `batch_wait` secondes après le premier élément. Les sous-classes
+    implémentent process_batch() et peuvent replanifier un élément avec
+    retry_later().
+    """
+
+    def __init__(self, name: str, max_queue: int, batch_size: int = 1, batch_wait: float = 0.0):
+        self.name = name
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._delayed: list[tuple[float, int, Any]] = []
+        self._delayed_lock = threading.Lock()
+        self._seq = itertools.count()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._stats_lock = threading.Lock()
+        self._stats = {"submitted": 0, "dropped": 0, "processed": 0, "batches": 0, "errors": 0, "retries": 0}
+
+    # --- API ---
+    def submit(self, item: Any) -> bool:
+        """Ajoute un élément sans bloquer. False si la file est pleine."""
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("submitted")
+        return True
+
+    def retry_later(self, item: Any, delay: float):
+        with self._delayed_lock:
+            heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._seq), item))
+        self._count("retries")
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Arrête le thread après avoir traité les éléments déjà en file (dans la limite du timeout)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() + len(self._delayed)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return dict(self._stats, queued=self._queue.qsize(), delayed=len(self._delayed), running=self.running)
+
+    # --- À implémenter ---
+    def process_batch(self, items: list) -> None:
+        raise NotImplementedError
+
+    def on_idle(self) -> None:
+        """Appelé quand la file est vide (ex: fermer une connexion inactive)."""
+
+    def on_stop(self) -> None:
+        """Appelé à la fin du thread."""
+
+    # --- Interne ---
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def _pop_due(self, limit: int) -> list:
+        now = time.monotonic()
+        due = []
+        with self._delayed_lock:
+            while self._delayed and self._delayed[0][0] <= now and len(due) < limit:
+                due.append(heapq.heappop(self._delayed)[2])
+        return due
+
+    def _next_timeout(self) -> float:
+        with self._delayed_lock:
+            if not self._delayed:
+                return 1.0
+            return min(1.0, max(0.0, self._delayed[0][0] - time.monotonic()))
+
+    def _collect_batch(self) -> list:
+        batch = self._pop_due(self.batch_size)
+        if not batch:
+            try:
+                batch.append(self._queue.get(timeout=self._next_timeout()))
+            except queue.Empty:
+                return []
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        try:
+            while not (self._stop.is_set() and self._queue.empty()):
+                batch = self._collect_batch()
+                if not batch:
+                    self.on_idle()
+                    continue
+                try:
+                    self.process_batch(batch)
+                    self._count("processed", len(batch))
+                except Exception:
+                    self._count("errors")
+                    print(f"❌ Erreur dans le worker {self.name}:")
+                    traceback.print_exc()
+                self._count("batches")
+        finally:
+            self.on_stop()
@@ -0,0 +1,181 @@
+"""
+Latence de remise des messages de chat en direct (app/chat_push.py, app/realtime.py).
+
+Usage:
+    python benchmarks/bench_chat_fanout.py [--users 1000] [--messages 5000] [--workers 4]
+                                           [--redis-url redis://localhost:6379/0]
+
+Aucune requête en base (DATABASE_URL doit seulement être défini pour charger
+la configuration). Chaque "worker" est un ChatHub avec son propre broker dans
+ce processus; les utilisateurs connectés sont répartis entre eux et chaque
+message est publié par un worker au hasard vers un destinataire au hasard.
+
+Sans --redis-url, le broker Redis parle à un substitut local minimal du
+protocole (SUBSCRIBE / UNSUBSCRIBE / PUBLISH / PING) démarré par le script:
+utile pour vérifier la remise entre workers sans serveur Redis.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app import models  # noqa: E402
+from app.chat_push import ChatHub  # noqa: E402
+from app.realtime import InProcessBroker, RedisBroker  # noqa: E402
+
+
+class PubSubStandIn:
+    """Serveur minimal parlant RESP2, limité au pub/sub (pas de persistance, pas de motifs)."""
+
+    def __init__(self):
+        self._channels = {}
+        self._server = None
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._client, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        return f"redis://127.0.0.1:{port}/0"
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    @staticmethod
+    def _bulk(value: bytes) -> bytes:
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> list:
+        header = await reader.readline()
+        if not header:
+            raise ConnectionError
+        args = []
+        for _ in range(int(header[1:])):
+            size = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscribed = set()
+        try:
+            while True:
+                args = await self._read_command(reader)
+                command = args[0].upper()
+                if command in (b"SUBSCRIBE", b"UNSUBSCRIBE"):
+                    channels = args[1:] or sorted(subscribed)
+                    for channel in channels:
+                        if command == b"SUBSCRIBE":
+                            subscribed.add(channel)
+                            self._channels.setdefault(channel, set()).add(writer)
+                        else:
+                            subscribed.discard(channel)
+                            self._channels.get(channel, set()).discard(writer)
+                        writer.write(b"*3\r\n" + self._bulk(command.lower()) + self._bulk(channel) + b":%d\r\n" % len(subscribed))
+                elif command == b"PUBLISH":
+                    targets = self._channels.get(args[1], ())
+                    frame = b"*3\r\n" + self._bulk(b"message") + self._bulk(args[1]) + self._bulk(args[2])
+                    for target in targets:
+                        target.write(frame)
+                    writer.write(b":%d\r\n" % len(targets))
+                elif command == b"PING":
+                    writer.write(b"*2\r\n$4\r\npong\r\n$0\r\n\r\n" if subscribed else b"+PONG\r\n")
+                else:
+                    # CLIENT SETINFO, etc.: refusé, ignoré par redis-py
+                    writer.write(b"-ERR unknown command\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in subscribed:
+                self._channels.get(channel, set()).discard(writer)
+            writer.close()
+
+
+async def consume(hub: ChatHub, conn):
+    while True:
+        hub.record_sent(await conn.queue.get())
+
+
+async def run(kind: str, url: str, workers: int, users: int, messages: int) -> dict:
+    brokers = [InProcessBroker()] if kind == "memory" else [RedisBroker(url, "bench:") for _ in range(workers)]
+    hubs = [ChatHub(1000, broker) for broker in brokers]
+    for broker in brokers:
+        await broker.start()
+    consumers, conns = [], []
+    try:
+        for user_id in range(1, users + 1):
+            hub = hubs[user_id % len(hubs)]
+            conn = await hub.connect(user_id)
+            conns.append((hub, conn))
+            consumers.append(asyncio.create_task(consume(hub, conn)))
+
+        rng = random.Random(42)
+        started = time.perf_counter()
+        for i in range(messages):
+            sender, recipient = rng.sample(range(1, users + 1), 2)
+            msg = models.Message(
+                id=i + 1, conversation_id=1, sender_id=sender, recipient_id=recipient,
+                text="Salut !", created_at=datetime.utcnow(),
+            )
+            await rng.choice(hubs).publish_message(msg)
+            # Laisse les connexions écrire (comme entre deux requêtes POST /chat/send)
+            await asyncio.sleep(0)
+        while sum(h.stats()["delivered"] + h.stats()["dropped"] for h in hubs) < messages:
+            if time.perf_counter() - started > 60:
+                break
+            await asyncio.sleep(0.005)
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for h in hubs for latency in h._latencies)
+        return {
+            "delivered": sum(h.stats()["delivered"] for h in hubs),
+            "rate": messages / elapsed,
+            "avg": sum(latencies) / len(latencies) if latencies else 0.0,
+            "p95": latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+            "max": latencies[-1] if latencies else 0.0,
+        }
+    finally:
+        for task in consumers:
+            task.cancel()
+        for hub, conn in conns:
+            await hub.disconnect(conn)
+        for broker in brokers:
+            await broker.stop()
+
+
+async def main_async(args):
+    stand_in = None
+    url = args.redis_url
+    if url is None:
+        stand_in = PubSubStandIn()
+        url = await stand_in.start()
+    print(f"{args.users} utilisateurs connectés, {args.messages} messages (fenêtre de latence: 1000 derniers)")
+    print(f"{'broker':<20} {'workers':>7} {'remis':>7} {'msg/s':>9} {'moy ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    try:
+        for kind, workers in (("memory", 1), ("redis", 1), ("redis", args.workers)):
+            result = await run(kind, url, workers, args.users, args.messages)
+            label = kind if kind == "memory" else ("redis (substitut)" if stand_in else "redis")
+            print(
+                f"{label:<20} {workers:>7} {result['delivered']:>7} {result['rate']:9.0f} "
+                f"{result['avg']:8.3f} {result['p95']:8.3f} {result['max']:8.3f}"
+            )
+    finally:
+        if stand_in is not None:
+            await stand_in.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--redis-url", default=None, help="Serveur Redis réel (sinon substitut local)")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
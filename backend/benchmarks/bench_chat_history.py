@@ -0,0 +1,133 @@
+"""
+Latence de lecture de l'historique d'une conversation (GET /chat/messages) selon sa longueur.
+
+Usage:
+    python benchmarks/bench_chat_history.py [tailles...] [--queries 200] [--conversations 20]
+    (tailles par défaut: 1000 10000 100000 messages par conversation)
+
+Nécessite DATABASE_URL (PostgreSQL). Les messages synthétiques sont écrits
+dans un schéma séparé, bench_chat, recréé pour chaque taille puis supprimé:
+les tables de l'application ne sont pas touchées.
+
+Compare:
+  - l'ancienne requête: les 200 premiers messages (les plus anciens);
+  - l'historique complet, seul moyen d'afficher les derniers messages avant;
+  - message_page_query(): dernière page, page au milieu (before_id) et
+    nouveaux messages depuis X (after_id, 5 messages).
+"""
+import argparse
+import io
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np  # noqa: E402
+from sqlalchemy import select, text  # noqa: E402
+
+from app import models  # noqa: E402
+from app.db import get_engine  # noqa: E402
+from app.routers.chat import message_page_query  # noqa: E402
+
+
+SCHEMA = "bench_chat"
+PAGE = 50
+
+
+def seed(engine, conversations: int, per_conversation: int) -> list:
+    """Crée le schéma et les données; retourne les ids des messages de chaque conversation (ordre chronologique)."""
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        conn.execute(text(f"CREATE TABLE {SCHEMA}.messages (LIKE public.messages INCLUDING ALL)"))
+        # Même index que le modèle, que la migration ait été appliquée ou non sur public
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS idx_bench_messages_conversation_created_id "
+            f"ON {SCHEMA}.messages(conversation_id, created_at, id)"
+        ))
+
+    # Conversations entrelacées dans le temps, comme en production
+    start = datetime.utcnow() - timedelta(days=365)
+    total = conversations * per_conversation
+    raw = engine.raw_connection()
+    try:
+        lines = (
+            f"{i + 1}\t{i % conversations + 1}\t1\t2\tMessage {i + 1}\t{(start + timedelta(seconds=i * 5)).isoformat()}\n"
+            for i in range(total)
+        )
+        with raw.cursor() as cur:
+            cur.copy_expert(
+                f"COPY {SCHEMA}.messages (id, conversation_id, sender_id, recipient_id, text, created_at) FROM STDIN",
+                io.StringIO("".join(lines)),
+            )
+            cur.execute(f"ANALYZE {SCHEMA}.messages")
+        raw.commit()
+    finally:
+        raw.close()
+    return [list(range(c + 1, total + 1, conversations)) for c in range(conversations)]
+
+
+def legacy_query(conversation_id: int):
+    """Requête d'origine: ordre chronologique, 200 lignes."""
+    return (
+        select(models.Message)
+        .where(models.Message.conversation_id == conversation_id)
+        .order_by(models.Message.created_at.asc())
+        .limit(200)
+    )
+
+
+def full_history(conversation_id: int):
+    return select(models.Message).where(models.Message.conversation_id == conversation_id).order_by(models.Message.created_at.asc())
+
+
+def run(conn, build, ids: list, queries: int, rng: np.random.Generator) -> tuple:
+    latencies, rows = [], []
+    for _ in range(queries):
+        c = int(rng.integers(len(ids)))
+        started = time.perf_counter()
+        found = conn.execute(build(c + 1, ids[c])).all()
+        latencies.append(1000 * (time.perf_counter() - started))
+        rows.append(len(found))
+    return np.percentile(latencies, 50), np.percentile(latencies, 95), float(np.mean(rows))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("sizes", nargs="*", type=int, default=[1_000, 10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--conversations", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    rng = np.random.default_rng(42)
+    print(f"{args.conversations} conversations, {args.queries} requêtes par mesure, pages de {PAGE}")
+    print(f"{'messages':>10} {'requête':<22} {'p50 ms':>8} {'p95 ms':>8} {'lignes':>8}")
+    try:
+        for size in args.sizes:
+            started = time.perf_counter()
+            ids = seed(engine, args.conversations, size)
+            print(f"{size:>10,} (données générées en {time.perf_counter() - started:.1f}s)")
+            queries = [
+                ("ancienne (200 1ers)", lambda cid, m: legacy_query(cid)),
+                ("dernière page", lambda cid, m: message_page_query(cid, None, None, PAGE)),
+                ("before_id (milieu)", lambda cid, m: message_page_query(cid, m[len(m) // 2], None, PAGE)),
+                ("after_id (depuis X)", lambda cid, m: message_page_query(cid, None, m[-6], PAGE)),
+            ]
+            if size <= 10_000:
+                queries.insert(1, ("historique complet", lambda cid, m: full_history(cid)))
+            with engine.connect() as conn:
+                conn.execute(text(f"SET search_path TO {SCHEMA}"))
+                for name, build in queries:
+                    p50, p95, rows = run(conn, build, ids, args.queries, rng)
+                    print(f"{size:>10,} {name:<22} {p50:8.2f} {p95:8.2f} {rows:8.0f}")
+                conn.execute(text("RESET search_path"))
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
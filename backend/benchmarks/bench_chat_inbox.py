@@ -0,0 +1,160 @@
+"""
+Latence de la boîte de réception (GET /chat/inbox) selon le nombre de conversations.
+
+Usage:
+    python benchmarks/bench_chat_inbox.py [conversations par utilisateur...] [--queries 100]
+    (par défaut: 20 200 2000 conversations pour les utilisateurs mesurés)
+
+Nécessite DATABASE_URL (PostgreSQL). Les données synthétiques (100 000
+conversations de fond, 5 messages chacune, plus les conversations des
+utilisateurs mesurés) sont écrites dans un schéma séparé, bench_inbox, recréé
+pour chaque taille puis supprimé: les tables de l'application ne sont pas
+touchées.
+
+Compare, pour une page de 20 conversations:
+  - l'ancien parcours du client: GET /chat/conversations (toutes, par date de
+    création), puis une requête par conversation pour le dernier message et
+    une pour les non lus (N+1, hors aller-retour HTTP);
+  - inbox_query(): une requête.
+"""
+import argparse
+import io
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np  # noqa: E402
+from sqlalchemy import desc, func, or_, select, text  # noqa: E402
+
+from app import models  # noqa: E402
+from app.db import get_engine  # noqa: E402
+from app.routers.chat import inbox_query  # noqa: E402
+
+
+SCHEMA = "bench_inbox"
+USERS = 20_000
+BACKGROUND_CONVERSATIONS = 100_000
+MESSAGES_PER_CONVERSATION = 5
+MEASURED_USERS = 20
+PAGE = 20
+
+
+def _copy(raw, table: str, columns: str, lines):
+    with raw.cursor() as cur:
+        cur.copy_expert(f"COPY {SCHEMA}.{table} ({columns}) FROM STDIN", io.StringIO("".join(lines)))
+
+
+def seed(engine, per_user: int, rng: np.random.Generator) -> list:
+    """Crée le schéma et les données; retourne les ids des utilisateurs mesurés."""
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        for table in ("users", "conversations", "messages"):
+            conn.execute(text(f"CREATE TABLE {SCHEMA}.{table} (LIKE public.{table} INCLUDING ALL)"))
+
+    # Paires (a < b) uniques: conversations de fond puis celles des utilisateurs mesurés (ids 1..20)
+    pairs = set()
+    while len(pairs) < BACKGROUND_CONVERSATIONS:
+        a, b = sorted(int(x) for x in rng.choice(np.arange(MEASURED_USERS + 1, USERS + 1), size=2, replace=False))
+        pairs.add((a, b))
+    measured = list(range(1, MEASURED_USERS + 1))
+    for user_id in measured:
+        for other in rng.choice(np.arange(MEASURED_USERS + 1, USERS + 1), size=per_user, replace=False):
+            pairs.add((user_id, int(other)))
+    pairs = list(pairs)
+
+    now = datetime.utcnow()
+    conversations, messages = [], []
+    message_id = 0
+    for conv_id, (a, b) in enumerate(pairs, start=1):
+        created = now - timedelta(seconds=int(rng.integers(90 * 24 * 3600)))
+        last = None
+        for k in range(MESSAGES_PER_CONVERSATION):
+            message_id += 1
+            sender, recipient = (a, b) if k % 2 == 0 else (b, a)
+            at = created + timedelta(minutes=k)
+            read_at = "\\N" if k >= MESSAGES_PER_CONVERSATION - 2 else at.isoformat()
+            messages.append(f"{message_id}\t{conv_id}\t{sender}\t{recipient}\tMessage {message_id}\t{at.isoformat()}\t{read_at}\n")
+            last = (message_id, at)
+        conversations.append(f"{conv_id}\t{a}\t{b}\t{created.isoformat()}\t{last[0]}\t{last[1].isoformat()}\n")
+
+    raw = engine.raw_connection()
+    try:
+        _copy(raw, "users", "id, email, hashed_password, display_name, email_verified",
+              (f"{i}\tbench{i}@example.com\tx\tBench {i}\ttrue\n" for i in range(1, USERS + 1)))
+        _copy(raw, "conversations", "id, user_one_id, user_two_id, created_at, last_message_id, last_message_at", conversations)
+        _copy(raw, "messages", "id, conversation_id, sender_id, recipient_id, text, created_at, read_at", messages)
+        with raw.cursor() as cur:
+            for table in ("users", "conversations", "messages"):
+                cur.execute(f"ANALYZE {SCHEMA}.{table}")
+        raw.commit()
+    finally:
+        raw.close()
+    return measured
+
+
+def legacy_inbox(conn, user_id: int) -> list:
+    """Ancien parcours: liste des conversations puis deux requêtes par conversation affichée."""
+    conv = models.Conversation
+    rows = conn.execute(
+        select(conv).where(or_(conv.user_one_id == user_id, conv.user_two_id == user_id)).order_by(desc(conv.created_at))
+    ).all()
+    page = []
+    for row in rows[:PAGE]:
+        last = conn.execute(
+            select(models.Message).where(models.Message.conversation_id == row.id).order_by(models.Message.created_at.desc()).limit(1)
+        ).first()
+        unread = conn.execute(
+            select(func.count()).where(
+                models.Message.conversation_id == row.id,
+                models.Message.recipient_id == user_id,
+                models.Message.read_at.is_(None),
+            )
+        ).scalar()
+        page.append((row.id, last, unread))
+    return page
+
+
+def run(conn, fetch, users: list, queries: int) -> tuple:
+    latencies = []
+    for i in range(queries):
+        started = time.perf_counter()
+        fetch(conn, users[i % len(users)])
+        latencies.append(1000 * (time.perf_counter() - started))
+    return np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("sizes", nargs="*", type=int, default=[20, 200, 2000])
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    rng = np.random.default_rng(42)
+    print(f"{BACKGROUND_CONVERSATIONS:,} conversations de fond, pages de {PAGE}, {args.queries} requêtes par mesure")
+    print(f"{'conv./util.':>11} {'requête':<22} {'p50 ms':>8} {'p95 ms':>8}")
+    try:
+        for size in args.sizes:
+            started = time.perf_counter()
+            users = seed(engine, size, rng)
+            print(f"{size:>11,} (données générées en {time.perf_counter() - started:.1f}s)")
+            with engine.connect() as conn:
+                conn.execute(text(f"SET search_path TO {SCHEMA}"))
+                for name, fetch in (
+                    ("ancienne (N+1)", legacy_inbox),
+                    ("inbox_query", lambda c, uid: c.execute(inbox_query(uid, PAGE)).all()),
+                ):
+                    p50, p95 = run(conn, fetch, users, args.queries)
+                    print(f"{size:>11,} {name:<22} {p50:8.2f} {p95:8.2f}")
+                conn.execute(text("RESET search_path"))
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
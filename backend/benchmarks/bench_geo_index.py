@@ -0,0 +1,99 @@
+"""
+Latence des recherches dans l'index géographique partagé (app/geo_index.py).
+
+Usage:
+    python benchmarks/bench_geo_index.py [tailles...] [--queries 500] [--radius 1500]
+    (tailles par défaut: 10000 100000 200000 utilisateurs actifs)
+
+Aucune requête en base (DATABASE_URL doit seulement être défini pour charger
+la configuration): les utilisateurs sont générés autour de quelques villes et
+chargés dans un segment temporaire, supprimé à la fin. À comparer avec
+benchmarks/bench_match_candidates.py (même répartition, requête SQL).
+
+Compare le parcours des seaux de la grille au balayage vectorisé de tout le
+tableau (ce que fait l'index quand les seaux couvrent trop de lignes).
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np  # noqa: E402
+from multiprocessing import shared_memory  # noqa: E402
+
+from app.geo_index import SharedGeoIndex  # noqa: E402
+
+
+NAME = "humanlink_geo_bench"
+LABELS = ["joy", "calm", "energy", "fatigue", "stress", "social", "reflective", "lonely"]
+CITIES = [
+    (48.8566, 2.3522), (45.7640, 4.8357), (43.2965, 5.3698), (43.6047, 1.4442),
+    (47.2184, -1.5536), (50.6292, 3.0573), (44.8378, -0.5792), (48.5734, 7.7521),
+]
+
+
+def snapshot(n: int, rng: np.random.Generator) -> dict:
+    home = np.asarray(CITIES)[rng.integers(len(CITIES), size=n)]
+    lat = home[:, 0] + rng.normal(0, 0.045, n)
+    lng = home[:, 1] + rng.normal(0, 0.065, n)
+    spread = rng.random(n) < 0.2
+    lat[spread] = rng.uniform(43.0, 50.0, spread.sum())
+    lng[spread] = rng.uniform(-1.5, 7.5, spread.sum())
+    now = time.time()
+    return {
+        "user_id": np.arange(1, n + 1, dtype=np.int64),
+        "mood_event_id": np.arange(1, n + 1, dtype=np.int64),
+        "lat": lat,
+        "lng": lng,
+        "created_at": now - rng.uniform(0, 12 * 3600, n),
+        "mood_score": rng.random(n).astype(np.float32),
+        "label": rng.integers(len(LABELS), size=n).astype(np.int16),
+    }
+
+
+def measure(fn, points) -> tuple:
+    latencies, found = [], []
+    for lat, lng in points:
+        started = time.perf_counter()
+        hits = fn(lat, lng)
+        latencies.append(1000 * (time.perf_counter() - started))
+        found.append(len(hits.user_ids))
+    return np.percentile(latencies, 50), np.percentile(latencies, 95), float(np.mean(found))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("sizes", nargs="*", type=int, default=[10_000, 100_000, 200_000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--radius", type=float, default=1500.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"rayon {args.radius:.0f} m, {args.queries} recherches par mesure")
+    print(f"{'utilisateurs':>12} {'recherche':<16} {'p50 ms':>8} {'p95 ms':>8} {'voisins trouvés':>16}")
+    for size in args.sizes:
+        index = SharedGeoIndex()
+        index.open(NAME, size, 0.01)
+        try:
+            snap = snapshot(size, rng)
+            index.load(snap, LABELS, True, time.time(), time.time())
+            sample = rng.choice(size, size=min(args.queries, size), replace=False)
+            points = list(zip(snap["lat"][sample], snap["lng"][sample]))
+            for name, scan in (("seaux", False), ("balayage", True)):
+                if scan:
+                    # Masque la méthode: aucun seau, balayage de tout le tableau
+                    index._buckets = lambda *a: None
+                p50, p95, found = measure(lambda la, ln: index.nearby(la, ln, args.radius, 0.0), points)
+                print(f"{size:>12,} {name:<16} {p50:8.3f} {p95:8.3f} {found:16.1f}")
+            del index._buckets
+        finally:
+            index.close()
+            segment = shared_memory.SharedMemory(NAME)
+            segment.unlink()
+            segment.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Latence de la recherche de candidats de /match/suggestions selon le volume.
+
+Usage:
+    python benchmarks/bench_match_candidates.py [tailles...] [--queries 200] [--radius 1500]
+    (tailles par défaut: 10000 100000 1000000 humeurs)
+
+Nécessite DATABASE_URL (PostgreSQL). Les données synthétiques (10 humeurs par
+utilisateur, regroupées autour de quelques villes) sont écrites dans un schéma
+séparé, bench_match, recréé pour chaque taille puis supprimé: les tables de
+l'application ne sont pas touchées.
+
+Compare:
+  - l'ancienne requête: les 200 humeurs les plus récentes de toute la base,
+    filtrées par distance en Python (doublons et humeurs de l'appelant inclus);
+  - candidate_query(): dernière humeur par utilisateur actif
+    (GEO_INDEX_ACTIVE_HOURS) dans le rayon, cherchée par les cellules geohash,
+    sans l'appelant, au plus MATCH_MAX_CANDIDATES lignes.
+"""
+import argparse
+import io
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np  # noqa: E402
+from sqlalchemy import select, text  # noqa: E402
+
+from app import models  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.db import get_engine  # noqa: E402
+from app.geo import cell_columns, haversine_m  # noqa: E402
+from app.latest_mood import BACKFILL_SQL  # noqa: E402
+from app.routers.match import candidate_query  # noqa: E402
+
+
+SCHEMA = "bench_match"
+MOODS_PER_USER = 10
+LABELS = ["joy", "calm", "energy", "fatigue", "stress", "social", "nostalgia", "lonely"]
+CITIES = [
+    (48.8566, 2.3522), (45.7640, 4.8357), (43.2965, 5.3698), (43.6047, 1.4442),
+    (47.2184, -1.5536), (50.6292, 3.0573), (44.8378, -0.5792), (48.5734, 7.7521),
+]
+
+
+def _copy(raw, table: str, columns: str, lines):
+    buf = io.StringIO("".join(lines))
+    with raw.cursor() as cur:
+        cur.copy_expert(f"COPY {SCHEMA}.{table} ({columns}) FROM STDIN", buf)
+
+
+def seed(engine, n_moods: int, rng: np.random.Generator) -> dict:
+    """Crée le schéma et les données; retourne {user_id: (lat, lng)} des dernières positions."""
+    n_users = max(n_moods // MOODS_PER_USER, 1)
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        for table in ("users", "mood_events", "user_latest_mood"):
+            conn.execute(text(f"CREATE TABLE {SCHEMA}.{table} (LIKE public.{table} INCLUDING ALL)"))
+
+    # 80 % des utilisateurs autour d'une ville (écart-type ~5 km), 20 % répartis sur la France
+    home = np.asarray(CITIES)[rng.integers(len(CITIES), size=n_users)]
+    home_lat = home[:, 0] + rng.normal(0, 0.045, n_users)
+    home_lng = home[:, 1] + rng.normal(0, 0.065, n_users)
+    spread = rng.random(n_users) < 0.2
+    home_lat[spread] = rng.uniform(43.0, 50.0, spread.sum())
+    home_lng[spread] = rng.uniform(-1.5, 7.5, spread.sum())
+
+    user_ids = rng.integers(n_users, size=n_moods)
+    lat = home_lat[user_ids] + rng.normal(0, 0.002, n_moods)
+    lng = home_lng[user_ids] + rng.normal(0, 0.003, n_moods)
+    labels = rng.integers(len(LABELS), size=n_moods)
+    scores = rng.random(n_moods).round(3)
+    now = datetime.utcnow()
+    ages = rng.integers(30 * 24 * 3600, size=n_moods)
+
+    raw = engine.raw_connection()
+    try:
+        _copy(
+            raw, "users", "id, email, hashed_password, display_name, email_verified",
+            (f"{i + 1}\tbench{i + 1}@example.com\tx\tBench {i + 1}\ttrue\n" for i in range(n_users)),
+        )
+        _copy(
+            raw, "mood_events", "id, user_id, mood_label, mood_score, label_source, lat, lng, created_at",
+            (
+                f"{i + 1}\t{user_ids[i] + 1}\t{LABELS[labels[i]]}\t{scores[i]}\trules\t{lat[i]}\t{lng[i]}\t"
+                f"{(now - timedelta(seconds=int(ages[i]))).isoformat()}\n"
+                for i in range(n_moods)
+            ),
+        )
+        raw.commit()
+    finally:
+        raw.close()
+
+    with engine.begin() as conn:
+        conn.execute(text(f"SET LOCAL search_path TO {SCHEMA}"))
+        conn.execute(BACKFILL_SQL, {"first_user_id": 1, "last_user_id": n_users})
+        positions = {row.user_id: (row.lat, row.lng) for row in conn.execute(text("SELECT user_id, lat, lng FROM user_latest_mood"))}
+
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cur:
+            cur.execute("CREATE TEMP TABLE bench_cells (user_id INTEGER, g4 TEXT, g5 TEXT, g6 TEXT) ON COMMIT DROP")
+            lines = []
+            for user_id, (la, ln) in positions.items():
+                cells = cell_columns(la, ln)
+                lines.append(f"{user_id}\t{cells['geohash_4']}\t{cells['geohash_5']}\t{cells['geohash_6']}\n")
+            cur.copy_expert("COPY bench_cells FROM STDIN", io.StringIO("".join(lines)))
+            cur.execute(
+                f"UPDATE {SCHEMA}.user_latest_mood l SET geohash_4 = c.g4, geohash_5 = c.g5, geohash_6 = c.g6 "
+                "FROM bench_cells c WHERE c.user_id = l.user_id"
+            )
+            for table in ("users", "mood_events", "user_latest_mood"):
+                cur.execute(f"ANALYZE {SCHEMA}.{table}")
+        raw.commit()
+    finally:
+        raw.close()
+    return positions
+
+
+def legacy_query(user_id: int):
+    """Requête d'origine: 200 humeurs récentes, toutes positions confondues."""
+    return (
+        select(models.MoodEvent, models.User)
+        .join(models.User, models.User.id == models.MoodEvent.user_id)
+        .where(models.MoodEvent.lat.isnot(None))
+        .where(models.MoodEvent.lng.isnot(None))
+        .order_by(models.MoodEvent.created_at.desc())
+        .limit(200)
+    )
+
+
+def run(conn, build, positions: dict, sample: list, radius: float) -> tuple:
+    latencies, found = [], []
+    for user_id in sample:
+        lat, lng = positions[user_id]
+        started = time.perf_counter()
+        rows = conn.execute(build(user_id, lat, lng)).all()
+        in_radius = {r.user_id for r in rows if r.user_id != user_id and haversine_m(lat, lng, r.lat, r.lng) <= radius}
+        latencies.append(1000 * (time.perf_counter() - started))
+        found.append(len(in_radius))
+    return np.percentile(latencies, 50), np.percentile(latencies, 95), float(np.mean(found))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("sizes", nargs="*", type=int, default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--radius", type=float, default=1500.0)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    rng = np.random.default_rng(42)
+    print(f"rayon {args.radius:.0f} m, {args.queries} requêtes par mesure, MATCH_MAX_CANDIDATES={settings.match_max_candidates}")
+    print(f"{'humeurs':>10} {'requête':<16} {'p50 ms':>8} {'p95 ms':>8} {'voisins trouvés':>16}")
+    try:
+        for size in args.sizes:
+            started = time.perf_counter()
+            positions = seed(engine, size, rng)
+            print(f"{size:>10,} (données générées en {time.perf_counter() - started:.1f}s)")
+            sample = [int(u) for u in rng.choice(list(positions), size=min(args.queries, len(positions)), replace=False)]
+            with engine.connect() as conn:
+                conn.execute(text(f"SET search_path TO {SCHEMA}"))
+                for name, build in (
+                    ("ancienne", lambda uid, la, ln: legacy_query(uid)),
+                    ("candidate_query", lambda uid, la, ln: candidate_query(uid, la, ln, args.radius, settings.match_max_candidates)),
+                ):
+                    p50, p95, found = run(conn, build, positions, sample, args.radius)
+                    print(f"{size:>10,} {name:<16} {p50:8.2f} {p95:8.2f} {found:16.1f}")
+                conn.execute(text("RESET search_path"))
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Coût d'une humeur publiée pour les suggestions poussées (app/match_push.py):
+index cellule -> abonnés contre parcours de tous les abonnés.
+
+Usage:
+    python benchmarks/bench_match_push.py [nombres_d_abonnes...] [--moods 2000] [--radius 1500]
+    (par défaut: 1000 10000 100000 abonnés)
+
+Aucune connexion réelle ni requête en base (DATABASE_URL doit seulement être
+défini pour charger la configuration): abonnés et humeurs sont générés autour
+de quelques villes; les suggestions sont déposées dans les files des connexions.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np  # noqa: E402
+
+from app.geo import haversine_m  # noqa: E402
+from app.match_push import MatchPushHub  # noqa: E402
+from app.match_scoring import MOOD_SCORE_TOLERANCE, is_mood_compatible  # noqa: E402
+
+
+LABELS = ["joy", "calm", "energy", "fatigue", "stress", "social", "reflective", "lonely"]
+CITIES = [
+    (48.8566, 2.3522), (45.7640, 4.8357), (43.2965, 5.3698), (43.6047, 1.4442),
+    (47.2184, -1.5536), (50.6292, 3.0573), (44.8378, -0.5792), (48.5734, 7.7521),
+]
+
+
+def points(n: int, rng: np.random.Generator):
+    home = np.asarray(CITIES)[rng.integers(len(CITIES), size=n)]
+    return home[:, 0] + rng.normal(0, 0.045, n), home[:, 1] + rng.normal(0, 0.065, n)
+
+
+def scan_all(connections, user_id, lat, lng, label, score) -> int:
+    """Référence: chaque humeur évaluée contre tous les abonnés."""
+    pushed = 0
+    for conn in connections:
+        if conn.user_id == user_id or haversine_m(conn.lat, conn.lng, lat, lng) > conn.radius_m:
+            continue
+        if is_mood_compatible(conn.mood_label, label) or abs(score - conn.mood_score) < MOOD_SCORE_TOLERANCE:
+            pushed += 1
+    return pushed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("sizes", nargs="*", type=int, default=[1_000, 10_000, 100_000])
+    parser.add_argument("--moods", type=int, default=2000)
+    parser.add_argument("--radius", type=float, default=1500.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"rayon {args.radius:.0f} m, {args.moods} humeurs publiées par mesure")
+    print(f"{'abonnés':>10} {'évaluation':<16} {'µs/humeur':>10} {'suggestions':>12}")
+    for size in args.sizes:
+        hub = MatchPushHub(queue_max=args.moods)
+        lats, lngs = points(size, rng)
+        labels = rng.integers(len(LABELS), size=size)
+        for i in range(size):
+            conn = hub.connect(i + 1)
+            hub.subscribe(conn, lats[i], lngs[i], args.radius, True, LABELS[labels[i]], float(rng.random()))
+        connections = list(hub._connections.values())
+        m_lats, m_lngs = points(args.moods, rng)
+        moods = [
+            (size + 1 + j, m_lats[j], m_lngs[j], LABELS[rng.integers(len(LABELS))], float(rng.random()))
+            for j in range(args.moods)
+        ]
+
+        started = time.perf_counter()
+        pushed = sum(hub.publish_mood(uid, None, la, ln, label, score) for uid, la, ln, label, score in moods)
+        per_mood = (time.perf_counter() - started) / args.moods
+        print(f"{size:>10,} {'cellules':<16} {1e6 * per_mood:10.1f} {pushed:12,}")
+
+        reference_moods = moods[: max(args.moods // 20, 1)] if size >= 100_000 else moods
+        started = time.perf_counter()
+        expected = sum(scan_all(connections, *m) for m in reference_moods)
+        per_mood = (time.perf_counter() - started) / len(reference_moods)
+        note = f" (sur {len(reference_moods)} humeurs)" if reference_moods is not moods else ""
+        print(f"{size:>10,} {'tous les abonnés':<16} {1e6 * per_mood:10.1f} {expected:12,}{note}")
+        if reference_moods is moods:
+            assert expected == pushed
+
+
+if __name__ == "__main__":
+    main()
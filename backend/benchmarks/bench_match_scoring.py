@@ -0,0 +1,103 @@
+"""
+Classement des candidats de /match/suggestions: boucle d'origine contre
+moteur vectorisé (app/match_scoring.py).
+
+Usage:
+    python benchmarks/bench_match_scoring.py [nombres_de_candidats...]
+    (par défaut: 500 5000 50000)
+
+Aucune requête en base (DATABASE_URL doit seulement être défini pour charger
+la configuration): les candidats sont générés autour d'un point.
+"""
+import sys
+import time
+from math import asin, cos, radians, sin, sqrt
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np  # noqa: E402
+
+from app.match_scoring import get_match_scorer  # noqa: E402
+
+
+LABELS = ["joy", "calm", "energy", "fatigue", "stress", "social", "nostalgia", "lonely"]
+ORIGIN = (48.8566, 2.3522, "joy", 0.8)
+RADIUS_M = 1500.0
+K = 50
+REPEAT = 20
+
+
+def legacy_haversine_m(lat1, lon1, lat2, lon2):
+    R = 6371000.0
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    c = 2 * asin(sqrt(a))
+    return R * c
+
+
+def legacy_is_mood_compatible(a, b):
+    """Implémentation d'origine (dictionnaire reconstruit à chaque appel)."""
+    if a == b:
+        return True
+    complementary = {
+        "calm": {"calm", "joy"},
+        "joy": {"joy", "calm", "energy"},
+        "energy": {"energy", "joy"},
+        "fatigue": {"calm", "joy"},
+        "stress": {"calm"},
+    }
+    return b in complementary.get(a, {a})
+
+
+def legacy_rank(lats, lngs, labels, scores):
+    """Boucle d'origine: filtre par candidat puis tri complet par distance."""
+    lat, lng, label, score = ORIGIN
+    out = []
+    for i in range(len(lats)):
+        d = legacy_haversine_m(lat, lng, lats[i], lngs[i])
+        if d <= RADIUS_M and (legacy_is_mood_compatible(label, labels[i]) or abs(scores[i] - score) < 0.2):
+            out.append((d, i))
+    return [i for _, i in sorted(out)]
+
+
+def make_candidates(n, seed=42):
+    rng = np.random.default_rng(seed)
+    lats = ORIGIN[0] + rng.normal(0, 0.012, n)
+    lngs = ORIGIN[1] + rng.normal(0, 0.018, n)
+    labels = [LABELS[i] for i in rng.integers(len(LABELS), size=n)]
+    scores = rng.random(n)
+    ages = rng.uniform(0, 48 * 3600, n)
+    return lats, lngs, labels, scores, ages
+
+
+def bench(name, fn, n):
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        fn()
+    per_call = (time.perf_counter() - started) / REPEAT
+    print(f"  {name:<34} {1000 * per_call:9.3f} ms/appel  {n / per_call:>14,.0f} candidats/s")
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [500, 5_000, 50_000]
+    scorer = get_match_scorer()
+    for n in sizes:
+        lats, lngs, labels, scores, ages = make_candidates(n)
+        py_lats, py_lngs, py_scores = lats.tolist(), lngs.tolist(), scores.tolist()
+
+        def vectorized():
+            return scorer.rank(*ORIGIN, lats, lngs, labels, scores, ages, RADIUS_M, K)
+
+        legacy = legacy_rank(py_lats, py_lngs, labels, py_scores)
+        chosen, _, _ = vectorized()
+        # Même ensemble éligible: les k retenus en font partie, et il y en a autant que possible
+        assert set(chosen.tolist()) <= set(legacy) and len(chosen) == min(K, len(legacy))
+        print(f"{n:,} candidats, {len(legacy):,} éligibles, top {K}")
+        bench("boucle d'origine + sorted()", lambda: legacy_rank(py_lats, py_lngs, labels, py_scores), n)
+        bench("MatchScorer.rank (NumPy)", vectorized, n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Débit du moteur de règles (app/mood_rules.py) comparé à l'ancien analyze_mood.
+
+Usage:
+    python benchmarks/bench_mood_rules.py [nombre_de_textes]
+
+Aucune base de données requise: les textes sont générés.
+"""
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.mood_rules import RULES_PATH, MoodRuleEngine, fold_text  # noqa: E402
+
+
+BATCH = 5000
+
+
+def legacy_analyze_mood(text):
+    """Implémentation d'origine (plusieurs any(k in t ...) par appel)."""
+    if not text:
+        return "calm", 0.5
+    t = text.lower()
+    if any(k in t for k in ["seul", "triste", "fatigu", "épuis"]):
+        return "fatigue", 0.3
+    if any(k in t for k in ["stress", "angoiss", "tendu"]):
+        return "stress", 0.2
+    if any(k in t for k in ["inspir", "bouger", "march", "sortir", "énerg"]):
+        return "energy", 0.8
+    if any(k in t for k in ["heureux", "joyeux", "content", "bien"]):
+        return "joy", 0.9
+    return "calm", 0.6
+
+
+def legacy_with_rules_vocabulary():
+    """L'algorithme d'origine appliqué au vocabulaire complet du fichier de règles (8 labels)."""
+    with open(RULES_PATH, encoding="utf-8") as f:
+        rules = json.load(f)
+    groups = [
+        (entry["label"], entry["score"], [fold_text(k.rstrip("*")) for k in entry["keywords"]])
+        for entry in rules["labels"]
+    ]
+
+    def analyze(text):
+        if not text:
+            return "calm", 0.5
+        t = fold_text(text)
+        for label, score, keywords in groups:
+            if any(k in t for k in keywords):
+                return label, score
+        return "calm", 0.6
+
+    return analyze
+
+
+FRAGMENTS = [
+    "je suis fatigué", "trop de stress au travail", "envie de bouger", "je me sens bien", "un peu seul ce soir",
+    "journée calme", "j'ai besoin de parler avec des amis", "je repense à mes souvenirs", "Épuisée après la semaine",
+    "angoissé par les examens", "super content de sortir", "rien de spécial", "on fait une soirée ?", "😊",
+    "il pleut", "tranquille à la maison", "motivé pour courir", "je me sens isolée",
+]
+
+
+def make_texts(n: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 4))) for _ in range(n)]
+
+
+def bench(name: str, fn, n: int) -> float:
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<40} {elapsed:8.3f}s  {n / elapsed:>12,.0f} textes/s")
+    return elapsed
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    texts = make_texts(n)
+    engine = MoodRuleEngine.from_file()
+    legacy_full = legacy_with_rules_vocabulary()
+    print(f"{n:,} textes, {len(engine.keyword_weight) - 1} mots-clés, {len(engine.labels)} labels")
+
+    bench("ancien analyze_mood (16 mots-clés)", lambda: [legacy_analyze_mood(t) for t in texts], n)
+    bench("ancien algorithme, vocabulaire complet", lambda: [legacy_full(t) for t in texts], n)
+    bench("moteur compilé, texte par texte", lambda: [engine.classify(t) for t in texts], n)
+    # Lots de BATCH textes, comme database/relabel_moods.py
+    bench(
+        f"moteur compilé, analyze_moods ({BATCH})",
+        lambda: [engine.classify_many(texts[i:i + BATCH]) for i in range(0, n, BATCH)],
+        n,
+    )
+    # Pire cas de la mémoïsation par morceau: un mot jamais vu dans chaque texte
+    novel = [f"{t} note{i}" for i, t in enumerate(texts)]
+    bench("moteur compilé, un mot inédit par texte", lambda: [engine.classify(t) for t in novel], n)
+
+    single = [engine.classify(t) for t in texts[:10_000]]
+    assert single == engine.classify_many(texts[:10_000]), "classify et classify_many divergent"
+    agree = sum(legacy_analyze_mood(t)[0] == label for t, (label, _) in zip(texts, single))
+    print(f"accord avec l'ancien classement: {agree / len(single):.1%} (8 labels pondérés au lieu de 4 + défaut)")
+
+
+if __name__ == "__main__":
+    main()
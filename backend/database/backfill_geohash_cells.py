@@ -0,0 +1,72 @@
+"""
+Calcule les cellules geohash (app/geo.py) des humeurs existantes.
+
+Usage:
+    python database/backfill_geohash_cells.py [--batch-size 5000]
+
+À lancer une fois après database/migration_add_geohash_cells.sql. Les
+humeurs géolocalisées sans cellule sont lues par tranches d'identifiants
+croissants et mises à jour par lots; user_latest_mood est ensuite recopiée
+depuis mood_events. Le script peut être relancé sans risque.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour importer les modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import select, text, update
+
+from app import models
+from app.db import SessionLocal, get_engine
+from app.geo import cell_columns
+
+
+def backfill(batch_size: int) -> dict:
+    get_engine()
+    stats = {"updated": 0, "latest_updated": 0}
+    last_id = 0
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        while True:
+            rows = db.execute(
+                select(models.MoodEvent.id, models.MoodEvent.lat, models.MoodEvent.lng)
+                .where(
+                    models.MoodEvent.id > last_id,
+                    models.MoodEvent.lat.isnot(None),
+                    models.MoodEvent.lng.isnot(None),
+                    models.MoodEvent.geohash_6.is_(None),
+                )
+                .order_by(models.MoodEvent.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            # UPDATE groupé par clé primaire
+            db.execute(update(models.MoodEvent), [{"id": row.id, **cell_columns(row.lat, row.lng)} for row in rows])
+            db.commit()
+            stats["updated"] += len(rows)
+            print(f"   ... {stats['updated']} humeurs mises à jour")
+        stats["latest_updated"] = db.execute(
+            text(
+                "UPDATE user_latest_mood l SET geohash_4 = e.geohash_4, geohash_5 = e.geohash_5, geohash_6 = e.geohash_6 "
+                "FROM mood_events e WHERE e.id = l.mood_event_id AND l.geohash_6 IS DISTINCT FROM e.geohash_6"
+            )
+        ).rowcount
+        db.commit()
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    result = backfill(args.batch_size)
+    print(
+        f"✅ {result['updated']} humeurs et {result['latest_updated']} lignes user_latest_mood "
+        f"mises à jour en {result['seconds']}s"
+    )
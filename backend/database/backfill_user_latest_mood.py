@@ -0,0 +1,45 @@
+"""
+Remplit la table user_latest_mood à partir de l'historique de mood_events.
+
+Usage:
+    python database/backfill_user_latest_mood.py [--batch-size 5000]
+
+À lancer une fois après database/migration_add_user_latest_mood.sql. Le
+traitement se fait par tranches d'identifiants d'utilisateurs (transactions
+courtes) et peut être relancé sans risque: une humeur plus récente déjà
+enregistrée n'est jamais remplacée.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour importer les modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+
+from app.db import get_engine
+from app.latest_mood import BACKFILL_SQL
+
+
+def backfill(batch_size: int) -> int:
+    engine = get_engine()
+    with engine.connect() as conn:
+        max_user_id = conn.execute(text("SELECT COALESCE(MAX(user_id), 0) FROM mood_events")).scalar()
+    total = 0
+    for first in range(1, max_user_id + 1, batch_size):
+        last = first + batch_size - 1
+        with engine.begin() as conn:
+            total += conn.execute(BACKFILL_SQL, {"first_user_id": first, "last_user_id": last}).rowcount
+        print(f"   ... utilisateurs {first}-{min(last, max_user_id)}: {total} lignes écrites")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=5000, help="Utilisateurs par transaction")
+    args = parser.parse_args()
+    started = time.perf_counter()
+    count = backfill(args.batch_size)
+    print(f"✅ user_latest_mood: {count} lignes écrites en {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,31 @@
+"""
+Crée les tables à partir des modèles SQLAlchemy et enregistre la version du schéma.
+
+Usage:
+    python database/init_schema.py
+
+À exécuter une fois sur une nouvelle base. Le serveur ne fait plus de
+create_all au démarrage: il vérifie seulement schema_version. Une base en
+retard n'est pas modifiée (create_all n'ajoute pas de colonnes): le script
+liste les migrations à appliquer.
+"""
+import sys
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour importer les modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.db import get_engine
+from app.schema import SCHEMA_VERSION, init_schema, pending_migrations, read_schema_version
+
+
+if __name__ == "__main__":
+    with get_engine().connect() as conn:
+        found = read_schema_version(conn)
+    if found is not None and found < SCHEMA_VERSION:
+        print(f"❌ Schéma v{found} en retard sur v{SCHEMA_VERSION}: appliquez dans l'ordre")
+        for name in pending_migrations(found):
+            print(f"   database/{name}")
+        sys.exit(1)
+    init_schema()
+    print(f"✅ Schéma initialisé (version {SCHEMA_VERSION})")
@@ -0,0 +1,37 @@
+-- =====================================================
+-- Migration: Dernier message des conversations (boîte de réception)
+-- =====================================================
+-- À exécuter dans Supabase (SQL Editor) si les tables existent déjà,
+-- après migration_add_messages_keyset_index.sql.
+-- Cette migration est idempotente. Les colonnes sont ensuite tenues à
+-- jour par POST /chat/send; GET /chat/inbox les lit sans agréger les
+-- messages.
+-- Version du schéma: 9
+-- =====================================================
+
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS last_message_id INTEGER;
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS last_message_at TIMESTAMP WITH TIME ZONE;
+
+-- Remplir à partir des messages existants (dernier par created_at, puis id)
+UPDATE conversations c
+SET last_message_id = m.id, last_message_at = m.created_at
+FROM (
+    SELECT DISTINCT ON (conversation_id) conversation_id, id, created_at
+    FROM messages
+    ORDER BY conversation_id, created_at DESC, id DESC
+) m
+WHERE m.conversation_id = c.id AND c.last_message_id IS DISTINCT FROM m.id;
+
+CREATE INDEX IF NOT EXISTS idx_conversations_user_one_last_message ON conversations(user_one_id, last_message_at, id);
+CREATE INDEX IF NOT EXISTS idx_conversations_user_two_last_message ON conversations(user_two_id, last_message_at, id);
+CREATE INDEX IF NOT EXISTS idx_messages_unread ON messages(recipient_id, conversation_id) WHERE read_at IS NULL;
+
+-- Enregistrer la version du schéma (voir app/schema.py)
+CREATE TABLE IF NOT EXISTS schema_version (
+    id INTEGER PRIMARY KEY DEFAULT 1,
+    version INTEGER NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+INSERT INTO schema_version (id, version, updated_at) VALUES (1, 9, CURRENT_TIMESTAMP)
+ON CONFLICT (id) DO UPDATE SET version = GREATEST(schema_version.version, EXCLUDED.version), updated_at = CURRENT_TIMESTAMP;
@@ -0,0 +1,33 @@
+-- =====================================================
+-- Migration: Suivi des envois d'emails (file d'envoi asynchrone)
+-- =====================================================
+-- À exécuter dans Supabase (SQL Editor) si les tables existent déjà.
+-- Cette migration est idempotente.
+-- Version du schéma: 2
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS email_deliveries (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    email VARCHAR(255) NOT NULL,
+    kind VARCHAR(50) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    sent_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_email_deliveries_user_id ON email_deliveries(user_id);
+CREATE INDEX IF NOT EXISTS idx_email_deliveries_status ON email_deliveries(status) WHERE status <> 'sent';
+
+-- Enregistrer la version du schéma (voir app/schema.py)
+CREATE TABLE IF NOT EXISTS schema_version (
+    id INTEGER PRIMARY KEY DEFAULT 1,
+    version INTEGER NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+INSERT INTO schema_version (id, version, updated_at) VALUES (1, 2, CURRENT_TIMESTAMP)
+ON CONFLICT (id) DO UPDATE SET version = GREATEST(schema_version.version, EXCLUDED.version), updated_at = CURRENT_TIMESTAMP;
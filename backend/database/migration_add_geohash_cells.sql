@@ -0,0 +1,35 @@
+-- =====================================================
+-- Migration: Cellules geohash (index spatial) sur les humeurs
+-- =====================================================
+-- À exécuter dans Supabase (SQL Editor) si les tables existent déjà.
+-- Cette migration est idempotente. Calculer ensuite les cellules des lignes
+-- existantes avec:
+--   python database/backfill_geohash_cells.py
+-- Version du schéma: 6
+-- =====================================================
+
+ALTER TABLE mood_events ADD COLUMN IF NOT EXISTS geohash_4 VARCHAR(4);
+ALTER TABLE mood_events ADD COLUMN IF NOT EXISTS geohash_5 VARCHAR(5);
+ALTER TABLE mood_events ADD COLUMN IF NOT EXISTS geohash_6 VARCHAR(6);
+
+CREATE INDEX IF NOT EXISTS idx_mood_events_geohash_4 ON mood_events(geohash_4);
+CREATE INDEX IF NOT EXISTS idx_mood_events_geohash_5 ON mood_events(geohash_5);
+CREATE INDEX IF NOT EXISTS idx_mood_events_geohash_6 ON mood_events(geohash_6);
+
+ALTER TABLE user_latest_mood ADD COLUMN IF NOT EXISTS geohash_4 VARCHAR(4);
+ALTER TABLE user_latest_mood ADD COLUMN IF NOT EXISTS geohash_5 VARCHAR(5);
+ALTER TABLE user_latest_mood ADD COLUMN IF NOT EXISTS geohash_6 VARCHAR(6);
+
+CREATE INDEX IF NOT EXISTS idx_user_latest_mood_geohash_4 ON user_latest_mood(geohash_4);
+CREATE INDEX IF NOT EXISTS idx_user_latest_mood_geohash_5 ON user_latest_mood(geohash_5);
+CREATE INDEX IF NOT EXISTS idx_user_latest_mood_geohash_6 ON user_latest_mood(geohash_6);
+
+-- Enregistrer la version du schéma (voir app/schema.py)
+CREATE TABLE IF NOT EXISTS schema_version (
+    id INTEGER PRIMARY KEY DEFAULT 1,
+    version INTEGER NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+INSERT INTO schema_version (id, version, updated_at) VALUES (1, 6, CURRENT_TIMESTAMP)
+ON CONFLICT (id) DO UPDATE SET version = GREATEST(schema_version.version, EXCLUDED.version), updated_at = CURRENT_TIMESTAMP;
@@ -0,0 +1,21 @@
+-- =====================================================
+-- Migration: Index de pagination de l'historique des messages
+-- =====================================================
+-- À exécuter dans Supabase (SQL Editor) si les tables existent déjà.
+-- Cette migration est idempotente. GET /chat/messages/{id} lit la
+-- dernière page (ou la page avant / après un message) en parcourant
+-- cet index dans l'ordre, sans trier la conversation.
+-- Version du schéma: 8
+-- =====================================================
+
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created_id ON messages(conversation_id, created_at, id);
+
+-- Enregistrer la version du schéma (voir app/schema.py)
+CREATE TABLE IF NOT EXISTS schema_version (
+    id INTEGER PRIMARY KEY DEFAULT 1,
+    version INTEGER NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+INSERT INTO schema_version (id, version, updated_at) VALUES (1, 8, CURRENT_TIMESTAMP)
+ON CONFLICT (id) DO UPDATE SET version = GREATEST(schema_version.version, EXCLUDED.version), updated_at = CURRENT_TIMESTAMP;
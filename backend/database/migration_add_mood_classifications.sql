@@ -0,0 +1,27 @@
+-- =====================================================
+-- Migration: Cache partagé des classifications d'humeur (LLM)
+-- =====================================================
+-- À exécuter dans Supabase (SQL Editor) si les tables existent déjà.
+-- Cette migration est idempotente.
+-- Version du schéma: 4
+-- =====================================================
+
+-- Clé: modèle + SHA-256 du texte normalisé (voir app/mood_cache.py)
+CREATE TABLE IF NOT EXISTS mood_classifications (
+    model VARCHAR(100) NOT NULL,
+    text_hash VARCHAR(64) NOT NULL,
+    mood_label VARCHAR(50) NOT NULL,
+    mood_score DOUBLE PRECISION NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    PRIMARY KEY (model, text_hash)
+);
+
+-- Enregistrer la version du schéma (voir app/schema.py)
+CREATE TABLE IF NOT EXISTS schema_version (
+    id INTEGER PRIMARY KEY DEFAULT 1,
+    version INTEGER NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+INSERT INTO schema_version (id, version, updated_at) VALUES (1, 4, CURRENT_TIMESTAMP)
+ON CONFLICT (id) DO UPDATE SET version = GREATEST(schema_version.version, EXCLUDED.version), updated_at = CURRENT_TIMESTAMP;
@@ -0,0 +1,20 @@
+-- =====================================================
+-- Migration: Origine de l'étiquette d'humeur (classification en deux temps)
+-- =====================================================
+-- À exécuter dans Supabase (SQL Editor) si les tables existent déjà.
+-- Cette migration est idempotente.
+-- Version du schéma: 3
+-- =====================================================
+
+-- rules: étiquette provisoire (règles), llm: affinée en arrière-plan
+ALTER TABLE mood_events ADD COLUMN IF NOT EXISTS label_source VARCHAR(20) NOT NULL DEFAULT 'rules';
+
+-- Enregistrer la version du schéma (voir app/schema.py)
+CREATE TABLE IF NOT EXISTS schema_version (
+    id INTEGER PRIMARY KEY DEFAULT 1,
+    version INTEGER NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+INSERT INTO schema_version (id, version, updated_at) VALUES (1, 3, CURRENT_TIMESTAMP)
+ON CONFLICT (id) DO UPDATE SET version = GREATEST(schema_version.version, EXCLUDED.version), updated_at = CURRENT_TIMESTAMP;
@@ -0,0 +1,29 @@
+-- =====================================================
+-- Migration: Suggestions de match précalculées (precomputed_matches)
+-- =====================================================
+-- À exécuter dans Supabase (SQL Editor) si les tables existent déjà.
+-- Cette migration est idempotente. La table est remplie par
+-- python database/precompute_matches.py (cron) ou par l'API
+-- (MATCH_BATCH_INTERVAL_MINUTES > 0).
+-- Version du schéma: 7
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS precomputed_matches (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    mood_event_id INTEGER NOT NULL,
+    radius_m INTEGER NOT NULL,
+    suggestions TEXT NOT NULL,
+    computed_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_precomputed_matches_computed_at ON precomputed_matches(computed_at);
+
+-- Enregistrer la version du schéma (voir app/schema.py)
+CREATE TABLE IF NOT EXISTS schema_version (
+    id INTEGER PRIMARY KEY DEFAULT 1,
+    version INTEGER NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+INSERT INTO schema_version (id, version, updated_at) VALUES (1, 7, CURRENT_TIMESTAMP)
+ON CONFLICT (id) DO UPDATE SET version = GREATEST(schema_version.version, EXCLUDED.version), updated_at = CURRENT_TIMESTAMP;
@@ -0,0 +1,32 @@
+-- =====================================================
+-- Migration: Dernière humeur par utilisateur (user_latest_mood)
+-- =====================================================
+-- À exécuter dans Supabase (SQL Editor) si les tables existent déjà.
+-- Cette migration est idempotente. Remplir ensuite la table avec:
+--   python database/backfill_user_latest_mood.py
+-- Version du schéma: 5
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS user_latest_mood (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    mood_event_id INTEGER NOT NULL REFERENCES mood_events(id) ON DELETE CASCADE,
+    mood_label VARCHAR(50) NOT NULL,
+    mood_score DOUBLE PRECISION NOT NULL DEFAULT 0.0,
+    label_source VARCHAR(20) NOT NULL DEFAULT 'rules',
+    lat DOUBLE PRECISION,
+    lng DOUBLE PRECISION,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_latest_mood_location ON user_latest_mood(lat, lng) WHERE lat IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_user_latest_mood_created_at ON user_latest_mood(created_at);
+
+-- Enregistrer la version du schéma (voir app/schema.py)
+CREATE TABLE IF NOT EXISTS schema_version (
+    id INTEGER PRIMARY KEY DEFAULT 1,
+    version INTEGER NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+INSERT INTO schema_version (id, version, updated_at) VALUES (1, 5, CURRENT_TIMESTAMP)
+ON CONFLICT (id) DO UPDATE SET version = GREATEST(schema_version.version, EXCLUDED.version), updated_at = CURRENT_TIMESTAMP;
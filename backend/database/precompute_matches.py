@@ -0,0 +1,43 @@
+"""
+Précalcule les suggestions de match des utilisateurs actifs (app/batch_matching.py).
+
+Usage:
+    python database/precompute_matches.py [--hours 24] [--workers N]
+
+À planifier (cron) toutes les quelques minutes, ou remplacer par
+MATCH_BATCH_INTERVAL_MINUTES dans l'API. Un seul calcul s'exécute à la fois
+(verrou consultatif PostgreSQL).
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour importer les modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.batch_matching import run_batch_locked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hours", type=float, default=None, help="Fenêtre d'activité (défaut: MATCH_BATCH_ACTIVE_HOURS)")
+    parser.add_argument("--workers", type=int, default=None, help="Processus du pool (défaut: MATCH_BATCH_WORKERS)")
+    args = parser.parse_args()
+
+    report = run_batch_locked(args.hours, args.workers)
+    if report is None:
+        print("⚠️ Un autre calcul est en cours (verrou pris): rien à faire")
+        return
+    print(
+        f"✅ {report['written']} utilisateurs actifs, {report['partitions']} partitions, "
+        f"{report['workers']} processus: {report['duration_seconds']}s "
+        f"(chargement {report['load_seconds']}s, calcul {report['compute_seconds']}s, écriture {report['write_seconds']}s)"
+    )
+    print(
+        f"📊 Débit: {report['users_per_second']} utilisateurs/s, "
+        f"{report['users_per_second_per_worker']} utilisateurs/s par processus"
+    )
+
+
+if __name__ == "__main__":
+    main()
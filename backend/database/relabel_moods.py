@@ -0,0 +1,77 @@
+"""
+Recalcule l'étiquette par règles des humeurs existantes (après une modification
+de app/data/mood_rules.json).
+
+Usage:
+    python database/relabel_moods.py [--batch-size 5000] [--dry-run]
+
+Seules les humeurs dont label_source vaut 'rules' sont concernées: les
+étiquettes affinées par le LLM ne sont pas modifiées. Les lignes sont lues par
+tranches d'identifiants croissants et classées par lots (analyze_moods).
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour importer les modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import select, text, update
+
+from app import models
+from app.db import SessionLocal, get_engine
+from app.mood_rules import analyze_moods
+
+
+def relabel(batch_size: int, dry_run: bool) -> dict:
+    get_engine()
+    stats = {"scanned": 0, "changed": 0}
+    last_id = 0
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        while True:
+            rows = db.execute(
+                select(models.MoodEvent.id, models.MoodEvent.text, models.MoodEvent.mood_label, models.MoodEvent.mood_score)
+                .where(models.MoodEvent.id > last_id, models.MoodEvent.label_source == "rules")
+                .order_by(models.MoodEvent.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            results = analyze_moods([row.text for row in rows])
+            changes = [
+                {"id": row.id, "mood_label": label, "mood_score": score}
+                for row, (label, score) in zip(rows, results)
+                if (label, score) != (row.mood_label, row.mood_score)
+            ]
+            stats["scanned"] += len(rows)
+            stats["changed"] += len(changes)
+            if changes and not dry_run:
+                # UPDATE groupé par clé primaire
+                db.execute(update(models.MoodEvent), changes)
+                db.commit()
+            print(f"   ... {stats['scanned']} humeurs lues, {stats['changed']} modifiées")
+        if stats["changed"] and not dry_run:
+            # Reporter les nouvelles étiquettes sur user_latest_mood
+            db.execute(
+                text(
+                    "UPDATE user_latest_mood l SET mood_label = e.mood_label, mood_score = e.mood_score "
+                    "FROM mood_events e WHERE e.id = l.mood_event_id AND l.label_source = 'rules' "
+                    "AND (l.mood_label <> e.mood_label OR l.mood_score <> e.mood_score)"
+                )
+            )
+            db.commit()
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--dry-run", action="store_true", help="Compter les changements sans écrire")
+    args = parser.parse_args()
+    result = relabel(args.batch_size, args.dry_run)
+    suffix = " (simulation)" if args.dry_run else ""
+    print(f"✅ {result['changed']}/{result['scanned']} humeurs ré-étiquetées en {result['seconds']}s{suffix}")
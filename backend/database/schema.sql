@@ -8,7 +8,7 @@
 -- Usage:
 --   1. Via Supabase Dashboard: SQL Editor > New Query > Coller ce script > Run
 --   2. Via psql: psql -h db.xxx.supabase.co -U postgres -d postgres -f schema.sql
---   3. Via l'application: Les tables sont créées automatiquement au démarrage
+--   3. Via l'application: python database/init_schema.py (le serveur vérifie seulement schema_version)
 -- =====================================================
 
 -- Supprimer les tables si elles existent (pour réinitialisation)
@@ -60,8 +60,12 @@ CREATE TABLE IF NOT EXISTS mood_events (
     text TEXT,
     mood_label VARCHAR(50) NOT NULL,
     mood_score DOUBLE PRECISION NOT NULL DEFAULT 0.0,
+    label_source VARCHAR(20) NOT NULL DEFAULT 'rules',
     lat DOUBLE PRECISION,
     lng DOUBLE PRECISION,
+    geohash_4 VARCHAR(4),
+    geohash_5 VARCHAR(5),
+    geohash_6 VARCHAR(6),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
     
     -- Contrainte de clé étrangère
@@ -76,6 +80,9 @@ CREATE INDEX IF NOT EXISTS idx_mood_events_user_id ON mood_events(user_id);
 CREATE INDEX IF NOT EXISTS idx_mood_events_created_at ON mood_events(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_mood_events_location ON mood_events(lat, lng) WHERE lat IS NOT NULL AND lng IS NOT NULL;
 CREATE INDEX IF NOT EXISTS idx_mood_events_mood_label ON mood_events(mood_label);
+CREATE INDEX IF NOT EXISTS idx_mood_events_geohash_4 ON mood_events(geohash_4);
+CREATE INDEX IF NOT EXISTS idx_mood_events_geohash_5 ON mood_events(geohash_5);
+CREATE INDEX IF NOT EXISTS idx_mood_events_geohash_6 ON mood_events(geohash_6);
 
 -- Commentaires pour la documentation
 COMMENT ON TABLE mood_events IS 'Table des événements d''humeur enregistrés par les utilisateurs';
@@ -86,6 +93,7 @@ COMMENT ON COLUMN mood_events.mood_label IS 'Label de l''humeur (ex: joy, calm,
 COMMENT ON COLUMN mood_events.mood_score IS 'Score numérique de l''humeur (0.0 à 1.0 généralement)';
 COMMENT ON COLUMN mood_events.lat IS 'Latitude de la position géographique (optionnel)';
 COMMENT ON COLUMN mood_events.lng IS 'Longitude de la position géographique (optionnel)';
+COMMENT ON COLUMN mood_events.geohash_6 IS 'Cellule geohash de la position (aussi geohash_4 et geohash_5), voir app/geo.py';
 COMMENT ON COLUMN mood_events.created_at IS 'Date et heure de création de l''événement';
 
 -- =====================================================
@@ -176,6 +184,8 @@ CREATE TABLE IF NOT EXISTS conversations (
     user_one_id INTEGER NOT NULL,
     user_two_id INTEGER NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    last_message_id INTEGER,
+    last_message_at TIMESTAMP WITH TIME ZONE,
 
     CONSTRAINT fk_conversations_user_one
         FOREIGN KEY (user_one_id)
@@ -192,6 +202,8 @@ CREATE TABLE IF NOT EXISTS conversations (
 CREATE INDEX IF NOT EXISTS idx_conversations_user_one ON conversations(user_one_id);
 CREATE INDEX IF NOT EXISTS idx_conversations_user_two ON conversations(user_two_id);
 CREATE INDEX IF NOT EXISTS idx_conversations_created_at ON conversations(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_conversations_user_one_last_message ON conversations(user_one_id, last_message_at, id);
+CREATE INDEX IF NOT EXISTS idx_conversations_user_two_last_message ON conversations(user_two_id, last_message_at, id);
 
 COMMENT ON TABLE conversations IS 'Conversations entre deux utilisateurs';
 
@@ -226,6 +238,8 @@ CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages(conversation_id
 CREATE INDEX IF NOT EXISTS idx_messages_sender ON messages(sender_id);
 CREATE INDEX IF NOT EXISTS idx_messages_recipient ON messages(recipient_id);
 CREATE INDEX IF NOT EXISTS idx_messages_created_at ON messages(created_at ASC);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created_id ON messages(conversation_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_messages_unread ON messages(recipient_id, conversation_id) WHERE read_at IS NULL;
 
 COMMENT ON TABLE messages IS 'Messages échangés entre utilisateurs';
 
@@ -269,6 +283,96 @@ CREATE INDEX IF NOT EXISTS idx_design_tokens_updated_at ON design_tokens(updated
 
 COMMENT ON TABLE design_tokens IS 'Tokens de design synchronisés depuis Figma';
 
+-- =====================================================
+-- Table: email_deliveries
+-- Description: Suivi des emails envoyés par la file d'envoi (app/email_service.py)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS email_deliveries (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    email VARCHAR(255) NOT NULL,
+    kind VARCHAR(50) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    sent_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_email_deliveries_user_id ON email_deliveries(user_id);
+CREATE INDEX IF NOT EXISTS idx_email_deliveries_status ON email_deliveries(status) WHERE status <> 'sent';
+
+COMMENT ON TABLE email_deliveries IS 'Statut des emails (queued, retrying, sent, failed) par utilisateur';
+
+-- =====================================================
+-- Table: user_latest_mood
+-- Description: Dernière humeur par utilisateur, mise à jour avec chaque humeur (app/latest_mood.py)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS user_latest_mood (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    mood_event_id INTEGER NOT NULL REFERENCES mood_events(id) ON DELETE CASCADE,
+    mood_label VARCHAR(50) NOT NULL,
+    mood_score DOUBLE PRECISION NOT NULL DEFAULT 0.0,
+    label_source VARCHAR(20) NOT NULL DEFAULT 'rules',
+    lat DOUBLE PRECISION,
+    lng DOUBLE PRECISION,
+    geohash_4 VARCHAR(4),
+    geohash_5 VARCHAR(5),
+    geohash_6 VARCHAR(6),
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_latest_mood_location ON user_latest_mood(lat, lng) WHERE lat IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_user_latest_mood_created_at ON user_latest_mood(created_at);
+CREATE INDEX IF NOT EXISTS idx_user_latest_mood_geohash_4 ON user_latest_mood(geohash_4);
+CREATE INDEX IF NOT EXISTS idx_user_latest_mood_geohash_5 ON user_latest_mood(geohash_5);
+CREATE INDEX IF NOT EXISTS idx_user_latest_mood_geohash_6 ON user_latest_mood(geohash_6);
+
+-- =====================================================
+-- Table: precomputed_matches
+-- Description: Suggestions de match calculées en lot pour les utilisateurs actifs (app/batch_matching.py)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS precomputed_matches (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    mood_event_id INTEGER NOT NULL,
+    radius_m INTEGER NOT NULL,
+    suggestions TEXT NOT NULL,
+    computed_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_precomputed_matches_computed_at ON precomputed_matches(computed_at);
+
+-- =====================================================
+-- Table: mood_classifications
+-- Description: Cache partagé des classifications LLM (app/mood_cache.py)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS mood_classifications (
+    model VARCHAR(100) NOT NULL,
+    text_hash VARCHAR(64) NOT NULL,
+    mood_label VARCHAR(50) NOT NULL,
+    mood_score DOUBLE PRECISION NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    PRIMARY KEY (model, text_hash)
+);
+
+COMMENT ON TABLE mood_classifications IS 'Clé: modèle + SHA-256 du texte normalisé; changer de modèle invalide le cache';
+
+-- =====================================================
+-- Table: schema_version
+-- Description: Version du schéma vérifiée au démarrage (app/schema.py)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS schema_version (
+    id INTEGER PRIMARY KEY DEFAULT 1,
+    version INTEGER NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+INSERT INTO schema_version (id, version, updated_at) VALUES (1, 9, CURRENT_TIMESTAMP)
+ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version, updated_at = CURRENT_TIMESTAMP;
+
+COMMENT ON TABLE schema_version IS 'Version du schéma (SCHEMA_VERSION dans app/schema.py)';
+
 -- =====================================================
 -- Fin du script
 -- =====================================================
@@ -0,0 +1,135 @@
+"""
+Entraîne le classifieur d'humeur local (app/mood_model.py) à partir de mood_events.
+
+Usage:
+    python database/train_mood_model.py [--sources llm] [--alpha 0.1] [--holdout 0.1] [--output PATH]
+
+Par défaut seules les étiquettes données par le LLM (label_source='llm')
+servent d'exemples. Le modèle est écrit dans MOOD_MODEL_PATH (défaut:
+app/data/mood_model.npy + .json); les workers le chargent au prochain
+démarrage.
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Ajouter le répertoire parent au path pour importer les modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+from sqlalchemy import select
+
+from app import models
+from app.config import settings
+from app.db import SessionLocal, get_engine
+from app.mood_model import N_FEATURES, MoodModel, extract_features, model_path
+from app.mood_rules import get_rule_engine
+
+
+def load_examples(sources: list[str], batch_size: int = 10_000) -> list[tuple[str, str, float]]:
+    get_engine()
+    examples = []
+    last_id = 0
+    with SessionLocal() as db:
+        while True:
+            rows = db.execute(
+                select(models.MoodEvent.id, models.MoodEvent.text, models.MoodEvent.mood_label, models.MoodEvent.mood_score)
+                .where(
+                    models.MoodEvent.id > last_id,
+                    models.MoodEvent.label_source.in_(sources),
+                    models.MoodEvent.text.isnot(None),
+                )
+                .order_by(models.MoodEvent.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return examples
+            last_id = rows[-1].id
+            examples.extend((row.text, row.mood_label, row.mood_score) for row in rows if row.text.strip())
+
+
+def train(examples: list[tuple[str, str, float]], labels: list[str], alpha: float, sources: list[str]) -> MoodModel:
+    index = {label: i for i, label in enumerate(labels)}
+    n_labels = len(labels)
+    flat_indices = []
+    class_counts = np.zeros(n_labels, dtype=np.float64)
+    score_sums = np.zeros(n_labels, dtype=np.float64)
+    for text, label, score in examples:
+        j = index.get(label)
+        if j is None:
+            continue
+        flat_indices.append(extract_features(text) * n_labels + j)
+        class_counts[j] += 1
+        score_sums[j] += score
+    flat = np.concatenate(flat_indices) if flat_indices else np.zeros(0, dtype=np.int64)
+    counts = np.bincount(flat, minlength=N_FEATURES * n_labels).reshape(N_FEATURES, n_labels).astype(np.float64)
+
+    # Bayes naïf multinomial avec lissage de Laplace (alpha)
+    totals = counts.sum(axis=0)
+    log_probs = np.log(counts + alpha) - np.log(totals + alpha * N_FEATURES)
+    priors = (class_counts + 1) / (class_counts.sum() + len(labels))
+    rule_scores = get_rule_engine().label_scores
+    label_scores = np.where(class_counts > 0, score_sums / np.maximum(class_counts, 1), rule_scores)
+    meta = {
+        "labels": labels,
+        "log_priors": np.log(priors).tolist(),
+        "label_scores": label_scores.tolist(),
+        "n_features": N_FEATURES,
+        "alpha": alpha,
+        "examples": int(class_counts.sum()),
+        "class_counts": class_counts.astype(int).tolist(),
+        "sources": sources,
+        "trained_at": datetime.utcnow().isoformat(timespec="seconds"),
+    }
+    return MoodModel(log_probs.astype(np.float32), meta)
+
+
+def evaluate(model: MoodModel, examples: list[tuple[str, str, float]], threshold: float) -> dict:
+    correct = covered = covered_correct = 0
+    started = time.perf_counter()
+    for text, label, _ in examples:
+        predicted, _, confidence = model.predict(text)
+        correct += predicted == label
+        if confidence >= threshold:
+            covered += 1
+            covered_correct += predicted == label
+    elapsed = time.perf_counter() - started
+    n = max(len(examples), 1)
+    return {
+        "accuracy": round(correct / n, 3),
+        "coverage": round(covered / n, 3),
+        "accuracy_when_confident": round(covered_correct / max(covered, 1), 3),
+        "ms_per_text": round(1000 * elapsed / n, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sources", default="llm", help="Valeurs de label_source utilisées, séparées par des virgules")
+    parser.add_argument("--alpha", type=float, default=0.1)
+    parser.add_argument("--holdout", type=float, default=0.1, help="Part des exemples réservée à l'évaluation")
+    parser.add_argument("--output", default=None, help="Chemin sans extension (défaut: MOOD_MODEL_PATH)")
+    args = parser.parse_args()
+
+    sources = [s.strip() for s in args.sources.split(",") if s.strip()]
+    examples = load_examples(sources)
+    if not examples:
+        print(f"❌ Aucun exemple (label_source in {sources}): rien à entraîner")
+        sys.exit(1)
+
+    rng = np.random.default_rng(42)
+    order = rng.permutation(len(examples))
+    n_test = int(len(examples) * args.holdout)
+    test = [examples[i] for i in order[:n_test]]
+    labels = get_rule_engine().labels
+
+    if test:
+        held_out = train([examples[i] for i in order[n_test:]], labels, args.alpha, sources)
+        print(f"📊 Évaluation sur {len(test)} exemples: {evaluate(held_out, test, settings.mood_model_min_confidence)}")
+
+    model = train(examples, labels, args.alpha, sources)
+    output = Path(args.output) if args.output else model_path()
+    model.save(output)
+    print(f"✅ Modèle entraîné sur {model.meta['examples']} exemples: {output.with_suffix('.npy')}")
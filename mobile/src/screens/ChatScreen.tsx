@@ -42,6 +42,9 @@ export default function ChatScreen() {
   const [messageText, setMessageText] = useState('');
   const [userId, setUserId] = useState<number | null>(null);
   const [conversationToRecipient, setConversationToRecipient] = useState<Record<string, number>>({});
+  // Curseur de la page suivante de /chat/inbox (null: toutes les conversations sont chargées)
+  const [inboxCursor, setInboxCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const { client } = useApi();
 
   useEffect(() => {
@@ -57,30 +60,39 @@ export default function ChatScreen() {
     bootstrap();
   }, []);
 
-  const loadConversations = async () => {
+  const loadConversations = async (cursor?: string) => {
     try {
-      const res = await client.get('/chat/conversations');
+      const res = await client.get('/chat/inbox', { params: { limit: 50, cursor } });
       const data = res.data as any[];
       const map: Record<string, number> = {};
       const mapped: Chat[] = data.map((c) => {
-        const otherUserId = userId === c.user_one_id ? c.user_two_id : c.user_one_id;
-        map[String(c.id)] = otherUserId;
+        map[String(c.id)] = c.other_user_id;
         return {
           id: String(c.id),
-          name: `Utilisateur ${otherUserId}`,
-          lastMessage: '',
-          timestamp: new Date(c.created_at),
-          unread: 0,
+          name: c.other_display_name || `Utilisateur ${c.other_user_id}`,
+          lastMessage: c.last_message_text,
+          timestamp: new Date(c.last_message_at),
+          unread: c.unread_count,
         };
       });
-      setConversationToRecipient(map);
-      setChats(mapped);
+      setConversationToRecipient((prev) => (cursor ? { ...prev, ...map } : map));
+      setChats((prev) => (cursor ? [...prev, ...mapped] : mapped));
+      setInboxCursor(res.headers['x-next-cursor'] ?? null);
     } catch (e) {
       console.error('Erreur de chargement des conversations', e);
-      setChats([]);
+      if (!cursor) {
+        setChats([]);
+      }
     }
   };
 
+  const loadMoreConversations = async () => {
+    if (!inboxCursor || loadingMore) return;
+    setLoadingMore(true);
+    await loadConversations(inboxCursor);
+    setLoadingMore(false);
+  };
+
   const handleSendMessage = () => {
     if (!messageText.trim()) return;
 
@@ -123,6 +135,12 @@ export default function ChatScreen() {
         timestamp: new Date(m.created_at),
       }));
       setMessages(mapped);
+      if (data.length > 0) {
+        await client.post(`/chat/conversations/${conversationId}/read`, null, {
+          params: { up_to_id: data[data.length - 1].id },
+        });
+        setChats((prev) => prev.map((c) => (c.id === conversationId ? { ...c, unread: 0 } : c)));
+      }
     } catch (e) {
       console.error('Erreur de chargement des messages', e);
       setMessages([]);
@@ -217,6 +235,8 @@ export default function ChatScreen() {
       <FlatList
         data={chats}
         keyExtractor={(item) => item.id}
+        onEndReached={loadMoreConversations}
+        onEndReachedThreshold={0.5}
         renderItem={({ item }) => (
           <TouchableOpacity
             style={styles.chatItem}